@@ -1,6 +1,9 @@
 """REST API routes."""
+import json
 import logging
-from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 from datetime import date
 
 from app.models.api_models import (
@@ -10,6 +13,9 @@ from app.models.api_models import (
     ConversationCreateRequest,
     StatusResponse,
     CostResponse,
+    UsageRow,
+    StorageResponse,
+    SearchResult,
     ConfigResponse,
     ConfigUpdateRequest,
     ErrorResponse,
@@ -54,81 +60,153 @@ async def chat(request: ChatRequest):
         if not all([ha_client, claude_service, conversation_service, tool_executor]):
             raise HTTPException(status_code=503, detail="Services not fully initialized")
 
-        # Get conversation history
-        history = conversation_service.get_conversation_history(request.conversation_id)
+        history, ha_context, available_functions = await _prepare_chat(request, conversation_service)
 
-        # Add user message
-        conversation_service.add_user_message(request.conversation_id, request.message)
-
-        # Build HA context
-        entity_status = {"total": 287, "unavailable": 18, "unknown": 1}  # TODO: Get from ha_client
-        system_info = {"version": "2024.11.1", "uptime_readable": "45 days"}  # TODO: Get from ha_client
-        ha_context = conversation_service.build_ha_context(
-            system_info, entity_status, []
-        )
-
-        # Get available functions
-        from app.tools.tool_definitions import get_all_tool_definitions
-
-        available_functions = get_all_tool_definitions()
-
-        # Send to Claude
-        claude_response = await claude_service.chat(
+        # Run Claude and its tool calls until it answers or a budget runs out
+        result = await claude_service.run_agent(
             user_message=request.message,
             conversation_history=history,
+            execute_tools=tool_executor.execute_tools_parallel,
             functions=available_functions if request.include_tools else None,
             ha_context=ha_context,
+            max_rounds=config.AGENT_MAX_ROUNDS,
+            max_tokens=config.AGENT_MAX_TOKENS,
+            max_seconds=config.AGENT_MAX_SECONDS,
         )
 
-        # Handle tool calls if present
-        if claude_response.get("tool_calls"):
-            tool_results = await tool_executor.execute_tools_parallel(
-                claude_response["tool_calls"]
-            )
-
-            # Process results and get final response
-            final_response = await claude_service.process_tool_results(
-                conversation_history=history,
-                assistant_message=claude_response["content"],
-                tool_calls=claude_response["tool_calls"],
-                tool_results=tool_results,
-                functions=available_functions,
-                ha_context=ha_context,
-            )
-
-            # Use final response content
-            response_content = final_response.get("content", "")
-            tokens_input = final_response.get("tokens_input", 0)
-            tokens_output = final_response.get("tokens_output", 0)
-        else:
-            response_content = claude_response.get("content", "")
-            tokens_input = claude_response.get("tokens_input", 0)
-            tokens_output = claude_response.get("tokens_output", 0)
+        if "error" in result:
+            raise HTTPException(status_code=502, detail=result["error"])
 
-        # Calculate cost
-        cost = conversation_service.calculate_message_cost(tokens_input, tokens_output)
+        # Calculate cost over every round
+        usage = _total_usage(result)
+        cost = conversation_service.calculate_message_cost(**usage)
 
         # Add assistant message to conversation
-        response_msg = conversation_service.add_assistant_message(
+        response_msg = await conversation_service.add_assistant_message(
             conversation_id=request.conversation_id,
-            content=response_content,
-            tokens_input=tokens_input,
-            tokens_output=tokens_output,
+            content=result["content"],
+            **usage,
             cost=cost,
-            tool_calls=claude_response.get("tool_calls"),
+            tool_calls=result["tool_calls"] or None,
+            model=claude_service.model,
+            calls=len(result["rounds"]),
         )
+        response_msg["rounds"] = result["rounds"]
+        response_msg["stop_reason"] = result["stop_reason"]
 
         return response_msg
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _prepare_chat(request: ChatRequest, conversation_service) -> Tuple[List[Dict[str, Any]], str, List[Dict[str, Any]]]:
+    """Load history, store the user message and build the HA context and tool list for a chat turn."""
+    # Get conversation history
+    history = await conversation_service.get_conversation_history(request.conversation_id)
+
+    # Add user message
+    await conversation_service.add_user_message(request.conversation_id, request.message)
+
+    # Build HA context
+    entity_status = {"total": 287, "unavailable": 18, "unknown": 1}  # TODO: Get from ha_client
+    system_info = {"version": "2024.11.1", "uptime_readable": "45 days"}  # TODO: Get from ha_client
+    ha_context = await conversation_service.build_ha_context(
+        system_info, entity_status, []
+    )
+
+    # Get available functions
+    from app.tools.tool_definitions import get_all_tool_definitions
+
+    return history, ha_context, get_all_tool_definitions()
+
+
+def _total_usage(*responses: Dict[str, Any]) -> Dict[str, int]:
+    """Sum the token counts, including prompt-cache reads and writes, of one or more Claude responses."""
+    keys = ("tokens_input", "tokens_output", "tokens_cache_read", "tokens_cache_write")
+    return {key: sum(response.get(key, 0) for response in responses) for key in keys}
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Send a message to Claude and stream the response as server-sent events.
+
+    Events: text (delta), tool_start, tool_call, tool_result, round (timings and usage),
+    done (the stored message) and error. The assistant message is stored once the stream has completed.
+    """
+    services = get_services()
+
+    claude_service = services.get("claude_service")
+    conversation_service = services.get("conversation_service")
+    tool_executor = services.get("tool_executor")
+
+    if not all([claude_service, conversation_service, tool_executor]):
+        raise HTTPException(status_code=503, detail="Services not fully initialized")
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            history, ha_context, available_functions = await _prepare_chat(request, conversation_service)
+
+            result = None
+            async for event in claude_service.agent_stream(
+                user_message=request.message,
+                conversation_history=history,
+                execute_tools=tool_executor.execute_tools_parallel,
+                functions=available_functions if request.include_tools else None,
+                ha_context=ha_context,
+                max_rounds=config.AGENT_MAX_ROUNDS,
+                max_tokens=config.AGENT_MAX_TOKENS,
+                max_seconds=config.AGENT_MAX_SECONDS,
+            ):
+                if event["type"] == "message":
+                    result = event["result"]
+                else:
+                    yield _sse(event["type"], event)
+                    if event["type"] == "error":
+                        return
+
+            usage = _total_usage(result)
+            cost = conversation_service.calculate_message_cost(**usage)
+            message = await conversation_service.add_assistant_message(
+                conversation_id=request.conversation_id,
+                content=result["content"],
+                **usage,
+                cost=cost,
+                tool_calls=result["tool_calls"] or None,
+                model=claude_service.model,
+                calls=len(result["rounds"]),
+            )
+            message["rounds"] = result["rounds"]
+            message["stop_reason"] = result["stop_reason"]
+            yield _sse("done", message)
+
+        except Exception as e:
+            logger.error(f"Error in chat stream: {e}")
+            yield _sse("error", {"error": str(e), "recoverable": True})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # Conversation endpoints
 @router.get("/conversations", response_model=list[ConversationResponse])
-async def list_conversations():
-    """List all conversations."""
+async def list_conversations(
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+):
+    """List conversations, most recently updated first. The next page's cursor is in X-Next-Cursor."""
     try:
         services = get_services()
         conversation_service = services.get("conversation_service")
@@ -136,9 +214,15 @@ async def list_conversations():
         if not conversation_service:
             raise HTTPException(status_code=503, detail="Services not initialized")
 
-        conversations = conversation_service.list_all_conversations()
-        return conversations
+        page = await conversation_service.list_conversations(limit, cursor)
+        if page["next_cursor"]:
+            response.headers["X-Next-Cursor"] = page["next_cursor"]
+        return page["conversations"]
 
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error listing conversations: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -154,8 +238,8 @@ async def create_conversation(request: ConversationCreateRequest):
         if not conversation_service:
             raise HTTPException(status_code=503, detail="Services not initialized")
 
-        conversation_id = conversation_service.create_conversation(request.title)
-        conv = conversation_service.get_conversation_details(conversation_id)
+        conversation_id = await conversation_service.create_conversation(request.title)
+        conv = await conversation_service.get_conversation_details(conversation_id)
 
         return conv
 
@@ -165,8 +249,15 @@ async def create_conversation(request: ConversationCreateRequest):
 
 
 @router.get("/conversations/{conversation_id}", response_model=ConversationResponse)
-async def get_conversation(conversation_id: str):
-    """Get a specific conversation with full history."""
+async def get_conversation(
+    conversation_id: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    include_tool_calls: bool = Query(True, description="Decode and return tool call payloads"),
+    resolve_payloads: bool = Query(False, description="Inline large tool inputs/results instead of $payload refs"),
+):
+    """Get a conversation with its newest messages. The cursor for older messages is in X-Next-Cursor."""
     try:
         services = get_services()
         conversation_service = services.get("conversation_service")
@@ -174,20 +265,51 @@ async def get_conversation(conversation_id: str):
         if not conversation_service:
             raise HTTPException(status_code=503, detail="Services not initialized")
 
-        conv = conversation_service.get_conversation_details(conversation_id)
+        conv = await conversation_service.get_conversation_details(
+            conversation_id, limit, cursor, include_tool_calls, resolve_payloads
+        )
 
         if not conv:
             raise HTTPException(status_code=404, detail="Conversation not found")
 
+        next_cursor = conv.pop("next_cursor")
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         return conv
 
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting conversation: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/payloads/{payload_hash}")
+async def get_tool_payload(payload_hash: str):
+    """Get a large tool call input or result referenced as {"$payload": hash}."""
+    try:
+        services = get_services()
+        conversation_service = services.get("conversation_service")
+
+        if not conversation_service:
+            raise HTTPException(status_code=503, detail="Services not initialized")
+
+        payload = await conversation_service.get_tool_payload(payload_hash)
+
+        if payload is None:
+            raise HTTPException(status_code=404, detail="Payload not found")
+
+        return payload
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting tool payload: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.delete("/conversations/{conversation_id}")
 async def delete_conversation(conversation_id: str):
     """Delete a conversation."""
@@ -198,7 +320,7 @@ async def delete_conversation(conversation_id: str):
         if not conversation_service:
             raise HTTPException(status_code=503, detail="Services not initialized")
 
-        success = conversation_service.delete_conversation(conversation_id)
+        success = await conversation_service.delete_conversation(conversation_id)
 
         if not success:
             raise HTTPException(status_code=404, detail="Conversation not found")
@@ -234,6 +356,7 @@ async def get_status():
             claude_available=claude_available,
             uptime_seconds=0,  # TODO: Track uptime
             database="ready",
+            ha_metrics=ha_client.get_metrics() if ha_client else None,
         )
 
     except Exception as e:
@@ -252,8 +375,8 @@ async def get_daily_cost():
         if not conversation_service:
             raise HTTPException(status_code=503, detail="Services not initialized")
 
-        daily_cost = conversation_service.get_daily_cost()
-        daily_calls = conversation_service.get_daily_call_count()
+        daily_cost = await conversation_service.get_daily_cost()
+        daily_calls = await conversation_service.get_daily_call_count()
 
         return CostResponse(
             daily_cost=daily_cost,
@@ -268,6 +391,88 @@ async def get_daily_cost():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/usage", response_model=list[UsageRow])
+async def get_usage(
+    start: date = Query(..., description="First UTC day (inclusive)"),
+    end: date = Query(..., description="Last UTC day (inclusive)"),
+    group_by: str = Query("day", pattern="^(day|hour|model)$"),
+    model: Optional[str] = Query(None, description="Restrict to one model"),
+):
+    """Get API usage totals over a date range."""
+    try:
+        services = get_services()
+        conversation_service = services.get("conversation_service")
+
+        if not conversation_service:
+            raise HTTPException(status_code=503, detail="Services not initialized")
+
+        return await conversation_service.get_usage(start, end, group_by, model)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting usage: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/search", response_model=list[SearchResult])
+async def search_messages(
+    response: Response,
+    q: str = Query(..., min_length=1, description="Search terms; all must match, term* matches a prefix"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    conversation_id: Optional[str] = Query(None, description="Restrict to one conversation"),
+    start: Optional[date] = Query(None, description="First UTC day (inclusive)"),
+    end: Optional[date] = Query(None, description="Last UTC day (inclusive)"),
+):
+    """Search conversation history, best match first. The cursor for the next page is in X-Next-Cursor."""
+    try:
+        services = get_services()
+        conversation_service = services.get("conversation_service")
+
+        if not conversation_service:
+            raise HTTPException(status_code=503, detail="Services not initialized")
+
+        page = await conversation_service.search_messages(q, limit, cursor, conversation_id, start, end)
+
+        if page["next_cursor"]:
+            response.headers["X-Next-Cursor"] = page["next_cursor"]
+        return page["results"]
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error searching messages: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/storage", response_model=StorageResponse)
+async def get_storage():
+    """Get database size, archive counts and the last retention report."""
+    try:
+        services = get_services()
+        database = services.get("database")
+        retention_service = services.get("retention_service")
+
+        if not database:
+            raise HTTPException(status_code=503, detail="Services not initialized")
+
+        stats = await database.get_storage_stats()
+        return StorageResponse(
+            **stats,
+            retention_enabled=bool(retention_service and retention_service.enabled),
+            last_retention=retention_service.last_report if retention_service else None,
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting storage stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/config", response_model=ConfigResponse)
 async def get_config_endpoint():
     """Get current configuration."""
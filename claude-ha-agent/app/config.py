@@ -20,11 +20,51 @@ class Config:
     CLAUDE_MODEL: str = "claude-3-5-sonnet-20241022"
     CLAUDE_MAX_TOKENS: int = 4096
 
+    # Claude API HTTP connection pool
+    CLAUDE_HTTP_MAX_CONNECTIONS: int = int(os.getenv("CLAUDE_HTTP_MAX_CONNECTIONS", "20"))
+    CLAUDE_HTTP_MAX_KEEPALIVE: int = int(os.getenv("CLAUDE_HTTP_MAX_KEEPALIVE", "10"))
+    CLAUDE_HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("CLAUDE_HTTP_KEEPALIVE_EXPIRY", "60"))
+    CLAUDE_HTTP_CONNECT_TIMEOUT: float = float(os.getenv("CLAUDE_HTTP_CONNECT_TIMEOUT", "10"))
+    CLAUDE_HTTP_TIMEOUT: float = float(os.getenv("CLAUDE_HTTP_TIMEOUT", "120"))
+
+    # Agent loop budgets per chat turn
+    AGENT_MAX_ROUNDS: int = int(os.getenv("AGENT_MAX_ROUNDS", "8"))
+    AGENT_MAX_TOKENS: int = int(os.getenv("AGENT_MAX_TOKENS", "200000"))
+    AGENT_MAX_SECONDS: float = float(os.getenv("AGENT_MAX_SECONDS", "120"))
+
+    # Conversation history sent to Claude: recent turns verbatim, older turns summarized
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "20000"))
+    HISTORY_KEEP_TURNS: int = int(os.getenv("HISTORY_KEEP_TURNS", "6"))
+    HISTORY_SUMMARY_BATCH: int = int(os.getenv("HISTORY_SUMMARY_BATCH", "4"))
+    HISTORY_SUMMARY_MAX_TOKENS: int = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "1024"))
+
     # Home Assistant
     HA_URL: str = os.getenv("HA_URL", "http://supervisor/core")
     HA_TOKEN: str = os.getenv("HA_TOKEN", "")
     HA_WEBSOCKET_URL: str = os.getenv("HA_WEBSOCKET_URL", "ws://supervisor/core/websocket")
 
+    # Home Assistant HTTP connection pool
+    HA_HTTP_POOL_LIMIT: int = int(os.getenv("HA_HTTP_POOL_LIMIT", "20"))
+    HA_HTTP_POOL_LIMIT_PER_HOST: int = int(os.getenv("HA_HTTP_POOL_LIMIT_PER_HOST", "10"))
+    HA_HTTP_DNS_CACHE_TTL: int = int(os.getenv("HA_HTTP_DNS_CACHE_TTL", "300"))
+    HA_HTTP_KEEPALIVE_TIMEOUT: float = float(os.getenv("HA_HTTP_KEEPALIVE_TIMEOUT", "60"))
+    HA_HTTP_TIMEOUT: float = float(os.getenv("HA_HTTP_TIMEOUT", "10"))
+
+    # Home Assistant WebSocket supervision
+    HA_HEARTBEAT_INTERVAL: float = float(os.getenv("HA_HEARTBEAT_INTERVAL", "30"))
+    HA_HEARTBEAT_TIMEOUT: float = float(os.getenv("HA_HEARTBEAT_TIMEOUT", "10"))
+    HA_RECONNECT_MAX_DELAY: float = float(os.getenv("HA_RECONNECT_MAX_DELAY", "60"))
+
+    # State change callback dispatch
+    HA_DISPATCH_WINDOW: float = float(os.getenv("HA_DISPATCH_WINDOW", "0.05"))
+    HA_DISPATCH_MAX_PENDING: int = int(os.getenv("HA_DISPATCH_MAX_PENDING", "5000"))
+    HA_DISPATCH_QUEUE_SIZE: int = int(os.getenv("HA_DISPATCH_QUEUE_SIZE", "100"))
+    HA_DISPATCH_WORKERS: int = int(os.getenv("HA_DISPATCH_WORKERS", "2"))
+
+    # State cache warm start
+    STATE_WARM_START: bool = os.getenv("STATE_WARM_START", "true").lower() == "true"
+    STATE_CHECKPOINT_INTERVAL: float = float(os.getenv("STATE_CHECKPOINT_INTERVAL", "30"))
+
     # Cost Management
     ALERT_THRESHOLD_USD: float = float(os.getenv("ALERT_THRESHOLD_USD", "5.0"))
     API_CALL_LIMIT_PER_DAY: int = 1000
@@ -32,6 +72,25 @@ class Config:
     # Database
     DB_PATH: Path = Path(os.getenv("DB_PATH", "/config/claude_ha_agent/database.db"))
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    DB_READ_POOL_SIZE: int = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+    DB_MMAP_SIZE: int = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+    DB_BUSY_TIMEOUT_MS: int = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+    DB_SYNCHRONOUS: str = os.getenv("DB_SYNCHRONOUS", "NORMAL").upper()
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "128"))
+    DB_GROUP_COMMIT_WINDOW_MS: float = float(os.getenv("DB_GROUP_COMMIT_WINDOW_MS", "2"))
+    DB_GROUP_COMMIT_MAX_BATCH: int = int(os.getenv("DB_GROUP_COMMIT_MAX_BATCH", "256"))
+    DB_WRITE_BEHIND: bool = os.getenv("DB_WRITE_BEHIND", "false").lower() == "true"
+    DB_STARTUP_VACUUM_MAX_MB: float = float(os.getenv("DB_STARTUP_VACUUM_MAX_MB", "16"))
+    TOOL_PAYLOAD_INLINE_BYTES: int = int(os.getenv("TOOL_PAYLOAD_INLINE_BYTES", "4096"))
+
+    # Conversation history retention (0 disables a policy)
+    RETENTION_MAX_AGE_DAYS: float = float(os.getenv("RETENTION_MAX_AGE_DAYS", "0"))
+    RETENTION_KEEP_LAST: int = int(os.getenv("RETENTION_KEEP_LAST", "0"))
+    RETENTION_MAX_DB_MB: float = float(os.getenv("RETENTION_MAX_DB_MB", "0"))
+    RETENTION_INTERVAL_HOURS: float = float(os.getenv("RETENTION_INTERVAL_HOURS", "6"))
+    RETENTION_BATCH_SIZE: int = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+    RETENTION_VACUUM_PAGES: int = int(os.getenv("RETENTION_VACUUM_PAGES", "256"))
+    RETENTION_FULL_VACUUM: bool = os.getenv("RETENTION_FULL_VACUUM", "false").lower() == "true"
 
     # API Server
     API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
@@ -42,13 +101,19 @@ class Config:
     # Claude 3.5 Sonnet pricing
     CLAUDE_INPUT_COST_PER_1M_TOKENS: float = 3.0  # $3 per 1M input tokens
     CLAUDE_OUTPUT_COST_PER_1M_TOKENS: float = 15.0  # $15 per 1M output tokens
+    CLAUDE_CACHE_WRITE_COST_PER_1M_TOKENS: float = 3.75  # 1.25x input for 5-minute cache writes
+    CLAUDE_CACHE_READ_COST_PER_1M_TOKENS: float = 0.30  # 0.1x input for cache hits
 
     @classmethod
-    def get_claude_cost(cls, input_tokens: int, output_tokens: int) -> float:
+    def get_claude_cost(
+        cls, input_tokens: int, output_tokens: int, cache_read_tokens: int = 0, cache_write_tokens: int = 0
+    ) -> float:
         """Calculate Claude API cost for given tokens."""
         input_cost = (input_tokens / 1_000_000) * cls.CLAUDE_INPUT_COST_PER_1M_TOKENS
         output_cost = (output_tokens / 1_000_000) * cls.CLAUDE_OUTPUT_COST_PER_1M_TOKENS
-        return input_cost + output_cost
+        cache_read_cost = (cache_read_tokens / 1_000_000) * cls.CLAUDE_CACHE_READ_COST_PER_1M_TOKENS
+        cache_write_cost = (cache_write_tokens / 1_000_000) * cls.CLAUDE_CACHE_WRITE_COST_PER_1M_TOKENS
+        return input_cost + output_cost + cache_read_cost + cache_write_cost
 
     @classmethod
     def validate_required(cls) -> bool:
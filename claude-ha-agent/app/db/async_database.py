@@ -0,0 +1,298 @@
+"""Async interface to the SQLite database for use inside the event loop."""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from app.db.database import Database
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabase:
+    """Runs Database calls off the event loop.
+
+    Writes go to a single dedicated writer thread, matching the single writer connection,
+    so they queue there instead of contending for the write lock. Reads run on a pool
+    sized to the reader connection pool, so concurrent requests read in parallel. Messages
+    with tool calls are encoded (payload hashing, compression, JSON) on their own thread
+    before being queued, keeping that CPU work off the event loop.
+    """
+
+    def __init__(self, database: Database):
+        """Initialize async database with its writer thread and reader pool."""
+        self.database = database
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(
+            max_workers=database.connections.read_pool_size, thread_name_prefix="db-reader"
+        )
+        # One thread, so concurrent submissions keep their order in the group-commit queue
+        self._encoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-encoder")
+
+    async def _write(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a write on the writer thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, functools.partial(func, *args, **kwargs))
+
+    async def _read(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a read on the reader pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, functools.partial(func, *args, **kwargs))
+
+    async def close(self):
+        """Drain pending work and queued writes, stop the threads and close the connections."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._encoder.shutdown, True)
+        await loop.run_in_executor(None, self._writer.shutdown, True)
+        await loop.run_in_executor(None, self._readers.shutdown, True)
+        await loop.run_in_executor(None, self.database.close)
+
+    # Conversations
+
+    async def create_conversation(self, title: Optional[str] = None) -> str:
+        """Create a new conversation and return its ID."""
+        return await self._write(self.database.create_conversation, title)
+
+    async def add_message(
+        self,
+        conversation_id: str,
+        role: str,
+        content: str,
+        tokens_input: int = 0,
+        tokens_output: int = 0,
+        cost: float = 0.0,
+        tool_calls: Optional[List[Dict[str, Any]]] = None,
+        model: Optional[str] = None,
+        tokens_cache_read: int = 0,
+        tokens_cache_write: int = 0,
+        calls: Optional[int] = None,
+        wait: bool = True,
+    ) -> str:
+        """Add a message to a conversation through the group-commit queue.
+
+        With wait=False the id is returned as soon as the insert is queued (write-behind);
+        otherwise this resolves once the batch holding the insert has committed.
+        """
+        submit = functools.partial(
+            self.database.submit_message,
+            conversation_id,
+            role,
+            content,
+            tokens_input,
+            tokens_output,
+            cost,
+            tool_calls,
+            model,
+            tokens_cache_read,
+            tokens_cache_write,
+            calls,
+        )
+        if tool_calls:
+            loop = asyncio.get_running_loop()
+            message_id, committed = await loop.run_in_executor(self._encoder, submit)
+        else:
+            # Nothing to encode; queue straight from the loop
+            message_id, committed = submit()
+        if wait:
+            await asyncio.wrap_future(committed)
+        else:
+            committed.add_done_callback(self._log_write_behind_failure)
+        return message_id
+
+    @staticmethod
+    def _log_write_behind_failure(committed):
+        """Log a write-behind insert that failed after the caller moved on."""
+        if committed.exception() is not None:
+            logger.error(f"Write-behind message insert failed: {committed.exception()}")
+
+    async def record_usage(
+        self,
+        conversation_id: str,
+        model: Optional[str],
+        tokens_input: int,
+        tokens_output: int,
+        cost: float,
+        tokens_cache_read: int = 0,
+        tokens_cache_write: int = 0,
+    ):
+        """Record an API call that did not produce a stored message."""
+        await self._write(
+            self.database.record_usage,
+            conversation_id,
+            model,
+            tokens_input,
+            tokens_output,
+            cost,
+            tokens_cache_read,
+            tokens_cache_write,
+        )
+
+    async def get_messages_after(self, conversation_id: str, after_rowid: int = 0) -> List[Dict[str, Any]]:
+        """Get the role and content of messages newer than after_rowid."""
+        return await self._read(self.database.get_messages_after, conversation_id, after_rowid)
+
+    async def get_conversation_summary(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Get the rolling summary of a conversation's aged-out turns."""
+        return await self._read(self.database.get_conversation_summary, conversation_id)
+
+    async def save_conversation_summary(self, conversation_id: str, summary: str, through_rowid: int, tokens: int):
+        """Store the rolling summary of a conversation's aged-out turns."""
+        await self._write(self.database.save_conversation_summary, conversation_id, summary, through_rowid, tokens)
+
+    async def flush(self):
+        """Wait until all queued writes have been committed."""
+        await self._write(self.database.flush)
+
+    async def get_conversation_messages(
+        self, conversation_id: str, include_tool_calls: bool = True, resolve_payloads: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Get all messages for a conversation."""
+        return await self._read(
+            self.database.get_conversation_messages, conversation_id, include_tool_calls, resolve_payloads
+        )
+
+    async def get_conversation_messages_page(
+        self,
+        conversation_id: str,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        include_tool_calls: bool = True,
+        resolve_payloads: bool = False,
+    ) -> Dict[str, Any]:
+        """Get one page of messages, newest page first."""
+        return await self._read(
+            self.database.get_conversation_messages_page,
+            conversation_id,
+            limit,
+            cursor,
+            include_tool_calls,
+            resolve_payloads,
+        )
+
+    async def get_tool_payload(self, payload_hash: str) -> Optional[Any]:
+        """Get one decoded out-of-line tool payload."""
+        return await self._read(self.database.get_tool_payload, payload_hash)
+
+    async def get_conversation(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Get conversation details."""
+        return await self._read(self.database.get_conversation, conversation_id)
+
+    async def get_all_conversations(self) -> List[Dict[str, Any]]:
+        """Get all conversations."""
+        return await self._read(self.database.get_all_conversations)
+
+    async def get_conversations_page(self, limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Get one page of conversations, most recently updated first."""
+        return await self._read(self.database.get_conversations_page, limit, cursor)
+
+    async def search_messages(
+        self,
+        query: str,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        conversation_id: Optional[str] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+    ) -> Dict[str, Any]:
+        """Full-text search over message content and tool names, best match first."""
+        return await self._read(
+            self.database.search_messages, query, limit, cursor, conversation_id, start_date, end_date
+        )
+
+    async def delete_conversation(self, conversation_id: str) -> bool:
+        """Delete a conversation and all its messages."""
+        return await self._write(self.database.delete_conversation, conversation_id)
+
+    async def update_conversation_title(self, conversation_id: str, title: str) -> bool:
+        """Update conversation title."""
+        return await self._write(self.database.update_conversation_title, conversation_id, title)
+
+    async def get_daily_cost(self, target_date: Optional[date] = None) -> float:
+        """Get total API cost for a specific date (default: today UTC)."""
+        return await self._read(self.database.get_daily_cost, target_date)
+
+    async def get_daily_call_count(self, target_date: Optional[date] = None) -> int:
+        """Get number of API calls for a specific date (default: today UTC)."""
+        return await self._read(self.database.get_daily_call_count, target_date)
+
+    async def get_daily_token_count(self, target_date: Optional[date] = None) -> int:
+        """Get number of input plus output tokens for a specific date (default: today UTC)."""
+        return await self._read(self.database.get_daily_token_count, target_date)
+
+    async def get_usage(
+        self,
+        start_date: date,
+        end_date: date,
+        group_by: str = "day",
+        model: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Get usage totals for an inclusive date range, grouped by day, hour or model."""
+        return await self._read(self.database.get_usage, start_date, end_date, group_by, model)
+
+    # HA State Cache operations
+
+    async def cache_entity_state(
+        self, entity_id: str, state: str, attributes: Dict[str, Any], last_updated: datetime
+    ):
+        """Cache or update an entity's state."""
+        await self._write(self.database.cache_entity_state, entity_id, state, attributes, last_updated)
+
+    async def cache_entity_states_bulk(self, rows: List[tuple]) -> int:
+        """Upsert many cached entity states in one transaction."""
+        return await self._write(self.database.cache_entity_states_bulk, rows)
+
+    async def delete_cached_entities(self, entity_ids: List[str]) -> int:
+        """Remove many entities from cache."""
+        return await self._write(self.database.delete_cached_entities, entity_ids)
+
+    async def get_cached_entity_state(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        """Get cached entity state."""
+        return await self._read(self.database.get_cached_entity_state, entity_id)
+
+    async def get_all_cached_entities(self, raw_attributes: bool = False) -> List[Dict[str, Any]]:
+        """Get all cached entity states."""
+        return await self._read(self.database.get_all_cached_entities, raw_attributes)
+
+    async def clear_entity_cache(self, entity_id: str) -> bool:
+        """Remove an entity from cache."""
+        return await self._write(self.database.clear_entity_cache, entity_id)
+
+    async def clear_all_cache(self) -> int:
+        """Clear all cached entity states."""
+        return await self._write(self.database.clear_all_cache)
+
+    # Retention and storage
+
+    async def archive_messages_older_than(self, max_age_days: float, batch_size: int = 500) -> int:
+        """Archive one batch of messages older than max_age_days."""
+        return await self._write(self.database.archive_messages_older_than, max_age_days, batch_size)
+
+    async def archive_messages_beyond_last(self, keep_last: int, batch_size: int = 500) -> int:
+        """Archive one batch of messages beyond the last keep_last of each conversation."""
+        return await self._write(self.database.archive_messages_beyond_last, keep_last, batch_size)
+
+    async def archive_oldest_messages(self, batch_size: int = 500) -> int:
+        """Archive the oldest batch of messages."""
+        return await self._write(self.database.archive_oldest_messages, batch_size)
+
+    async def get_archived_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
+        """Decompress the archived messages of a conversation."""
+        return await self._read(self.database.get_archived_messages, conversation_id)
+
+    async def enable_incremental_vacuum(self, max_bytes: Optional[int] = None) -> bool:
+        """Switch the file to incremental auto-vacuum with a one-time full VACUUM."""
+        return await self._write(self.database.enable_incremental_vacuum, max_bytes)
+
+    async def merge_search_index(self, pages: int = 256) -> bool:
+        """Merge search index segments, dropping entries of deleted messages."""
+        return await self._write(self.database.merge_search_index, pages)
+
+    async def incremental_vacuum(self, pages: int = 256) -> int:
+        """Return up to pages free pages to the filesystem."""
+        return await self._write(self.database.incremental_vacuum, pages)
+
+    async def get_storage_stats(self) -> Dict[str, Any]:
+        """Get file size, free space and row counts of the database."""
+        return await self._read(self.database.get_storage_stats)
@@ -0,0 +1,117 @@
+"""Long-lived SQLite connections shared by the database layer."""
+import logging
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List
+
+logger = logging.getLogger(__name__)
+
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+class ConnectionManager:
+    """Owns one writer connection and a small pool of reader connections.
+
+    The database runs in WAL mode so readers never wait on the writer; writes are
+    serialized through the single writer connection behind a lock. Every connection
+    keeps its prepared statements cached across calls.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        read_pool_size: int = 4,
+        mmap_size: int = 256 * 1024 * 1024,
+        busy_timeout_ms: int = 5000,
+        synchronous: str = "NORMAL",
+        cached_statements: int = 128,
+    ):
+        """Initialize connection manager and open the writer connection."""
+        if synchronous.upper() not in SYNCHRONOUS_MODES:
+            raise ValueError(f"Invalid SQLite synchronous mode: {synchronous}")
+
+        self.db_path = db_path
+        self.read_pool_size = read_pool_size
+        self.mmap_size = mmap_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.synchronous = synchronous.upper()
+        self.cached_statements = cached_statements
+
+        self._write_lock = threading.Lock()
+        self._readers: queue.LifoQueue = queue.LifoQueue()
+        self._all_connections: List[sqlite3.Connection] = []
+        self._pool_lock = threading.Lock()
+        self._reader_count = 0
+        self._closed = False
+
+        self._writer = self._connect()
+        journal_mode = self._writer.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        logger.info(f"SQLite connection manager ready (journal_mode={journal_mode}, readers={read_pool_size})")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection with the shared PRAGMAs applied."""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        self._all_connections.append(conn)
+        return conn
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Exclusive use of the writer connection; commits on success, rolls back on error."""
+        with self._write_lock:
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a reader connection from the pool, opening one if the pool is not full."""
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        """Take an idle reader, open a new one, or wait for one to be returned."""
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._pool_lock:
+            if self._reader_count < self.read_pool_size:
+                self._reader_count += 1
+                return self._connect()
+
+        return self._readers.get()
+
+    def close(self):
+        """Close every connection."""
+        if self._closed:
+            return
+        self._closed = True
+
+        with self._write_lock:
+            for conn in self._all_connections:
+                try:
+                    conn.close()
+                except sqlite3.Error as e:
+                    logger.warning(f"Error closing SQLite connection: {e}")
+            self._all_connections.clear()
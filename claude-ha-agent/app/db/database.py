@@ -1,28 +1,429 @@
 """Database setup and operations for conversation storage."""
+import base64
+import shutil
 import sqlite3
 import json
-from datetime import datetime, date
+import zlib
+from datetime import datetime, date, timezone
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from concurrent.futures import Future
+from typing import Optional, Iterable, List, Dict, Any, Tuple
 from uuid import uuid4
 import logging
 
+from app.db import payloads
+from app.db.connection_manager import ConnectionManager
+from app.db.write_queue import GroupCommitQueue
+
 logger = logging.getLogger(__name__)
 
+MESSAGE_COLUMNS = (
+    "rowid, id, role, content, tokens_input, tokens_output, tokens_cache_read, tokens_cache_write, cost, timestamp"
+)
+
+CONVERSATION_COLUMNS = """
+    SELECT c.id, c.created_at, c.updated_at, c.title, c.message_count, c.total_cost,
+           COALESCE(d.cost, 0.0) AS daily_cost
+    FROM conversations c
+    LEFT JOIN conversation_daily_cost d ON d.conversation_id = c.id AND d.day = DATE('now')
+"""
+
+# Space-separated tool names of a message row, for the full-text index
+FTS_TOOL_NAMES = """(
+    SELECT group_concat(json_extract(value, '$.name'), ' ')
+    FROM json_each(CASE WHEN json_valid({row}.tool_calls) THEN {row}.tool_calls ELSE '[]' END)
+)"""
+
+# Distinct payload hashes referenced by a message row's tool calls
+PAYLOAD_HASHES = f"""
+    SELECT DISTINCT value FROM json_tree(
+        CASE WHEN json_valid({{row}}.tool_calls) THEN {{row}}.tool_calls ELSE '[]' END
+    )
+    WHERE key = '{payloads.PAYLOAD_REF}'
+"""
+
+# Whether a messages row is already covered by its conversation's history summary. Retention
+# only archives such rows, so nothing still sent to Claude verbatim or awaiting summary is lost.
+SUMMARIZED = """messages.rowid <= COALESCE(
+    (SELECT s.through_rowid FROM conversation_summaries s WHERE s.conversation_id = messages.conversation_id), 0
+)"""
+
+
+def fts_query(text: str) -> str:
+    """Quote each search term so user input is matched literally rather than as FTS5 syntax.
+
+    Terms are ANDed; a trailing * on a term is kept as a prefix match.
+    """
+    terms = []
+    for term in text.split():
+        prefix = term.endswith("*") and len(term) > 1
+        term = term.rstrip("*") if prefix else term
+        terms.append('"' + term.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def encode_cursor(*values: Any) -> str:
+    """Encode keyset values into an opaque pagination cursor."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Decode a pagination cursor, raising ValueError if it is malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return values
+
 
 class Database:
     """SQLite database manager for conversations and state cache."""
 
-    def __init__(self, db_path: Path):
-        """Initialize database connection."""
+    def __init__(
+        self,
+        db_path: Path,
+        read_pool_size: int = 4,
+        mmap_size: int = 256 * 1024 * 1024,
+        busy_timeout_ms: int = 5000,
+        synchronous: str = "NORMAL",
+        cached_statements: int = 128,
+        group_commit_window_ms: float = 2.0,
+        group_commit_max_batch: int = 256,
+        payload_inline_max: int = 4096,
+        startup_vacuum_max_bytes: int = 16 * 1024 * 1024,
+    ):
+        """Initialize database connections, schema and group-commit write queue."""
         self.db_path = db_path
+        self.payload_inline_max = payload_inline_max
+        self.startup_vacuum_max_bytes = startup_vacuum_max_bytes
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.connections = ConnectionManager(
+            db_path,
+            read_pool_size=read_pool_size,
+            mmap_size=mmap_size,
+            busy_timeout_ms=busy_timeout_ms,
+            synchronous=synchronous,
+            cached_statements=cached_statements,
+        )
         self._init_db()
+        self.write_queue = GroupCommitQueue(
+            self.connections, window_ms=group_commit_window_ms, max_batch=group_commit_max_batch
+        )
+
+    def flush(self) -> None:
+        """Wait until all queued writes have been committed."""
+        self.write_queue.flush()
+
+    def close(self) -> None:
+        """Commit queued writes and close all database connections."""
+        self.write_queue.close()
+        self.connections.close()
 
     def _init_db(self) -> None:
-        """Initialize database schema."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """Initialize database schema and apply pending migrations in one transaction."""
+        with self.connections.writer() as conn:
+            conn.execute("BEGIN")
+            cursor = conn.cursor()
+            self._create_schema(cursor)
+            self._migrate(cursor)
+        self.enable_incremental_vacuum(max_bytes=self.startup_vacuum_max_bytes)
+        logger.info(f"Database initialized at {self.db_path}")
+
+    def enable_incremental_vacuum(self, max_bytes: Optional[int] = None) -> bool:
+        """Switch the file to auto_vacuum=INCREMENTAL so freed pages can be returned in slices.
+
+        Changing auto_vacuum only takes effect after a full VACUUM, which rewrites the whole file,
+        blocks writers meanwhile and briefly needs about as much free disk again. It is skipped
+        for files larger than max_bytes or when the disk is too full; returns whether the file
+        is now incremental.
+        """
+        with self.connections.writer() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                return True
+
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            size = conn.execute("PRAGMA page_count").fetchone()[0] * page_size
+            if max_bytes is not None and size > max_bytes:
+                logger.info(
+                    f"Skipping one-time VACUUM of {size} byte database; set RETENTION_FULL_VACUUM=true "
+                    "to enable incremental auto-vacuum from the retention service"
+                )
+                return False
+            if shutil.disk_usage(self.db_path.parent).free < size:
+                logger.warning(f"Not enough free disk space to VACUUM the {size} byte database")
+                return False
+
+            logger.info(f"Enabling incremental auto-vacuum (one-time VACUUM of {size} bytes)")
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            return True
+
+    def _migrate(self, cursor: sqlite3.Cursor) -> None:
+        """Apply migrations newer than the database's PRAGMA user_version, in order."""
+        migrations = [
+            self._migrate_conversation_counters,
+            self._migrate_usage_rollup,
+            self._migrate_keyset_indexes,
+            self._migrate_messages_archive,
+            self._migrate_messages_fts,
+            self._migrate_tool_payloads,
+            self._migrate_cache_tokens,
+            self._migrate_conversation_summaries,
+            self._migrate_archive_order,
+            self._migrate_clear_stale_metadata,
+        ]
+
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for target, migration in enumerate(migrations, start=1):
+            if version >= target:
+                continue
+
+            logger.info(f"Applying database migration {target}: {migration.__name__}")
+            migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {target}")
+
+    def _migrate_conversation_counters(self, cursor: sqlite3.Cursor) -> None:
+        """Migration 1: keep message count and cost as counters instead of recomputing them per insert."""
+        cursor.execute("ALTER TABLE conversations ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("ALTER TABLE conversations ADD COLUMN total_cost REAL NOT NULL DEFAULT 0.0")
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS conversation_daily_cost (
+                conversation_id TEXT NOT NULL,
+                day TEXT NOT NULL,
+                cost REAL NOT NULL DEFAULT 0.0,
+                PRIMARY KEY (conversation_id, day)
+            ) WITHOUT ROWID
+            """
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversation_daily_cost_day ON conversation_daily_cost(day)")
+
+        # Backfill from existing messages
+        cursor.execute(
+            """
+            UPDATE conversations
+            SET message_count = (SELECT COUNT(*) FROM messages WHERE conversation_id = conversations.id),
+                total_cost = (SELECT COALESCE(SUM(cost), 0.0) FROM messages WHERE conversation_id = conversations.id)
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO conversation_daily_cost (conversation_id, day, cost)
+            SELECT conversation_id, DATE(timestamp), SUM(cost)
+            FROM messages
+            GROUP BY conversation_id, DATE(timestamp)
+            HAVING SUM(cost) != 0
+            """
+        )
+
+    def _migrate_usage_rollup(self, cursor: sqlite3.Cursor) -> None:
+        """Migration 2: record the model per message and pre-aggregate usage by day, hour and model."""
+        cursor.execute("ALTER TABLE messages ADD COLUMN model TEXT")
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS usage_rollup (
+                day TEXT NOT NULL,
+                hour INTEGER NOT NULL,
+                model TEXT NOT NULL DEFAULT '',
+                messages INTEGER NOT NULL DEFAULT 0,
+                calls INTEGER NOT NULL DEFAULT 0,
+                tokens_input INTEGER NOT NULL DEFAULT 0,
+                tokens_output INTEGER NOT NULL DEFAULT 0,
+                cost REAL NOT NULL DEFAULT 0.0,
+                PRIMARY KEY (day, hour, model)
+            ) WITHOUT ROWID
+            """
+        )
+
+        # Backfill from existing messages
+        cursor.execute(
+            """
+            INSERT INTO usage_rollup (day, hour, model, messages, calls, tokens_input, tokens_output, cost)
+            SELECT DATE(timestamp), CAST(strftime('%H', timestamp) AS INTEGER), COALESCE(model, ''),
+                   COUNT(*), SUM(role = 'assistant'), SUM(tokens_input), SUM(tokens_output), SUM(cost)
+            FROM messages
+            GROUP BY 1, 2, 3
+            """
+        )
+
+    def _migrate_keyset_indexes(self, cursor: sqlite3.Cursor) -> None:
+        """Migration 3: index the (updated_at, id) keyset used to page conversations."""
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations(updated_at, id)")
+
+    def _migrate_messages_archive(self, cursor: sqlite3.Cursor) -> None:
+        """Migration 4: compressed archive for messages removed by the retention policy."""
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS messages_archive (
+                id TEXT PRIMARY KEY,
+                conversation_id TEXT NOT NULL,
+                timestamp TIMESTAMP,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                codec TEXT NOT NULL,
+                data BLOB NOT NULL
+            )
+            """
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_messages_archive_conversation ON messages_archive(conversation_id)"
+        )
+
+    def _migrate_messages_fts(self, cursor: sqlite3.Cursor) -> None:
+        """Migration 5: FTS5 index over message content and tool names, kept in sync by triggers.
+
+        The index rowid is the message rowid. Archiving and deleting conversations delete
+        messages, so their rows leave the index through the delete trigger.
+        """
+        cursor.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                content,
+                tool_names,
+                conversation_id UNINDEXED,
+                tokenize = 'porter unicode61 remove_diacritics 2'
+            )
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts (rowid, content, tool_names, conversation_id)
+                VALUES (new.rowid, new.content, {FTS_TOOL_NAMES.format(row="new")}, new.conversation_id);
+            END
+            """
+        )
+        cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                DELETE FROM messages_fts WHERE rowid = old.rowid;
+            END
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content, tool_calls ON messages BEGIN
+                UPDATE messages_fts
+                SET content = new.content, tool_names = {FTS_TOOL_NAMES.format(row="new")}
+                WHERE rowid = new.rowid;
+            END
+            """
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO messages_fts (rowid, content, tool_names, conversation_id)
+            SELECT messages.rowid, content, {FTS_TOOL_NAMES.format(row="messages")}, conversation_id
+            FROM messages
+            """
+        )
+
+    def _migrate_tool_payloads(self, cursor: sqlite3.Cursor) -> None:
+        """Migration 6: move large tool call inputs and results out of line into tool_payloads.
+
+        Payloads are compressed and keyed by the SHA-256 of their JSON, so duplicates are
+        stored once. refcount counts the messages referencing a payload and is maintained by
+        triggers; a payload is deleted with its last reference.
+        """
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tool_payloads (
+                hash TEXT PRIMARY KEY,
+                codec TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                refcount INTEGER NOT NULL DEFAULT 0,
+                data BLOB NOT NULL
+            )
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS tool_payloads_ref AFTER INSERT ON messages
+            WHEN new.tool_calls LIKE '%"{payloads.PAYLOAD_REF}"%' BEGIN
+                UPDATE tool_payloads SET refcount = refcount + 1
+                WHERE hash IN ({PAYLOAD_HASHES.format(row="new")});
+            END
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS tool_payloads_unref AFTER DELETE ON messages
+            WHEN old.tool_calls LIKE '%"{payloads.PAYLOAD_REF}"%' BEGIN
+                UPDATE tool_payloads SET refcount = refcount - 1
+                WHERE hash IN ({PAYLOAD_HASHES.format(row="old")});
+                DELETE FROM tool_payloads WHERE refcount <= 0 AND hash IN ({PAYLOAD_HASHES.format(row="old")});
+            END
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS tool_payloads_reref AFTER UPDATE OF tool_calls ON messages BEGIN
+                UPDATE tool_payloads SET refcount = refcount + 1
+                WHERE hash IN ({PAYLOAD_HASHES.format(row="new")});
+                UPDATE tool_payloads SET refcount = refcount - 1
+                WHERE hash IN ({PAYLOAD_HASHES.format(row="old")});
+                DELETE FROM tool_payloads WHERE refcount <= 0 AND hash IN ({PAYLOAD_HASHES.format(row="old")});
+            END
+            """
+        )
+
+        rows = cursor.execute(
+            "SELECT rowid, tool_calls FROM messages WHERE length(tool_calls) > ?", (self.payload_inline_max,)
+        ).fetchall()
+        for row in rows:
+            try:
+                tool_calls = json.loads(row["tool_calls"])
+            except ValueError:
+                continue
+            tool_calls, moved = payloads.externalize(tool_calls, self.payload_inline_max)
+            if moved:
+                self._store_payloads(cursor, moved)
+                cursor.execute(
+                    "UPDATE messages SET tool_calls = ? WHERE rowid = ?", (json.dumps(tool_calls), row["rowid"])
+                )
+
+    def _migrate_cache_tokens(self, cursor: sqlite3.Cursor) -> None:
+        """Migration 7: record prompt-cache read and write tokens per message and in the usage rollup."""
+        for table in ("messages", "usage_rollup"):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN tokens_cache_read INTEGER NOT NULL DEFAULT 0")
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN tokens_cache_write INTEGER NOT NULL DEFAULT 0")
+
+    def _migrate_conversation_summaries(self, cursor: sqlite3.Cursor) -> None:
+        """Migration 8: rolling summary of the turns that aged out of each conversation's history window."""
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS conversation_summaries (
+                conversation_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                through_rowid INTEGER NOT NULL,
+                tokens INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+
+    def _migrate_archive_order(self, cursor: sqlite3.Cursor) -> None:
+        """Migration 9: keep each archived message's source rowid so the archive reads back in order."""
+        cursor.execute("ALTER TABLE messages_archive ADD COLUMN source_rowid INTEGER")
+        cursor.execute("DROP INDEX IF EXISTS idx_messages_archive_conversation")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_messages_archive_order ON messages_archive(conversation_id, source_rowid)"
+        )
+
+    def _migrate_clear_stale_metadata(self, cursor: sqlite3.Cursor) -> None:
+        """Migration 10: drop the never-updated daily_cost/message_count copies from conversation metadata."""
+        cursor.execute(
+            """
+            UPDATE conversations SET metadata = NULL
+            WHERE metadata IS NOT NULL
+              AND json_valid(metadata)
+              AND json_remove(metadata, '$.daily_cost', '$.message_count') = '{}'
+            """
+        )
+
+    def _create_schema(self, cursor: sqlite3.Cursor) -> None:
+        """Create the base (version 0) tables and indices."""
 
         # Conversations table
         cursor.execute(
@@ -73,26 +474,18 @@ class Database:
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages(timestamp)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversations_created ON conversations(created_at)")
 
-        conn.commit()
-        conn.close()
-        logger.info(f"Database initialized at {self.db_path}")
-
     def create_conversation(self, title: Optional[str] = None) -> str:
         """Create a new conversation and return its ID."""
         conversation_id = str(uuid4())
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.connections.writer() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute(
-            """
-            INSERT INTO conversations (id, title, metadata)
-            VALUES (?, ?, ?)
-            """,
-            (conversation_id, title or "Untitled", json.dumps({"daily_cost": 0.0, "message_count": 0})),
-        )
+            # Counts and costs live in the counter columns and conversation_daily_cost
+            cursor.execute(
+                "INSERT INTO conversations (id, title) VALUES (?, ?)",
+                (conversation_id, title or "Untitled"),
+            )
 
-        conn.commit()
-        conn.close()
         logger.debug(f"Created conversation {conversation_id}")
         return conversation_id
 
@@ -105,16 +498,113 @@ class Database:
         tokens_output: int = 0,
         cost: float = 0.0,
         tool_calls: Optional[List[Dict[str, Any]]] = None,
+        model: Optional[str] = None,
+        tokens_cache_read: int = 0,
+        tokens_cache_write: int = 0,
+        calls: Optional[int] = None,
     ) -> str:
-        """Add a message to a conversation."""
+        """Add a message to a conversation and wait for it to be committed."""
+        message_id, committed = self.submit_message(
+            conversation_id,
+            role,
+            content,
+            tokens_input,
+            tokens_output,
+            cost,
+            tool_calls,
+            model,
+            tokens_cache_read,
+            tokens_cache_write,
+            calls,
+        )
+        committed.result()
+        return message_id
+
+    def submit_message(
+        self,
+        conversation_id: str,
+        role: str,
+        content: str,
+        tokens_input: int = 0,
+        tokens_output: int = 0,
+        cost: float = 0.0,
+        tool_calls: Optional[List[Dict[str, Any]]] = None,
+        model: Optional[str] = None,
+        tokens_cache_read: int = 0,
+        tokens_cache_write: int = 0,
+        calls: Optional[int] = None,
+    ) -> Tuple[str, Future]:
+        """Queue a message insert for the next group commit.
+
+        Returns the new message id right away, plus a future that resolves once the
+        insert and its counter updates have been committed. calls is the number of API
+        calls that produced the message (default: one per assistant message).
+        """
         message_id = str(uuid4())
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        moved: Dict[str, Tuple[str, int, bytes]] = {}
+        if tool_calls:
+            # Hash and compress here, on the submitting thread (AsyncDatabase's encoder), not the commit thread
+            tool_calls, moved = payloads.externalize(tool_calls, self.payload_inline_max)
+        tool_calls_json = json.dumps(tool_calls) if tool_calls else None
+
+        def insert(cursor: sqlite3.Cursor) -> str:
+            if moved:
+                self._store_payloads(cursor, moved)
+            self._insert_message(
+                cursor,
+                message_id,
+                conversation_id,
+                role,
+                content,
+                tokens_input,
+                tokens_output,
+                cost,
+                tool_calls_json,
+                model,
+                tokens_cache_read,
+                tokens_cache_write,
+                calls,
+            )
+            return message_id
+
+        return message_id, self.write_queue.submit(insert)
 
+    @staticmethod
+    def _store_payloads(cursor: sqlite3.Cursor, moved: Dict[str, Tuple[str, int, bytes]]) -> None:
+        """Store out-of-line payloads that are not stored yet; the message triggers count references."""
+        cursor.executemany(
+            """
+            INSERT INTO tool_payloads (hash, codec, size, refcount, data)
+            VALUES (?, ?, ?, 0, ?)
+            ON CONFLICT (hash) DO NOTHING
+            """,
+            [(digest, codec, size, data) for digest, (codec, size, data) in moved.items()],
+        )
+
+    def _insert_message(
+        self,
+        cursor: sqlite3.Cursor,
+        message_id: str,
+        conversation_id: str,
+        role: str,
+        content: str,
+        tokens_input: int,
+        tokens_output: int,
+        cost: float,
+        tool_calls_json: Optional[str],
+        model: Optional[str],
+        tokens_cache_read: int = 0,
+        tokens_cache_write: int = 0,
+        calls: Optional[int] = None,
+    ) -> None:
+        """Insert a message and update its conversation counters and usage rollup."""
         cursor.execute(
             """
-            INSERT INTO messages (id, conversation_id, role, content, tokens_input, tokens_output, cost, tool_calls)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO messages (
+                id, conversation_id, role, content, tokens_input, tokens_output,
+                tokens_cache_read, tokens_cache_write, cost, tool_calls, model
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (
                 message_id,
@@ -123,141 +613,408 @@ class Database:
                 content,
                 tokens_input,
                 tokens_output,
+                tokens_cache_read,
+                tokens_cache_write,
                 cost,
-                json.dumps(tool_calls) if tool_calls else None,
+                tool_calls_json,
+                model,
             ),
         )
 
-        # Update conversation metadata
-        cursor.execute(
-            """
-            UPDATE conversations
-            SET updated_at = CURRENT_TIMESTAMP,
-                metadata = json_set(
-                    metadata,
-                    '$.message_count',
-                    (SELECT COUNT(*) FROM messages WHERE conversation_id = ?),
-                    '$.daily_cost',
-                    (SELECT COALESCE(SUM(cost), 0.0) FROM messages
-                     WHERE conversation_id = ? AND DATE(timestamp) = DATE('now'))
-                )
-            WHERE id = ?
-            """,
-            (conversation_id, conversation_id, conversation_id),
+        self._add_usage(
+            cursor,
+            conversation_id,
+            model,
+            messages=1,
+            calls=calls if calls is not None else int(role == "assistant"),
+            tokens_input=tokens_input,
+            tokens_output=tokens_output,
+            tokens_cache_read=tokens_cache_read,
+            tokens_cache_write=tokens_cache_write,
+            cost=cost,
         )
 
-        conn.commit()
-        conn.close()
         logger.debug(f"Added message {message_id} to conversation {conversation_id}")
-        return message_id
 
-    def get_conversation_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
-        """Get all messages for a conversation."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+    @staticmethod
+    def _add_usage(
+        cursor: sqlite3.Cursor,
+        conversation_id: str,
+        model: Optional[str],
+        messages: int,
+        calls: int,
+        tokens_input: int,
+        tokens_output: int,
+        tokens_cache_read: int,
+        tokens_cache_write: int,
+        cost: float,
+    ) -> None:
+        """Add usage to the current UTC hour's rollup and to the conversation's counters."""
+        cursor.execute(
+            """
+            INSERT INTO usage_rollup (
+                day, hour, model, messages, calls, tokens_input, tokens_output,
+                tokens_cache_read, tokens_cache_write, cost
+            )
+            VALUES (DATE('now'), CAST(strftime('%H', 'now') AS INTEGER), ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (day, hour, model) DO UPDATE SET
+                messages = messages + excluded.messages,
+                calls = calls + excluded.calls,
+                tokens_input = tokens_input + excluded.tokens_input,
+                tokens_output = tokens_output + excluded.tokens_output,
+                tokens_cache_read = tokens_cache_read + excluded.tokens_cache_read,
+                tokens_cache_write = tokens_cache_write + excluded.tokens_cache_write,
+                cost = cost + excluded.cost
+            """,
+            (
+                model or "",
+                messages,
+                calls,
+                tokens_input,
+                tokens_output,
+                tokens_cache_read,
+                tokens_cache_write,
+                cost,
+            ),
+        )
 
+        # Update conversation counters incrementally
         cursor.execute(
             """
-            SELECT id, role, content, tokens_input, tokens_output, cost, timestamp, tool_calls
-            FROM messages
-            WHERE conversation_id = ?
-            ORDER BY timestamp ASC
+            UPDATE conversations
+            SET updated_at = CURRENT_TIMESTAMP,
+                message_count = message_count + ?,
+                total_cost = total_cost + ?
+            WHERE id = ?
             """,
-            (conversation_id,),
+            (messages, cost, conversation_id),
         )
 
-        messages = []
-        for row in cursor.fetchall():
-            messages.append(
-                {
-                    "id": row["id"],
-                    "role": row["role"],
-                    "content": row["content"],
-                    "tokens": {"input": row["tokens_input"], "output": row["tokens_output"]},
-                    "cost": row["cost"],
-                    "timestamp": row["timestamp"],
-                    "tool_calls": json.loads(row["tool_calls"]) if row["tool_calls"] else None,
-                }
+        if cost:
+            cursor.execute(
+                """
+                INSERT INTO conversation_daily_cost (conversation_id, day, cost)
+                VALUES (?, DATE('now'), ?)
+                ON CONFLICT (conversation_id, day) DO UPDATE SET cost = cost + excluded.cost
+                """,
+                (conversation_id, cost),
             )
 
-        conn.close()
+    def record_usage(
+        self,
+        conversation_id: str,
+        model: Optional[str],
+        tokens_input: int,
+        tokens_output: int,
+        cost: float,
+        tokens_cache_read: int = 0,
+        tokens_cache_write: int = 0,
+    ) -> None:
+        """Record an API call that did not produce a stored message (e.g. a history summary)."""
+        with self.connections.writer() as conn:
+            self._add_usage(
+                conn.cursor(),
+                conversation_id,
+                model,
+                messages=0,
+                calls=1,
+                tokens_input=tokens_input,
+                tokens_output=tokens_output,
+                tokens_cache_read=tokens_cache_read,
+                tokens_cache_write=tokens_cache_write,
+                cost=cost,
+            )
+
+    def get_messages_after(self, conversation_id: str, after_rowid: int = 0) -> List[Dict[str, Any]]:
+        """Get the role and content of a conversation's messages newer than after_rowid, oldest first."""
+        with self.connections.reader() as conn:
+            rows = conn.execute(
+                """
+                SELECT rowid, role, content FROM messages
+                WHERE conversation_id = ? AND rowid > ?
+                ORDER BY rowid
+                """,
+                (conversation_id, after_rowid),
+            ).fetchall()
+
+        return [dict(row) for row in rows]
+
+    def get_conversation_summary(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Get the rolling summary of a conversation's aged-out turns."""
+        with self.connections.reader() as conn:
+            row = conn.execute(
+                """
+                SELECT summary, through_rowid, tokens, updated_at FROM conversation_summaries
+                WHERE conversation_id = ?
+                """,
+                (conversation_id,),
+            ).fetchone()
+
+        return dict(row) if row else None
+
+    def save_conversation_summary(self, conversation_id: str, summary: str, through_rowid: int, tokens: int):
+        """Store the rolling summary covering a conversation's messages up to through_rowid."""
+        with self.connections.writer() as conn:
+            conn.execute(
+                """
+                INSERT INTO conversation_summaries (conversation_id, summary, through_rowid, tokens, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (conversation_id) DO UPDATE SET
+                    summary = excluded.summary,
+                    through_rowid = excluded.through_rowid,
+                    tokens = excluded.tokens,
+                    updated_at = excluded.updated_at
+                """,
+                (conversation_id, summary, through_rowid, tokens),
+            )
+
+    def get_conversation_messages(
+        self, conversation_id: str, include_tool_calls: bool = True, resolve_payloads: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Get all messages for a conversation in insertion order.
+
+        Large tool call payloads stay as {"$payload": hash} references unless resolve_payloads is set.
+        """
+        columns = MESSAGE_COLUMNS + (", tool_calls" if include_tool_calls else "")
+        with self.connections.reader() as conn:
+            rows = conn.execute(
+                f"SELECT {columns} FROM messages WHERE conversation_id = ? ORDER BY rowid",
+                (conversation_id,),
+            ).fetchall()
+            messages = [self._message_from_row(row, include_tool_calls) for row in rows]
+            if include_tool_calls and resolve_payloads:
+                self._resolve_payloads(conn, messages)
+
         return messages
 
+    def get_conversation_messages_page(
+        self,
+        conversation_id: str,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        include_tool_calls: bool = True,
+        resolve_payloads: bool = False,
+    ) -> Dict[str, Any]:
+        """Get the newest messages older than the cursor, oldest first.
+
+        Returns the page plus a next_cursor for the next older page (None on the last page).
+        Paging walks the rowid within the conversation index, so each page costs O(limit).
+        Large tool call payloads stay as references unless resolve_payloads is set.
+        """
+        columns = MESSAGE_COLUMNS + (", tool_calls" if include_tool_calls else "")
+        query = f"SELECT {columns} FROM messages WHERE conversation_id = ?"
+        params: List[Any] = [conversation_id]
+        if cursor:
+            query += " AND rowid < ?"
+            params.append(decode_cursor(cursor, 1)[0])
+        query += " ORDER BY rowid DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self.connections.reader() as conn:
+            rows = conn.execute(query, params).fetchall()
+            next_cursor = encode_cursor(rows[limit - 1]["rowid"]) if len(rows) > limit else None
+            rows = rows[:limit]
+            rows.reverse()
+            messages = [self._message_from_row(row, include_tool_calls) for row in rows]
+            if include_tool_calls and resolve_payloads:
+                self._resolve_payloads(conn, messages)
+
+        return {"messages": messages, "next_cursor": next_cursor}
+
+    @staticmethod
+    def _load_payloads(conn: sqlite3.Connection, hashes: Iterable[str]) -> Dict[str, Any]:
+        """Fetch and decode out-of-line payloads by hash."""
+        hashes = list(hashes)
+        decoded: Dict[str, Any] = {}
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start:start + 500]
+            rows = conn.execute(
+                f"SELECT hash, codec, data FROM tool_payloads WHERE hash IN ({','.join('?' * len(batch))})",
+                batch,
+            ).fetchall()
+            for row in rows:
+                decoded[row["hash"]] = json.loads(payloads.decompress(row["data"], row["codec"]))
+        return decoded
+
+    def _resolve_payloads(self, conn: sqlite3.Connection, messages: List[Dict[str, Any]]) -> None:
+        """Replace payload references in the messages' tool calls, loading each payload once."""
+        hashes = set()
+        for message in messages:
+            hashes |= payloads.referenced_hashes(message.get("tool_calls"))
+        if not hashes:
+            return
+
+        decoded = self._load_payloads(conn, hashes)
+        for message in messages:
+            if message.get("tool_calls"):
+                message["tool_calls"] = payloads.resolve(message["tool_calls"], decoded)
+
+    def get_tool_payload(self, payload_hash: str) -> Optional[Any]:
+        """Get one decoded out-of-line tool payload, or None if it does not exist."""
+        with self.connections.reader() as conn:
+            return self._load_payloads(conn, [payload_hash]).get(payload_hash)
+
+    @staticmethod
+    def _message_from_row(row: sqlite3.Row, include_tool_calls: bool) -> Dict[str, Any]:
+        """Build a message dict, decoding tool calls only when they were selected."""
+        message = {
+            "id": row["id"],
+            "role": row["role"],
+            "content": row["content"],
+            "tokens": {
+                "input": row["tokens_input"],
+                "output": row["tokens_output"],
+                "cache_read": row["tokens_cache_read"],
+                "cache_write": row["tokens_cache_write"],
+            },
+            "cost": row["cost"],
+            "timestamp": row["timestamp"],
+        }
+        if include_tool_calls:
+            message["tool_calls"] = json.loads(row["tool_calls"]) if row["tool_calls"] else None
+        return message
+
     def get_conversation(self, conversation_id: str) -> Optional[Dict[str, Any]]:
         """Get conversation details."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        with self.connections.reader() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute(
-            """
-            SELECT id, created_at, updated_at, title, metadata
-            FROM conversations
-            WHERE id = ?
-            """,
-            (conversation_id,),
-        )
+            cursor.execute(CONVERSATION_COLUMNS + "WHERE c.id = ?", (conversation_id,))
 
-        row = cursor.fetchone()
-        conn.close()
+            row = cursor.fetchone()
 
         if not row:
             return None
 
-        metadata = json.loads(row["metadata"]) if row["metadata"] else {}
+        return self._conversation_from_row(row)
 
+    @staticmethod
+    def _conversation_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+        """Build a conversation dict from a row selected with its counters and today's cost."""
         return {
             "id": row["id"],
             "title": row["title"],
             "created_at": row["created_at"],
             "updated_at": row["updated_at"],
-            "message_count": metadata.get("message_count", 0),
-            "daily_cost": metadata.get("daily_cost", 0.0),
+            "message_count": row["message_count"],
+            "total_cost": row["total_cost"],
+            "daily_cost": row["daily_cost"],
         }
 
     def get_all_conversations(self) -> List[Dict[str, Any]]:
         """Get all conversations."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        with self.connections.reader() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute(
-            """
-            SELECT id, created_at, updated_at, title, metadata
-            FROM conversations
-            ORDER BY updated_at DESC
-            """
-        )
+            cursor.execute(CONVERSATION_COLUMNS + "ORDER BY c.updated_at DESC, c.id DESC")
 
-        conversations = []
-        for row in cursor.fetchall():
-            metadata = json.loads(row["metadata"]) if row["metadata"] else {}
-            conversations.append(
-                {
-                    "id": row["id"],
-                    "title": row["title"],
-                    "created_at": row["created_at"],
-                    "updated_at": row["updated_at"],
-                    "message_count": metadata.get("message_count", 0),
-                    "daily_cost": metadata.get("daily_cost", 0.0),
-                }
-            )
+            conversations = [self._conversation_from_row(row) for row in cursor.fetchall()]
 
-        conn.close()
         return conversations
 
+    def get_conversations_page(self, limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Get one page of conversations, most recently updated first.
+
+        Keyset pagination on (updated_at, id): each page is an index range scan no matter
+        how deep it is. Returns the page plus a next_cursor (None on the last page).
+        """
+        query = CONVERSATION_COLUMNS
+        params: List[Any] = []
+        if cursor:
+            query += "WHERE (c.updated_at, c.id) < (?, ?) "
+            params.extend(decode_cursor(cursor, 2))
+        query += "ORDER BY c.updated_at DESC, c.id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self.connections.reader() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(last["updated_at"], last["id"])
+
+        return {
+            "conversations": [self._conversation_from_row(row) for row in rows[:limit]],
+            "next_cursor": next_cursor,
+        }
+
+    def search_messages(
+        self,
+        query: str,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        conversation_id: Optional[str] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+    ) -> Dict[str, Any]:
+        """Full-text search over message content and tool names, best bm25 match first.
+
+        Returns the hits with highlighted snippets plus a next_cursor (None on the last page).
+        Raises ValueError for an empty query or malformed cursor.
+        """
+        match = fts_query(query)
+        if not match:
+            raise ValueError("Search query is empty")
+        offset = decode_cursor(cursor, 1)[0] if cursor else 0
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError(f"Invalid cursor: {cursor}")
+
+        sql = """
+            SELECT m.id, m.conversation_id, c.title, m.role, m.timestamp,
+                   snippet(messages_fts, -1, '[', ']', '…', 16) AS snippet,
+                   bm25(messages_fts) AS rank
+            FROM messages_fts
+            JOIN messages m ON m.rowid = messages_fts.rowid
+            JOIN conversations c ON c.id = m.conversation_id
+            WHERE messages_fts MATCH ?
+        """
+        params: List[Any] = [match]
+        if conversation_id:
+            sql += " AND messages_fts.conversation_id = ?"
+            params.append(conversation_id)
+        if start_date:
+            sql += " AND m.timestamp >= ?"
+            params.append(start_date.isoformat())
+        if end_date:
+            sql += " AND m.timestamp < DATE(?, '+1 day')"
+            params.append(end_date.isoformat())
+        sql += " ORDER BY rank LIMIT ? OFFSET ?"
+        params.extend([limit + 1, offset])
+
+        with self.connections.reader() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        return {
+            "results": [
+                {
+                    "message_id": row["id"],
+                    "conversation_id": row["conversation_id"],
+                    "conversation_title": row["title"],
+                    "role": row["role"],
+                    "timestamp": row["timestamp"],
+                    "snippet": row["snippet"],
+                    "rank": row["rank"],
+                }
+                for row in rows[:limit]
+            ],
+            "next_cursor": encode_cursor(offset + limit) if len(rows) > limit else None,
+        }
+
     def delete_conversation(self, conversation_id: str) -> bool:
-        """Delete a conversation and all its messages."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """Delete a conversation and all its messages, archived ones included."""
+        # Queued inserts must land before the delete, or they would be orphaned
+        self.flush()
+        with self.connections.writer() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
-        cursor.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+            cursor.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+            cursor.execute("DELETE FROM messages_archive WHERE conversation_id = ?", (conversation_id,))
+            cursor.execute("DELETE FROM conversation_daily_cost WHERE conversation_id = ?", (conversation_id,))
+            cursor.execute("DELETE FROM conversation_summaries WHERE conversation_id = ?", (conversation_id,))
+            cursor.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
 
-        conn.commit()
-        rows_deleted = cursor.rowcount
-        conn.close()
+            rows_deleted = cursor.rowcount
 
         if rows_deleted > 0:
             logger.info(f"Deleted conversation {conversation_id}")
@@ -267,96 +1024,143 @@ class Database:
 
     def update_conversation_title(self, conversation_id: str, title: str) -> bool:
         """Update conversation title."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.connections.writer() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute("UPDATE conversations SET title = ? WHERE id = ?", (title, conversation_id))
+            cursor.execute("UPDATE conversations SET title = ? WHERE id = ?", (title, conversation_id))
 
-        conn.commit()
-        success = cursor.rowcount > 0
-        conn.close()
+            success = cursor.rowcount > 0
 
         return success
 
     def get_daily_cost(self, target_date: Optional[date] = None) -> float:
         """Get total API cost for a specific date (default: today UTC)."""
-        if target_date is None:
-            target_date = date.today()
-
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            SELECT COALESCE(SUM(cost), 0.0) as total_cost
-            FROM messages
-            WHERE DATE(timestamp) = ?
-            """,
-            (target_date.isoformat(),),
-        )
-
-        result = cursor.fetchone()
-        conn.close()
-
-        return result[0] if result else 0.0
+        return self._get_daily_total("cost", target_date)
 
     def get_daily_call_count(self, target_date: Optional[date] = None) -> int:
         """Get number of API calls for a specific date (default: today UTC)."""
-        if target_date is None:
-            target_date = date.today()
+        return self._get_daily_total("calls", target_date)
 
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def get_daily_token_count(self, target_date: Optional[date] = None) -> int:
+        """Get number of input plus output tokens for a specific date (default: today UTC)."""
+        return self._get_daily_total("tokens_input + tokens_output", target_date)
 
-        cursor.execute(
-            """
-            SELECT COUNT(*) as call_count
-            FROM messages
-            WHERE role = 'assistant' AND DATE(timestamp) = ?
-            """,
-            (target_date.isoformat(),),
-        )
+    def _get_daily_total(self, expression: str, target_date: Optional[date] = None) -> Any:
+        """Sum a usage_rollup expression over one day's rows (at most 24 per model)."""
+        if target_date is None:
+            target_date = datetime.now(timezone.utc).date()
 
-        result = cursor.fetchone()
-        conn.close()
+        with self.connections.reader() as conn:
+            row = conn.execute(
+                f"SELECT COALESCE(SUM({expression}), 0) FROM usage_rollup WHERE day = ?",
+                (target_date.isoformat(),),
+            ).fetchone()
 
-        return result[0] if result else 0
+        return row[0] if row else 0
+
+    def get_usage(
+        self,
+        start_date: date,
+        end_date: date,
+        group_by: str = "day",
+        model: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Get usage totals for an inclusive date range, grouped by day, hour or model."""
+        group_columns = {
+            "day": "day",
+            "hour": "day, hour",
+            "model": "model",
+        }
+        if group_by not in group_columns:
+            raise ValueError(f"Invalid group_by: {group_by}")
+        columns = group_columns[group_by]
+
+        query = f"""
+            SELECT {columns}, SUM(messages) AS messages, SUM(calls) AS calls,
+                   SUM(tokens_input) AS tokens_input, SUM(tokens_output) AS tokens_output,
+                   SUM(tokens_cache_read) AS tokens_cache_read, SUM(tokens_cache_write) AS tokens_cache_write,
+                   SUM(cost) AS cost
+            FROM usage_rollup
+            WHERE day BETWEEN ? AND ?
+        """
+        params: List[Any] = [start_date.isoformat(), end_date.isoformat()]
+        if model is not None:
+            query += " AND model = ?"
+            params.append(model)
+        query += f" GROUP BY {columns} ORDER BY {columns}"
+
+        with self.connections.reader() as conn:
+            return [dict(row) for row in conn.execute(query, params).fetchall()]
 
     # HA State Cache operations
 
     def cache_entity_state(self, entity_id: str, state: str, attributes: Dict[str, Any], last_updated: datetime):
         """Cache or update an entity's state."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.connections.writer() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                INSERT OR REPLACE INTO ha_state_cache (entity_id, state, attributes, last_updated, cached_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """,
+                (entity_id, state, json.dumps(attributes), last_updated.isoformat()),
+            )
 
-        cursor.execute(
-            """
-            INSERT OR REPLACE INTO ha_state_cache (entity_id, state, attributes, last_updated, cached_at)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """,
-            (entity_id, state, json.dumps(attributes), last_updated.isoformat()),
-        )
+    def cache_entity_states_bulk(self, rows: List[tuple]) -> int:
+        """Upsert many cached entity states in one transaction.
+
+        Each row is (entity_id, state, attributes_json, last_updated_iso), with the
+        attributes already serialized.
+        """
+        if not rows:
+            return 0
+
+        with self.connections.writer() as conn:
+            cursor = conn.cursor()
+
+            cursor.executemany(
+                """
+                INSERT OR REPLACE INTO ha_state_cache (entity_id, state, attributes, last_updated, cached_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """,
+                rows,
+            )
+
+        return len(rows)
+
+    def delete_cached_entities(self, entity_ids: List[str], batch_size: int = 500) -> int:
+        """Remove many entities from cache, batching the IN lists to stay under SQLite's variable limit."""
+        if not entity_ids:
+            return 0
 
-        conn.commit()
-        conn.close()
+        with self.connections.writer() as conn:
+            cursor = conn.cursor()
+
+            count = 0
+            for start in range(0, len(entity_ids), batch_size):
+                batch = entity_ids[start : start + batch_size]
+                placeholders = ",".join("?" * len(batch))
+                cursor.execute(f"DELETE FROM ha_state_cache WHERE entity_id IN ({placeholders})", batch)
+                count += cursor.rowcount
+
+        return count
 
     def get_cached_entity_state(self, entity_id: str) -> Optional[Dict[str, Any]]:
         """Get cached entity state."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            SELECT entity_id, state, attributes, last_updated, cached_at
-            FROM ha_state_cache
-            WHERE entity_id = ?
-            """,
-            (entity_id,),
-        )
+        with self.connections.reader() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                SELECT entity_id, state, attributes, last_updated, cached_at
+                FROM ha_state_cache
+                WHERE entity_id = ?
+                """,
+                (entity_id,),
+            )
 
-        row = cursor.fetchone()
-        conn.close()
+            row = cursor.fetchone()
 
         if not row:
             return None
@@ -369,58 +1173,255 @@ class Database:
             "cached_at": row["cached_at"],
         }
 
-    def get_all_cached_entities(self) -> List[Dict[str, Any]]:
-        """Get all cached entity states."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            SELECT entity_id, state, attributes, last_updated, cached_at
-            FROM ha_state_cache
-            ORDER BY entity_id
-            """
-        )
-
-        entities = []
-        for row in cursor.fetchall():
-            entities.append(
-                {
-                    "entity_id": row["entity_id"],
-                    "state": row["state"],
-                    "attributes": json.loads(row["attributes"]) if row["attributes"] else {},
-                    "last_updated": row["last_updated"],
-                    "cached_at": row["cached_at"],
-                }
+    def get_all_cached_entities(self, raw_attributes: bool = False) -> List[Dict[str, Any]]:
+        """Get all cached entity states, optionally leaving attributes as the stored JSON text."""
+        with self.connections.reader() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                SELECT entity_id, state, attributes, last_updated, cached_at
+                FROM ha_state_cache
+                ORDER BY entity_id
+                """
             )
 
-        conn.close()
+            entities = []
+            for row in cursor.fetchall():
+                entities.append(
+                    {
+                        "entity_id": row["entity_id"],
+                        "state": row["state"],
+                        "attributes": (
+                            row["attributes"]
+                            if raw_attributes
+                            else json.loads(row["attributes"]) if row["attributes"] else {}
+                        ),
+                        "last_updated": row["last_updated"],
+                        "cached_at": row["cached_at"],
+                    }
+                )
+
         return entities
 
     def clear_entity_cache(self, entity_id: str) -> bool:
         """Remove an entity from cache."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.connections.writer() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute("DELETE FROM ha_state_cache WHERE entity_id = ?", (entity_id,))
+            cursor.execute("DELETE FROM ha_state_cache WHERE entity_id = ?", (entity_id,))
 
-        conn.commit()
-        success = cursor.rowcount > 0
-        conn.close()
+            success = cursor.rowcount > 0
 
         return success
 
     def clear_all_cache(self) -> int:
         """Clear all cached entity states."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.connections.writer() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute("DELETE FROM ha_state_cache")
+            cursor.execute("DELETE FROM ha_state_cache")
 
-        conn.commit()
-        count = cursor.rowcount
-        conn.close()
+            count = cursor.rowcount
 
         logger.info(f"Cleared {count} cached entities")
         return count
+
+    # Retention and storage
+
+    def archive_messages_older_than(self, max_age_days: float, batch_size: int = 500) -> int:
+        """Archive one batch of summarized messages older than max_age_days; returns how many were moved."""
+        with self.connections.writer() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT rowid, * FROM messages
+                WHERE timestamp < datetime('now', ?) AND {SUMMARIZED}
+                ORDER BY timestamp
+                LIMIT ?
+                """,
+                (f"-{max_age_days} days", batch_size),
+            ).fetchall()
+            # Conversation rows stay, so title, created_at and totals remain listed for the archive
+            return self._archive_rows(conn.cursor(), rows)
+
+    def archive_messages_beyond_last(self, keep_last: int, batch_size: int = 500) -> int:
+        """Archive one batch of summarized messages that are not among the last keep_last of their conversation."""
+        with self.connections.writer() as conn:
+            rows: List[sqlite3.Row] = []
+            over_limit = conn.execute(
+                """
+                SELECT c.id, COALESCE(s.through_rowid, 0) AS through_rowid
+                FROM conversations c
+                LEFT JOIN conversation_summaries s ON s.conversation_id = c.id
+                WHERE c.message_count > ?
+                ORDER BY c.message_count DESC
+                """,
+                (keep_last,),
+            ).fetchall()
+            for conversation in over_limit:
+                # The offset counts every message, so filter to summarized rows afterwards
+                rows.extend(
+                    conn.execute(
+                        """
+                        SELECT * FROM (
+                            SELECT rowid, * FROM messages
+                            WHERE conversation_id = ?
+                            ORDER BY rowid DESC
+                            LIMIT -1 OFFSET ?
+                        )
+                        WHERE rowid <= ?
+                        ORDER BY rowid DESC
+                        LIMIT ?
+                        """,
+                        (conversation["id"], keep_last, conversation["through_rowid"], batch_size - len(rows)),
+                    ).fetchall()
+                )
+                if len(rows) >= batch_size:
+                    break
+
+            return self._archive_rows(conn.cursor(), rows)
+
+    def archive_oldest_messages(self, batch_size: int = 500) -> int:
+        """Archive the oldest batch of summarized messages regardless of age (used by the size policy)."""
+        with self.connections.writer() as conn:
+            rows = conn.execute(
+                f"SELECT rowid, * FROM messages WHERE {SUMMARIZED} ORDER BY rowid LIMIT ?", (batch_size,)
+            ).fetchall()
+            return self._archive_rows(conn.cursor(), rows)
+
+    def _archive_rows(self, cursor: sqlite3.Cursor, rows: List[sqlite3.Row]) -> int:
+        """Move message rows into messages_archive and adjust their conversations' counters."""
+        if not rows:
+            return 0
+
+        # Archived rows are self-contained: inline their payloads before the refs are dropped
+        tool_calls_by_id = {row["id"]: json.loads(row["tool_calls"]) for row in rows if row["tool_calls"]}
+        hashes = set()
+        for tool_calls in tool_calls_by_id.values():
+            hashes |= payloads.referenced_hashes(tool_calls)
+        decoded = self._load_payloads(cursor.connection, hashes) if hashes else {}
+
+        archive_rows = []
+        removed_per_conversation: Dict[str, int] = {}
+        for row in rows:
+            message = {key: row[key] for key in row.keys() if key != "rowid"}
+            if row["id"] in tool_calls_by_id:
+                message["tool_calls"] = payloads.resolve(tool_calls_by_id[row["id"]], decoded)
+            archive_rows.append(
+                (
+                    row["id"],
+                    row["conversation_id"],
+                    row["timestamp"],
+                    row["rowid"],
+                    "zlib",
+                    zlib.compress(json.dumps(message).encode("utf-8")),
+                )
+            )
+            conversation_id = row["conversation_id"]
+            removed_per_conversation[conversation_id] = removed_per_conversation.get(conversation_id, 0) + 1
+
+        cursor.executemany(
+            """
+            INSERT OR REPLACE INTO messages_archive (id, conversation_id, timestamp, source_rowid, codec, data)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            archive_rows,
+        )
+        cursor.executemany("DELETE FROM messages WHERE rowid = ?", [(row["rowid"],) for row in rows])
+
+        # Totals and the usage rollup keep counting archived spend; only the live count drops
+        cursor.executemany(
+            "UPDATE conversations SET message_count = MAX(message_count - ?, 0) WHERE id = ?",
+            [(count, conversation_id) for conversation_id, count in removed_per_conversation.items()],
+        )
+
+        return len(rows)
+
+    def get_archived_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
+        """Decompress the archived messages of a conversation, oldest first."""
+        with self.connections.reader() as conn:
+            # Rows archived before source_rowid was recorded sort first, by timestamp
+            rows = conn.execute(
+                """
+                SELECT codec, data FROM messages_archive
+                WHERE conversation_id = ?
+                ORDER BY source_rowid IS NOT NULL, source_rowid, timestamp, id
+                """,
+                (conversation_id,),
+            ).fetchall()
+
+        messages = [json.loads(zlib.decompress(row["data"])) for row in rows if row["codec"] == "zlib"]
+        for message in messages:
+            # Older archive records hold tool_calls as an encoded JSON string
+            if isinstance(message.get("tool_calls"), str):
+                message["tool_calls"] = json.loads(message["tool_calls"])
+        return messages
+
+    def merge_search_index(self, pages: int = 256) -> bool:
+        """Merge search index segments, writing up to about pages pages; returns whether work was done.
+
+        FTS5 only records deletions as tombstones; merging drops them so archived messages stop
+        taking up index space.
+        """
+        with self.connections.writer() as conn:
+            changes = conn.total_changes
+            conn.execute("INSERT INTO messages_fts (messages_fts, rank) VALUES ('merge', ?)", (-int(pages),))
+            return conn.total_changes - changes > 1
+
+    def incremental_vacuum(self, pages: int = 256) -> int:
+        """Return up to pages free pages to the filesystem; returns the bytes reclaimed."""
+        with self.connections.writer() as conn:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+            free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+        return (free_before - free_after) * page_size
+
+    @staticmethod
+    def _archive_bytes(conn: sqlite3.Connection) -> int:
+        """Bytes used by messages_archive and its index (compressed data size without dbstat)."""
+        try:
+            row = conn.execute(
+                """
+                SELECT COALESCE(SUM(pgsize), 0) FROM dbstat
+                WHERE name IN (
+                    'messages_archive', 'sqlite_autoindex_messages_archive_1', 'idx_messages_archive_order'
+                )
+                """
+            ).fetchone()
+        except sqlite3.OperationalError:
+            # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+            row = conn.execute("SELECT COALESCE(SUM(length(data)), 0) FROM messages_archive").fetchone()
+        return row[0]
+
+    def get_storage_stats(self) -> Dict[str, Any]:
+        """Get file size, free space and row counts of the database."""
+        with self.connections.reader() as conn:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            counts = conn.execute(
+                """
+                SELECT (SELECT COUNT(*) FROM conversations) AS conversations,
+                       (SELECT COUNT(*) FROM messages) AS messages,
+                       (SELECT COUNT(*) FROM messages_archive) AS archived_messages,
+                       (SELECT COUNT(*) FROM tool_payloads) AS tool_payloads,
+                       (SELECT COALESCE(SUM(size), 0) FROM tool_payloads) AS tool_payload_bytes,
+                       (SELECT COALESCE(SUM(length(data)), 0) FROM tool_payloads) AS tool_payload_stored_bytes
+                """
+            ).fetchone()
+            archive_bytes = self._archive_bytes(conn)
+
+        return {
+            "file_bytes": page_count * page_size,
+            "used_bytes": (page_count - freelist) * page_size,
+            "free_bytes": freelist * page_size,
+            "archive_bytes": archive_bytes,
+            "conversations": counts["conversations"],
+            "messages": counts["messages"],
+            "archived_messages": counts["archived_messages"],
+            "tool_payloads": counts["tool_payloads"],
+            "tool_payload_bytes": counts["tool_payload_bytes"],
+            "tool_payload_stored_bytes": counts["tool_payload_stored_bytes"],
+        }
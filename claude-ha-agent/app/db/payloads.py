@@ -0,0 +1,94 @@
+"""Content-addressed, compressed storage format for large tool-call payloads."""
+import hashlib
+import json
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    import zstandard
+except ImportError:  # Optional: fall back to zlib
+    zstandard = None
+
+PAYLOAD_REF = "$payload"
+
+# Tool call fields that may be moved out of line
+PAYLOAD_FIELDS = ("input", "result")
+
+DEFAULT_CODEC = "zstd" if zstandard else "zlib"
+
+
+def compress(data: bytes, codec: str = DEFAULT_CODEC) -> bytes:
+    """Compress payload bytes with the given codec."""
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    raise ValueError(f"Unknown payload codec: {codec}")
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    """Decompress payload bytes stored with the given codec."""
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed tool payloads")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    raise ValueError(f"Unknown payload codec: {codec}")
+
+
+def is_ref(value: Any) -> bool:
+    """Whether a tool call field has been replaced by a payload reference."""
+    return isinstance(value, dict) and PAYLOAD_REF in value
+
+
+def externalize(
+    tool_calls: List[Dict[str, Any]], inline_max: int
+) -> Tuple[List[Dict[str, Any]], Dict[str, Tuple[str, int, bytes]]]:
+    """Replace tool call fields larger than inline_max bytes of JSON with content-hash references.
+
+    Returns the rewritten tool calls plus {hash: (codec, size, compressed data)} for the
+    payloads that were moved out. Identical payloads share one hash.
+    """
+    payloads: Dict[str, Tuple[str, int, bytes]] = {}
+    rewritten = []
+    for tool_call in tool_calls:
+        tool_call = dict(tool_call)
+        for field in PAYLOAD_FIELDS:
+            if field not in tool_call or is_ref(tool_call[field]):
+                continue
+
+            data = json.dumps(tool_call[field], separators=(",", ":"), sort_keys=True).encode("utf-8")
+            if len(data) <= inline_max:
+                continue
+
+            digest = hashlib.sha256(data).hexdigest()
+            if digest not in payloads:
+                payloads[digest] = (DEFAULT_CODEC, len(data), compress(data))
+            tool_call[field] = {PAYLOAD_REF: digest, "size": len(data)}
+        rewritten.append(tool_call)
+
+    return rewritten, payloads
+
+
+def referenced_hashes(tool_calls: Optional[Iterable[Dict[str, Any]]]) -> Set[str]:
+    """Hashes of the payloads referenced by a list of tool calls."""
+    hashes = set()
+    for tool_call in tool_calls or ():
+        for field in PAYLOAD_FIELDS:
+            if is_ref(tool_call.get(field)):
+                hashes.add(tool_call[field][PAYLOAD_REF])
+    return hashes
+
+
+def resolve(tool_calls: List[Dict[str, Any]], payloads: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Replace payload references with their decoded values; unknown references are left as-is."""
+    resolved = []
+    for tool_call in tool_calls:
+        tool_call = dict(tool_call)
+        for field in PAYLOAD_FIELDS:
+            value = tool_call.get(field)
+            if is_ref(value) and value[PAYLOAD_REF] in payloads:
+                tool_call[field] = payloads[value[PAYLOAD_REF]]
+        resolved.append(tool_call)
+    return resolved
@@ -0,0 +1,105 @@
+"""Group-commit write queue for the SQLite writer connection."""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.db.connection_manager import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class GroupCommitQueue:
+    """Batches queued write operations into one transaction on a dedicated thread.
+
+    Each operation is a callable taking a cursor. Operations queued while a batch is being
+    committed, or within window_ms of the first one, share its transaction, so concurrent
+    writers pay for one commit instead of one each. Every operation runs inside its own
+    savepoint, so a failing operation is rolled back alone and reported through its future.
+    """
+
+    def __init__(self, connections: ConnectionManager, window_ms: float = 2.0, max_batch: int = 256):
+        """Initialize write queue and start its commit thread."""
+        self.connections = connections
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue()
+        self.stats: Dict[str, int] = {"batches": 0, "operations": 0, "failed": 0, "largest_batch": 0}
+        self._thread = threading.Thread(target=self._run, name="db-group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, operation: Callable[[sqlite3.Cursor], Any]) -> Future:
+        """Queue an operation; the future resolves with its result once the batch has committed."""
+        future: Future = Future()
+        self._queue.put((operation, future))
+        return future
+
+    def flush(self, timeout: Optional[float] = None):
+        """Block until everything queued so far has been committed."""
+        self.submit(lambda cursor: None).result(timeout)
+
+    def close(self):
+        """Commit what is queued and stop the commit thread."""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        """Collect and commit batches until stopped."""
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._commit(batch)
+
+    def _commit(self, batch: List[Tuple[Callable, Future]]):
+        """Run a batch in one transaction and resolve its futures after the commit."""
+        outcomes = []
+        try:
+            with self.connections.writer() as conn:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN")
+                for operation, future in batch:
+                    cursor.execute("SAVEPOINT queued_write")
+                    try:
+                        outcomes.append((future, operation(cursor), None))
+                        cursor.execute("RELEASE queued_write")
+                    except Exception as e:
+                        cursor.execute("ROLLBACK TO queued_write")
+                        cursor.execute("RELEASE queued_write")
+                        outcomes.append((future, None, e))
+        except Exception as e:
+            logger.error(f"Group commit of {len(batch)} writes failed: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            self.stats["failed"] += len(batch)
+            return
+
+        for future, result, error in outcomes:
+            if error is not None:
+                self.stats["failed"] += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        self.stats["batches"] += 1
+        self.stats["operations"] += len(batch)
+        self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
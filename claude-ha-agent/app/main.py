@@ -9,6 +9,7 @@ from fastapi.staticfiles import StaticFiles
 
 from app.config import config
 from app.db.database import Database
+from app.db.async_database import AsyncDatabase
 from app.services.ha_client import HAClient
 from app.services.claude_service import ClaudeService
 from app.services.conversation_service import ConversationService
@@ -16,6 +17,8 @@ from app.services.entity_service import EntityService
 from app.services.integration_service import IntegrationService
 from app.services.automation_service import AutomationService
 from app.services.analysis_service import AnalysisService
+from app.services.state_persistence import StatePersistenceService
+from app.services.retention_service import RetentionService
 from app.tools.tool_executor import ToolExecutor
 from app.tools import entity_tools, integration_tools, automation_tools, analysis_tools
 from app.api import routes
@@ -45,31 +48,87 @@ async def lifespan(app: FastAPI):
         config.validate_required()
 
         # Initialize database
-        database = Database(config.DB_PATH)
+        database = Database(
+            config.DB_PATH,
+            read_pool_size=config.DB_READ_POOL_SIZE,
+            mmap_size=config.DB_MMAP_SIZE,
+            busy_timeout_ms=config.DB_BUSY_TIMEOUT_MS,
+            synchronous=config.DB_SYNCHRONOUS,
+            cached_statements=config.DB_STATEMENT_CACHE_SIZE,
+            group_commit_window_ms=config.DB_GROUP_COMMIT_WINDOW_MS,
+            group_commit_max_batch=config.DB_GROUP_COMMIT_MAX_BATCH,
+            payload_inline_max=config.TOOL_PAYLOAD_INLINE_BYTES,
+            startup_vacuum_max_bytes=int(config.DB_STARTUP_VACUUM_MAX_MB * 1024 * 1024),
+        )
+        async_database = AsyncDatabase(database)
         logger.info(f"Database initialized at {config.DB_PATH}")
 
         # Initialize HA WebSocket client
-        ha_client = HAClient(config.HA_URL, config.HA_TOKEN, config.HA_WEBSOCKET_URL)
-
-        # Connect to HA
-        ha_connected = await ha_client.connect()
-        if not ha_connected:
-            logger.error("Failed to connect to Home Assistant")
+        ha_client = HAClient(
+            config.HA_URL,
+            config.HA_TOKEN,
+            config.HA_WEBSOCKET_URL,
+            pool_limit=config.HA_HTTP_POOL_LIMIT,
+            pool_limit_per_host=config.HA_HTTP_POOL_LIMIT_PER_HOST,
+            dns_cache_ttl=config.HA_HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=config.HA_HTTP_KEEPALIVE_TIMEOUT,
+            request_timeout=config.HA_HTTP_TIMEOUT,
+            heartbeat_interval=config.HA_HEARTBEAT_INTERVAL,
+            heartbeat_timeout=config.HA_HEARTBEAT_TIMEOUT,
+            max_reconnect_delay=config.HA_RECONNECT_MAX_DELAY,
+            dispatch_window=config.HA_DISPATCH_WINDOW,
+            dispatch_max_pending=config.HA_DISPATCH_MAX_PENDING,
+            dispatch_queue_size=config.HA_DISPATCH_QUEUE_SIZE,
+            dispatch_workers=config.HA_DISPATCH_WORKERS,
+        )
+
+        # Warm the state cache from the last checkpoint before HA answers
+        state_persistence = StatePersistenceService(async_database, ha_client, config.STATE_CHECKPOINT_INTERVAL)
+        restored = await state_persistence.restore() if config.STATE_WARM_START else 0
+        state_persistence.start()
+
+        # Connect to HA; with a warm cache, serve immediately and let it connect in the background
+        connect_task = None
+        if restored:
+            connect_task = asyncio.create_task(ha_client.connect())
+            logger.info(f"Serving {restored} persisted entity states while connecting to Home Assistant")
+        elif not await ha_client.connect():
+            logger.error("Failed to connect to Home Assistant, will keep retrying in background")
         else:
             logger.info("Connected to Home Assistant")
 
         # Initialize Claude service
-        claude_service = ClaudeService(config.CLAUDE_API_KEY, config.CLAUDE_MODEL)
+        claude_service = ClaudeService(
+            config.CLAUDE_API_KEY,
+            config.CLAUDE_MODEL,
+            max_connections=config.CLAUDE_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.CLAUDE_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=config.CLAUDE_HTTP_KEEPALIVE_EXPIRY,
+            connect_timeout=config.CLAUDE_HTTP_CONNECT_TIMEOUT,
+            request_timeout=config.CLAUDE_HTTP_TIMEOUT,
+        )
 
         # Load daily stats for Claude service
-        today_cost = database.get_daily_cost()
-        today_tokens = 0  # TODO: Calculate from database
-        claude_service.set_daily_stats(database.get_daily_call_count(), today_tokens)
+        today_tokens = await async_database.get_daily_token_count()
+        claude_service.set_daily_stats(await async_database.get_daily_call_count(), today_tokens)
 
         logger.info(f"Daily stats loaded - Calls: {claude_service.call_count_today}")
 
+        # Prune conversation history in the background per the retention policy
+        retention_service = RetentionService(
+            async_database,
+            max_age_days=config.RETENTION_MAX_AGE_DAYS,
+            keep_last=config.RETENTION_KEEP_LAST,
+            max_db_bytes=int(config.RETENTION_MAX_DB_MB * 1024 * 1024),
+            interval=config.RETENTION_INTERVAL_HOURS * 3600,
+            batch_size=config.RETENTION_BATCH_SIZE,
+            vacuum_pages=config.RETENTION_VACUUM_PAGES,
+            full_vacuum=config.RETENTION_FULL_VACUUM,
+        )
+        retention_service.start()
+
         # Initialize conversation service
-        conversation_service = ConversationService(database)
+        conversation_service = ConversationService(async_database, claude_service)
 
         # Initialize domain-specific services
         entity_service = EntityService(ha_client)
@@ -90,8 +149,10 @@ async def lifespan(app: FastAPI):
 
         # Store services globally for API routes
         _services = {
-            "database": database,
+            "database": async_database,
             "ha_client": ha_client,
+            "state_persistence": state_persistence,
+            "retention_service": retention_service,
             "claude_service": claude_service,
             "conversation_service": conversation_service,
             "entity_service": entity_service,
@@ -111,7 +172,13 @@ async def lifespan(app: FastAPI):
 
         # Shutdown
         logger.info("Shutting down Claude HA Agent")
+        if connect_task and not connect_task.done():
+            connect_task.cancel()
+        await retention_service.stop()
+        await state_persistence.stop()
         await ha_client.disconnect()
+        await claude_service.close()
+        await async_database.close()
         logger.info("Shutdown complete")
 
     except Exception as e:
@@ -134,6 +201,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include API routes
@@ -22,6 +22,11 @@ class MessageResponse(BaseModel):
     cost: float = Field(default=0.0, description="API cost for this message")
     tokens: Dict[str, int] = Field(default_factory=dict, description="Token counts")
     timestamp: datetime = Field(default_factory=datetime.utcnow, description="Message timestamp")
+    rounds: Optional[List[Dict[str, Any]]] = Field(default=None, description="Per-round timings and usage")
+    stop_reason: Optional[str] = Field(
+        default=None,
+        description="Why the agent loop stopped: Claude's stop reason, or max_rounds, token_budget or max_seconds",
+    )
 
 
 class ConversationResponse(BaseModel):
@@ -33,6 +38,7 @@ class ConversationResponse(BaseModel):
     updated_at: datetime = Field(..., description="Last update timestamp")
     message_count: int = Field(..., description="Number of messages")
     daily_cost: float = Field(default=0.0, description="Daily API cost")
+    total_cost: float = Field(default=0.0, description="Total API cost of the conversation")
     messages: Optional[List[MessageResponse]] = Field(default=None, description="Messages in conversation")
 
 
@@ -51,6 +57,7 @@ class StatusResponse(BaseModel):
     claude_available: bool = Field(..., description="Claude API availability")
     uptime_seconds: float = Field(..., description="Uptime in seconds")
     database: str = Field(..., description="Database status")
+    ha_metrics: Optional[Dict[str, Any]] = Field(default=None, description="HA connection metrics")
 
 
 class CostResponse(BaseModel):
@@ -63,6 +70,50 @@ class CostResponse(BaseModel):
     over_threshold: bool = Field(..., description="Cost exceeds threshold")
 
 
+class UsageRow(BaseModel):
+    """Usage totals for one group of a usage query."""
+
+    day: Optional[str] = Field(default=None, description="UTC day (YYYY-MM-DD)")
+    hour: Optional[int] = Field(default=None, description="UTC hour of day")
+    model: Optional[str] = Field(default=None, description="Claude model")
+    messages: int = Field(..., description="Messages stored")
+    calls: int = Field(..., description="API calls (assistant messages)")
+    tokens_input: int = Field(..., description="Input tokens")
+    tokens_output: int = Field(..., description="Output tokens")
+    tokens_cache_read: int = Field(default=0, description="Input tokens read from the prompt cache")
+    tokens_cache_write: int = Field(default=0, description="Input tokens written to the prompt cache")
+    cost: float = Field(..., description="Cost in USD")
+
+
+class SearchResult(BaseModel):
+    """One message matched by a full-text search."""
+
+    message_id: str = Field(..., description="Matched message ID")
+    conversation_id: str = Field(..., description="Conversation the message belongs to")
+    conversation_title: Optional[str] = Field(default=None, description="Conversation title")
+    role: str = Field(..., description="Message role")
+    timestamp: str = Field(..., description="Message timestamp")
+    snippet: str = Field(..., description="Matching excerpt with terms wrapped in [ ]")
+    rank: float = Field(..., description="bm25 rank (lower is better)")
+
+
+class StorageResponse(BaseModel):
+    """Response model for database storage and retention status."""
+
+    file_bytes: int = Field(..., description="Database file size")
+    used_bytes: int = Field(..., description="Bytes in use by live pages")
+    free_bytes: int = Field(..., description="Bytes on the freelist awaiting vacuum")
+    archive_bytes: int = Field(..., description="Bytes used by the compressed message archive")
+    conversations: int = Field(..., description="Stored conversations")
+    messages: int = Field(..., description="Live messages")
+    archived_messages: int = Field(..., description="Messages moved to the compressed archive")
+    tool_payloads: int = Field(..., description="Distinct tool payloads stored out of line")
+    tool_payload_bytes: int = Field(..., description="Uncompressed size of out-of-line tool payloads")
+    tool_payload_stored_bytes: int = Field(..., description="Compressed size of out-of-line tool payloads")
+    retention_enabled: bool = Field(..., description="Whether a retention policy is configured")
+    last_retention: Optional[Dict[str, Any]] = Field(default=None, description="Report of the last retention run")
+
+
 class EntityResponse(BaseModel):
     """Response model for entity information."""
 
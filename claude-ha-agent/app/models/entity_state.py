@@ -0,0 +1,251 @@
+"""Compact in-memory representation of cached Home Assistant entity states."""
+import json
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# String attribute values up to this length are interned so repeats share one object
+INTERN_MAX_LENGTH = 64
+
+# Attributes extracted up front because listing reads them on every call;
+# everything else stays as raw JSON until someone asks for the full attribute set
+HOT_ATTRIBUTES = (
+    "friendly_name",
+    "unit_of_measurement",
+    "device_class",
+)
+_HOT_POSITIONS = {name: position for position, name in enumerate(HOT_ATTRIBUTES)}
+
+# Raw JSON bytes of decoded attribute sets kept for reuse; larger payloads are never cached
+DECODE_CACHE_MAX_BYTES = 1024 * 1024
+DECODE_CACHE_MAX_ITEM_BYTES = 64 * 1024
+
+
+def intern_value(value: Any) -> Any:
+    """Intern short strings; leave every other value untouched."""
+    if isinstance(value, str) and len(value) <= INTERN_MAX_LENGTH:
+        return sys.intern(value)
+    return value
+
+
+def parse_timestamp(value: Any) -> Optional[float]:
+    """Convert an ISO timestamp or epoch number to epoch seconds."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def encode_attributes(attributes: Dict[str, Any]) -> bytes:
+    """Canonical compact JSON encoding of an attribute dict."""
+    return json.dumps(
+        attributes, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
+    ).encode("utf-8")
+
+
+class _DecodeCache:
+    """LRU of decoded attribute dicts, bounded by the total size of their raw JSON."""
+
+    def __init__(self, max_bytes: int, max_item_bytes: int):
+        """Initialize an empty cache."""
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self._entries: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def decode(self, raw: bytes) -> Dict[str, Any]:
+        """Return the cached decoding of raw, decoding and caching it on a miss."""
+        with self._lock:
+            decoded = self._entries.get(raw)
+            if decoded is not None:
+                self._entries.move_to_end(raw)
+                return decoded
+
+        decoded = json.loads(raw)
+        if len(raw) > self.max_item_bytes:
+            return decoded
+
+        with self._lock:
+            if raw not in self._entries:
+                self._entries[raw] = decoded
+                self._bytes += len(raw)
+                while self._bytes > self.max_bytes:
+                    evicted, _ = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted)
+        return decoded
+
+
+_decode_cache = _DecodeCache(DECODE_CACHE_MAX_BYTES, DECODE_CACHE_MAX_ITEM_BYTES)
+
+
+def decode_attributes(raw: bytes) -> Dict[str, Any]:
+    """Decode raw attribute JSON into a fresh top-level dict.
+
+    The decoding is cached, so adding, replacing or removing keys on the result is safe;
+    nested lists and dicts are shared with the cache and must not be changed in place.
+    """
+    return dict(_decode_cache.decode(raw))
+
+
+def extract_hot_attributes(attributes: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Project the HOT_ATTRIBUTES of a decoded attribute dict, dropping trailing Nones."""
+    hot = [intern_value(attributes.get(name)) for name in HOT_ATTRIBUTES]
+    while hot and hot[-1] is None:
+        hot.pop()
+    return tuple(hot)
+
+
+class AttributePool:
+    """Shares one raw attribute payload among all entities whose attributes are identical.
+
+    Payloads are reference counted so a set is freed once no entity uses it.
+    """
+
+    def __init__(self):
+        """Initialize an empty pool."""
+        self._payloads: Dict[bytes, list] = {}
+
+    def __len__(self) -> int:
+        """Number of distinct attribute sets held."""
+        return len(self._payloads)
+
+    def acquire(self, raw: bytes) -> bytes:
+        """Return the pooled payload equal to raw, adding it if unseen."""
+        entry = self._payloads.get(raw)
+        if entry is None:
+            entry = self._payloads[raw] = [raw, 0]
+
+        entry[1] += 1
+        return entry[0]
+
+    def release(self, raw: bytes):
+        """Drop a reference, freeing the payload when it is no longer used."""
+        entry = self._payloads.get(raw)
+        if entry is None:
+            return
+
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._payloads[raw]
+
+    def values(self) -> Iterable[bytes]:
+        """All pooled payloads."""
+        return (entry[0] for entry in self._payloads.values())
+
+
+class EntityState:
+    """Slotted cache record for one entity.
+
+    Attributes are kept as raw JSON and only decoded when the attributes property is
+    read; the hot projection answers friendly_name and the other HOT_ATTRIBUTES without
+    decoding. Supports the mapping-style get()/[] access of the dict entries it replaced.
+    """
+
+    __slots__ = ("state", "raw_attributes", "hot", "last_updated_ts")
+
+    def __init__(
+        self,
+        state: Optional[str],
+        raw_attributes: bytes,
+        hot: Tuple[Any, ...],
+        last_updated_ts: Optional[float],
+    ):
+        """Initialize entity state."""
+        self.state = sys.intern(state) if isinstance(state, str) else state
+        self.raw_attributes = raw_attributes
+        self.hot = hot
+        self.last_updated_ts = last_updated_ts
+
+    @property
+    def attributes(self) -> Dict[str, Any]:
+        """Decoded attributes (a fresh top-level copy; see decode_attributes)."""
+        return decode_attributes(self.raw_attributes)
+
+    @property
+    def last_updated(self) -> Optional[str]:
+        """Last update time in ISO format."""
+        if self.last_updated_ts is None:
+            return None
+        return datetime.fromtimestamp(self.last_updated_ts, tz=timezone.utc).isoformat()
+
+    def hot_attribute(self, name: str, default: Any = None) -> Any:
+        """Read one of the HOT_ATTRIBUTES without decoding the payload."""
+        position = _HOT_POSITIONS[name]
+        value = self.hot[position] if position < len(self.hot) else None
+        return default if value is None else value
+
+    def matches(self, state: Optional[str], raw_attributes: bytes, last_updated_ts: Optional[float]) -> bool:
+        """Whether this record already holds the given values."""
+        return (
+            self.state == state
+            and self.last_updated_ts == last_updated_ts
+            and self.raw_attributes == raw_attributes
+        )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Mapping-style access to state, attributes and last_updated."""
+        if key in ("state", "attributes", "last_updated"):
+            return getattr(self, key)
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        """Mapping-style item access."""
+        if key not in ("state", "attributes", "last_updated"):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict copy in the format of the HA state API."""
+        return {
+            "state": self.state,
+            "attributes": json.loads(self.raw_attributes),
+            "last_updated": self.last_updated,
+        }
+
+
+def _deep_size(value: Any, seen: set) -> int:
+    """Approximate memory of a JSON-like value, counting shared objects once."""
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_deep_size(v, seen) for v in value)
+    return size
+
+
+def estimate_cache_memory(cache: Dict[str, EntityState], pool: AttributePool) -> Dict[str, Any]:
+    """Estimate resident memory of the state cache and its shared attribute pool."""
+    seen: set = set()
+    entity_bytes = sys.getsizeof(cache)
+    for entity_id, entry in cache.items():
+        entity_bytes += (
+            sys.getsizeof(entity_id)
+            + sys.getsizeof(entry)
+            + _deep_size(entry.state, seen)
+            + _deep_size(entry.hot, seen)
+        )
+
+    attribute_bytes = sum(_deep_size(raw, seen) for raw in pool.values())
+    total = entity_bytes + attribute_bytes
+    count = len(cache)
+
+    return {
+        "entities": count,
+        "attribute_sets": len(pool),
+        "shared_attribute_refs": max(count - len(pool), 0),
+        "entity_bytes": entity_bytes,
+        "attribute_bytes": attribute_bytes,
+        "total_bytes": total,
+        "bytes_per_entity": round(total / count, 1) if count else 0,
+    }
@@ -15,25 +15,20 @@ class AnalysisService:
     async def analyze_entity_health(self) -> Dict[str, Any]:
         """Analyze overall entity health."""
         try:
-            all_states = self.ha_client.state_cache
+            index = self.ha_client.entity_index
 
-            total = len(all_states)
-            available = sum(1 for s in all_states.values() if s.get("state") not in ["unavailable", "unknown"])
-            unavailable = sum(1 for s in all_states.values() if s.get("state") == "unavailable")
-            unknown = sum(1 for s in all_states.values() if s.get("state") == "unknown")
+            unavailable_ids = index.get("state", "unavailable")
+            total = len(index)
+            unavailable = len(unavailable_ids)
+            unknown = len(index.get("state", "unknown"))
+            available = total - unavailable - unknown
 
             # Count by integration
             by_integration = {}
-            for entity_id, state_data in all_states.items():
-                attributes = state_data.get("attributes", {})
-                integration = attributes.get("integration", "unknown")
-
-                if integration not in by_integration:
-                    by_integration[integration] = {"total": 0, "unavailable": 0}
-
-                by_integration[integration]["total"] += 1
-                if state_data.get("state") == "unavailable":
-                    by_integration[integration]["unavailable"] += 1
+            for integration, entity_ids in index.groups("integration").items():
+                counts = by_integration.setdefault(integration or "unknown", {"total": 0, "unavailable": 0})
+                counts["total"] += len(entity_ids)
+                counts["unavailable"] += len(entity_ids & unavailable_ids)
 
             # Identify issues
             issues = []
@@ -67,26 +62,19 @@ class AnalysisService:
         """Generate post-migration cleanup report."""
         try:
             all_states = self.ha_client.state_cache
+            index = self.ha_client.entity_index
 
             old_locations = set()
-            orphaned_count = 0
-            mismatched_areas = 0
 
-            for entity_id, state_data in all_states.items():
-                attributes = state_data.get("attributes", {})
+            # Orphaned entities (no integration) and entities without an area come from the indexes
+            orphaned_count = len(index.get("integration", None))
+            mismatched_areas = len(index.get("area", None))
 
-                # Check for old_location references
-                if "old_location" in str(attributes).lower():
+            for entity_id, state_data in all_states.items():
+                # Check for old_location references on the raw payload, without decoding it
+                if b"old_location" in state_data.raw_attributes.lower():
                     old_locations.add(entity_id)
 
-                # Check for orphaned entities (no integration)
-                if not attributes.get("integration"):
-                    orphaned_count += 1
-
-                # Check for mismatched areas
-                if not attributes.get("area_id") and not attributes.get("area"):
-                    mismatched_areas += 1
-
             recommendations = []
 
             if old_locations:
@@ -133,8 +121,7 @@ class AnalysisService:
                     continue
 
                 domain, name = entity_id.split(".", 1)
-                attributes = state_data.get("attributes", {})
-                friendly_name = attributes.get("friendly_name", "")
+                friendly_name = state_data.hot_attribute("friendly_name", "")
 
                 # Check if friendly name follows snake_case
                 if friendly_name and "_" in friendly_name:
@@ -170,11 +157,11 @@ class AnalysisService:
     async def get_system_stats(self) -> Dict[str, Any]:
         """Get system statistics."""
         try:
-            all_states = self.ha_client.state_cache
+            index = self.ha_client.entity_index
 
             # Basic stats
-            total_entities = len(all_states)
-            domains = set(entity_id.split(".")[0] for entity_id in all_states.keys())
+            total_entities = len(index)
+            domains = set(index.groups("domain"))
 
             return {
                 "uptime": 3888000,  # TODO: Get actual uptime
@@ -184,6 +171,7 @@ class AnalysisService:
                 "db_size": "2.5MB",  # TODO: Calculate
                 "unique_domains": len(domains),
                 "domains": list(domains),
+                "cache_memory": self.ha_client.get_cache_stats(),
             }
 
         except Exception as e:
@@ -1,11 +1,30 @@
 """Claude API service with function calling support."""
+import asyncio
+import json
 import logging
-from typing import Optional, List, Dict, Any
+import time
+from typing import Optional, List, Dict, Any, AsyncIterator, Awaitable, Callable
 from datetime import date
-from anthropic import Anthropic
+
+import httpx
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
 
 logger = logging.getLogger(__name__)
 
+# Prompt-cache breakpoint; everything before a marked block is cached as one prefix
+CACHE_CONTROL = {"type": "ephemeral"}
+
+USAGE_KEYS = ("tokens_input", "tokens_output", "tokens_cache_read", "tokens_cache_write")
+
+# Agent loop stop reasons caused by a budget, with how they are described to the user. The
+# names must not collide with API stop reasons (the API's own "max_tokens" means one response
+# hit its output limit).
+BUDGET_STOPS = {
+    "max_rounds": "tool round limit",
+    "token_budget": "token budget",
+    "max_seconds": "time limit",
+}
+
 
 class ClaudeService:
     """Service for interacting with Claude API."""
@@ -28,13 +47,47 @@ Important guidelines:
 - If a function call fails, explain why and suggest alternatives.
 - Track API usage - if you see warnings about rate limits, suggest pausing or deferring non-urgent tasks."""
 
-    def __init__(self, api_key: str, model: str = "claude-3-5-sonnet-20241022"):
-        """Initialize Claude service."""
+    SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and a Home Assistant assistant.
+Merge the new messages into the current summary. Keep the user's goals, decisions and preferences, entity IDs,
+integration names, automations created or changed, operations performed and their outcomes, and open questions.
+Drop pleasantries and superseded details. Reply with the summary only, as terse bullet points."""
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "claude-3-5-sonnet-20241022",
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 60.0,
+        connect_timeout: float = 10.0,
+        request_timeout: float = 120.0,
+    ):
+        """Initialize Claude service with a shared, pooled async HTTP client."""
         self.api_key = api_key
         self.model = model
-        self.client = Anthropic(api_key=api_key)
+        # One pool for every request, so concurrent chats reuse warm TLS connections
+        self.client = AsyncAnthropic(
+            api_key=api_key,
+            # Retries are handled by chat() with its own backoff
+            max_retries=0,
+            timeout=httpx.Timeout(request_timeout, connect=connect_timeout),
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_keepalive_connections,
+                    keepalive_expiry=keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(request_timeout, connect=connect_timeout),
+            ),
+        )
         self.call_count_today = 0
         self.tokens_used_today = 0
+        self._tools: List[Dict[str, Any]] = []
+        self._tools_key: Optional[tuple] = None
+
+    async def close(self):
+        """Close the HTTP connection pool."""
+        await self.client.close()
 
     def set_daily_stats(self, call_count: int, tokens_used: int):
         """Set daily statistics (typically loaded from database on startup)."""
@@ -51,20 +104,69 @@ Important guidelines:
         self.call_count_today = 0
         self.tokens_used_today = 0
 
-    def _build_system_prompt(
-        self, ha_context: str, functions: List[Dict[str, Any]], rate_limit_warning: bool = False
-    ) -> str:
-        """Build complete system prompt with HA context and functions."""
-        prompt = self.SYSTEM_PROMPT + "\n\n" + ha_context
+    def _build_system_prompt(self) -> List[Dict[str, Any]]:
+        """Build the system prompt: the fixed instructions only, cached.
+
+        Tools are described by their schemas alone; they are not repeated here as text. The HA
+        context changes every turn, so it goes into the user turn (see _user_turn) instead.
+        """
+        return [{"type": "text", "text": self.SYSTEM_PROMPT, "cache_control": CACHE_CONTROL}]
 
-        if rate_limit_warning:
-            prompt += "\n\n[WARNING: 950+ API calls today. Consider pausing non-urgent operations]"
+    def _user_turn(self, user_message: str, ha_context: str) -> Dict[str, Any]:
+        """Build the new user turn: the volatile HA context, then the user's message.
 
-        prompt += "\n\nAvailable functions:\n"
-        for func in functions:
-            prompt += f"- {func['name']}: {func['description']}\n"
+        Placed after every cache breakpoint, the context never invalidates the cached prefix.
+        """
+        volatile = ha_context
+        # Check if we should warn about rate limits
+        if self.call_count_today > 950:
+            volatile += "\n\n[WARNING: 950+ API calls today. Consider pausing non-urgent operations]"
 
-        return prompt
+        if not volatile.strip():
+            return {"role": "user", "content": user_message}
+        return {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": volatile.strip()},
+                {"type": "text", "text": user_message},
+            ],
+        }
+
+    def _build_tools(self, functions: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Convert tool definitions to API tool schemas, with a cache breakpoint after the last one."""
+        if not functions:
+            return []
+
+        key = tuple(func["name"] for func in functions)
+        if self._tools_key != key:
+            tools = [
+                {
+                    "name": func["name"],
+                    "description": func["description"],
+                    "input_schema": {"type": "object", "properties": func.get("parameters", {})},
+                }
+                for func in functions
+            ]
+            tools[-1] = {**tools[-1], "cache_control": CACHE_CONTROL}
+            self._tools, self._tools_key = tools, key
+        return self._tools
+
+    @staticmethod
+    def _build_history(conversation_history: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """Convert history to API messages, with a cache breakpoint on the last earlier turn.
+
+        Only the new user turn follows the breakpoint, so the next turn finds this prefix (as
+        written by this turn) among the earlier block boundaries and reads it from the cache.
+        """
+        messages: List[Dict[str, Any]] = [
+            {"role": msg["role"], "content": msg["content"]} for msg in conversation_history
+        ]
+        if messages and isinstance(messages[-1]["content"], str) and messages[-1]["content"]:
+            messages[-1] = {
+                "role": messages[-1]["role"],
+                "content": [{"type": "text", "text": messages[-1]["content"], "cache_control": CACHE_CONTROL}],
+            }
+        return messages
 
     async def chat(
         self,
@@ -75,78 +177,224 @@ Important guidelines:
         max_retries: int = 2,
         retry_delay: int = 5,
     ) -> Dict[str, Any]:
-        """Send message to Claude with function calling support."""
+        """Send message to Claude with function calling support (a single model call)."""
+        request = self._chat_request(user_message, conversation_history, functions, ha_context)
+        return await self._create(request, max_retries=max_retries, retry_delay=retry_delay)
 
-        # Build messages for API
-        messages = []
-
-        # Add conversation history
-        for msg in conversation_history:
-            messages.append({"role": msg["role"], "content": msg["content"]})
-
-        # Add current user message
-        messages.append({"role": "user", "content": user_message})
-
-        # Check if we should warn about rate limits
-        rate_limit_warning = self.call_count_today > 950
+    async def run_agent(
+        self,
+        user_message: str,
+        conversation_history: List[Dict[str, str]],
+        execute_tools: Callable[[List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]],
+        functions: Optional[List[Dict[str, Any]]] = None,
+        ha_context: str = "",
+        max_rounds: int = 8,
+        max_tokens: int = 200_000,
+        max_seconds: float = 120.0,
+    ) -> Dict[str, Any]:
+        """Run the agent loop to completion and return its final result (or an error dict)."""
+        result: Dict[str, Any] = {"error": "Agent loop produced no result", "recoverable": True}
+        async for event in self.agent_stream(
+            user_message,
+            conversation_history,
+            execute_tools,
+            functions=functions,
+            ha_context=ha_context,
+            stream=False,
+            max_rounds=max_rounds,
+            max_tokens=max_tokens,
+            max_seconds=max_seconds,
+        ):
+            if event["type"] == "message":
+                result = event["result"]
+            elif event["type"] == "error":
+                result = {"error": event["error"], "recoverable": event["recoverable"]}
+        return result
+
+    async def agent_stream(
+        self,
+        user_message: str,
+        conversation_history: List[Dict[str, str]],
+        execute_tools: Callable[[List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]],
+        functions: Optional[List[Dict[str, Any]]] = None,
+        ha_context: str = "",
+        stream: bool = True,
+        max_rounds: int = 8,
+        max_tokens: int = 200_000,
+        max_seconds: float = 120.0,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Call Claude, run the tools it asks for in parallel and feed the results back, round after
+        round, until it ends its turn or a budget runs out.
+
+        Budgets: max_rounds model calls, max_tokens uncached tokens (input, cache writes and output;
+        cache reads are not counted) and max_seconds of wall-clock time. Tool calls requested in the
+        round that exhausts a budget are not executed.
+
+        Yields the _stream() events (only when stream=True), tagged with their round, plus
+        {"type": "tool_result", "id", "name", "round", "error"} per executed tool and
+        {"type": "round", ...timings and usage} per round. The last event is
+        {"type": "message", "result"} with the final text, every tool call with its result, token
+        totals, per-round timings and the stop reason, or {"type": "error", "error", "recoverable"}.
+        The stop reason is Claude's own (e.g. end_turn, or max_tokens for a truncated reply) or the
+        exhausted budget: max_rounds, token_budget or max_seconds (see BUDGET_STOPS).
+        """
+        started = time.monotonic()
+        deadline = started + max_seconds
+        messages = self._build_history(conversation_history)
+        messages.append(self._user_turn(user_message, ha_context))
+
+        totals = {key: 0 for key in USAGE_KEYS}
+        tool_calls_made: List[Dict[str, Any]] = []
+        rounds: List[Dict[str, Any]] = []
+        content = ""
+        stop_reason = None
+
+        for round_number in range(1, max_rounds + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                stop_reason = "max_seconds"
+                break
+
+            request = self._request(messages, functions)
+            round_started = time.monotonic()
+            if stream:
+                response: Dict[str, Any] = {"error": "Claude stream ended without a message", "recoverable": True}
+                async for event in self._stream(request, timeout=remaining):
+                    if event["type"] == "message":
+                        response = event["result"]
+                    elif event["type"] == "error":
+                        response = event
+                    else:
+                        yield {**event, "round": round_number}
+            else:
+                response = await self._create(request, timeout=remaining)
+
+            if "error" in response:
+                yield {"type": "error", "error": response["error"], "recoverable": response.get("recoverable", True)}
+                return
+
+            round_info: Dict[str, Any] = {
+                "round": round_number,
+                "model_ms": round((time.monotonic() - round_started) * 1000, 1),
+                "tools_ms": 0.0,
+                "tool_calls": len(response["tool_calls"]),
+                "stop_reason": response["stop_reason"],
+                **{key: response[key] for key in USAGE_KEYS},
+            }
+            for key in USAGE_KEYS:
+                totals[key] += response[key]
+            content = response["content"]
+            calls = response["tool_calls"]
+
+            if not calls:
+                stop_reason = response["stop_reason"]
+            elif totals["tokens_input"] + totals["tokens_cache_write"] + totals["tokens_output"] >= max_tokens:
+                stop_reason = "token_budget"
+            elif round_number == max_rounds:
+                stop_reason = "max_rounds"
+
+            if stop_reason:
+                rounds.append(round_info)
+                yield {"type": "round", **round_info}
+                break
+
+            messages.append({"role": "assistant", "content": self._assistant_blocks(response)})
+
+            tools_started = time.monotonic()
+            try:
+                results = await asyncio.wait_for(execute_tools(calls), deadline - tools_started)
+            except asyncio.TimeoutError:
+                stop_reason = "max_seconds"
+                round_info["tools_ms"] = round((time.monotonic() - tools_started) * 1000, 1)
+                rounds.append(round_info)
+                yield {"type": "round", **round_info}
+                break
+            round_info["tools_ms"] = round((time.monotonic() - tools_started) * 1000, 1)
+
+            for call, result in zip(calls, results):
+                failed = isinstance(result["result"], dict) and "error" in result["result"]
+                tool_calls_made.append({**call, "result": result["result"], "round": round_number})
+                yield {"type": "tool_result", "id": call["id"], "name": call["name"], "round": round_number, "error": failed}
+
+            self._append_tool_results(messages, calls, results)
+            rounds.append(round_info)
+            yield {"type": "round", **round_info}
+
+        if stop_reason in BUDGET_STOPS:
+            logger.warning(f"Agent loop stopped after {len(rounds)} rounds: {BUDGET_STOPS[stop_reason]} reached")
+            note = f"(Stopped after {len(rounds)} rounds because the {BUDGET_STOPS[stop_reason]} was reached.)"
+            content = f"{content}\n\n{note}" if content else note
+
+        yield {
+            "type": "message",
+            "result": {
+                "content": content,
+                "tool_calls": tool_calls_made,
+                **totals,
+                "stop_reason": stop_reason,
+                "rounds": rounds,
+                "duration_ms": round((time.monotonic() - started) * 1000, 1),
+            },
+        }
 
-        # Build system prompt
-        system_prompt = self._build_system_prompt(
-            ha_context, functions or [], rate_limit_warning=rate_limit_warning
-        )
+    @staticmethod
+    def _assistant_blocks(response: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Rebuild Claude's turn (text, then tool_use blocks) to send back with the results."""
+        blocks: List[Dict[str, Any]] = []
+        if response["content"]:
+            blocks.append({"type": "text", "text": response["content"]})
+        for call in response["tool_calls"]:
+            blocks.append({"type": "tool_use", "id": call["id"], "name": call["name"], "input": call["input"]})
+        return blocks
+
+    @staticmethod
+    def _append_tool_results(
+        messages: List[Dict[str, Any]], calls: List[Dict[str, Any]], results: List[Dict[str, Any]]
+    ):
+        """Answer every tool call of a round in one user message, moving the cache breakpoint onto it."""
+        for message in messages:
+            if message["role"] == "user" and isinstance(message["content"], list):
+                for block in message["content"]:
+                    if block.get("type") == "tool_result":
+                        block.pop("cache_control", None)
+
+        blocks = [
+            {
+                "type": "tool_result",
+                "tool_use_id": call["id"],
+                "content": json.dumps(result["result"], default=str),
+                "is_error": isinstance(result["result"], dict) and "error" in result["result"],
+            }
+            for call, result in zip(calls, results)
+        ]
+        blocks[-1]["cache_control"] = CACHE_CONTROL
+        messages.append({"role": "user", "content": blocks})
 
-        # Prepare tools for Claude
-        tools = []
-        if functions:
-            tools = [
-                {
-                    "name": func["name"],
-                    "description": func["description"],
-                    "input_schema": {"type": "object", "properties": func.get("parameters", {})},
-                }
-                for func in functions
-            ]
+    async def _create(
+        self,
+        request: Dict[str, Any],
+        max_retries: int = 2,
+        retry_delay: int = 5,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Run a Messages request with retries and return the parsed result or an error dict."""
+        if timeout is not None:
+            request = {**request, "timeout": timeout}
 
         attempt = 0
         while attempt < max_retries:
             try:
                 # Call Claude API
-                response = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=4096,
-                    system=system_prompt,
-                    tools=tools if tools else None,
-                    messages=messages,
-                )
-
-                # Parse response
-                result = {
-                    "content": "",
-                    "tool_calls": [],
-                    "tokens_input": response.usage.input_tokens,
-                    "tokens_output": response.usage.output_tokens,
-                    "stop_reason": response.stop_reason,
-                }
-
-                # Extract content and tool calls from response
-                for block in response.content:
-                    if hasattr(block, "text"):
-                        result["content"] += block.text
-                    elif block.type == "tool_use":
-                        result["tool_calls"].append(
-                            {
-                                "name": block.name,
-                                "id": block.id,
-                                "input": block.input,
-                            }
-                        )
+                response = await self.client.messages.create(**request)
+                result = self._parse_response(response)
 
                 # Update daily stats
                 self.update_daily_stats(response.usage.input_tokens, response.usage.output_tokens)
 
                 logger.info(
                     f"Claude API call successful - Input: {response.usage.input_tokens}, "
-                    f"Output: {response.usage.output_tokens}"
+                    f"Output: {response.usage.output_tokens}, Cache read: {result['tokens_cache_read']}, "
+                    f"Cache write: {result['tokens_cache_write']}"
                 )
 
                 return result
@@ -156,8 +404,6 @@ Important guidelines:
                 logger.error(f"Claude API error (attempt {attempt}/{max_retries}): {e}")
 
                 if attempt < max_retries:
-                    import asyncio
-
                     await asyncio.sleep(retry_delay * (2 ** (attempt - 1)))
                 else:
                     return {
@@ -174,88 +420,114 @@ Important guidelines:
             "tokens_output": 0,
         }
 
-    async def process_tool_results(
-        self,
-        conversation_history: List[Dict[str, str]],
-        assistant_message: str,
-        tool_calls: List[Dict[str, Any]],
-        tool_results: List[Dict[str, Any]],
-        functions: Optional[List[Dict[str, Any]]] = None,
-        ha_context: str = "",
-    ) -> Dict[str, Any]:
-        """Send tool results back to Claude for final response."""
+    async def _stream(self, request: Dict[str, Any], timeout: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Run a streaming Messages request and translate it into events.
 
-        messages = []
+        Yields {"type": "text", "text"} for each text delta, {"type": "tool_start", "id", "name"}
+        when Claude begins a tool call, {"type": "tool_call", "id", "name", "input"} once its
+        input is complete, and finally {"type": "message", "result"} with the same result dict
+        chat() returns. Failures yield {"type": "error", "error", "recoverable"} instead.
+        """
+        if timeout is not None:
+            request = {**request, "timeout": timeout}
 
-        # Add conversation history
-        for msg in conversation_history:
-            messages.append({"role": msg["role"], "content": msg["content"]})
+        try:
+            async with self.client.messages.stream(**request) as stream:
+                async for event in stream:
+                    if event.type == "text":
+                        yield {"type": "text", "text": event.text}
+                    elif event.type == "content_block_start" and event.content_block.type == "tool_use":
+                        yield {"type": "tool_start", "id": event.content_block.id, "name": event.content_block.name}
+                    elif event.type == "content_block_stop" and event.content_block.type == "tool_use":
+                        block = event.content_block
+                        yield {"type": "tool_call", "id": block.id, "name": block.name, "input": block.input}
+
+                response = await stream.get_final_message()
 
-        # Add assistant's function-calling message
-        messages.append(
-            {
-                "role": "assistant",
-                "content": [
-                    {"type": "text", "text": assistant_message},
-                    *[
-                        {
-                            "type": "tool_use",
-                            "id": tc["id"],
-                            "name": tc["name"],
-                            "input": tc["input"],
-                        }
-                        for tc in tool_calls
-                    ],
-                ],
-            }
+        except Exception as e:
+            logger.error(f"Claude API streaming error: {e}")
+            yield {"type": "error", "error": str(e), "recoverable": True}
+            return
+
+        self.update_daily_stats(response.usage.input_tokens, response.usage.output_tokens)
+        result = self._parse_response(response)
+        logger.info(
+            f"Claude API stream complete - Input: {response.usage.input_tokens}, "
+            f"Output: {response.usage.output_tokens}, Cache read: {result['tokens_cache_read']}, "
+            f"Cache write: {result['tokens_cache_write']}"
         )
+        yield {"type": "message", "result": result}
 
-        # Add tool results
-        for result in tool_results:
-            messages.append(
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": result["tool_use_id"],
-                            "content": str(result["content"]),
-                        }
-                    ],
-                }
-            )
-
-        # Get final response from Claude
-        try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=4096,
-                system=self.SYSTEM_PROMPT + "\n\n" + ha_context,
-                messages=messages,
-            )
-
-            result = {
-                "content": "",
-                "tokens_input": response.usage.input_tokens,
-                "tokens_output": response.usage.output_tokens,
-            }
-
-            for block in response.content:
-                if hasattr(block, "text"):
-                    result["content"] += block.text
+    def _chat_request(
+        self,
+        user_message: str,
+        conversation_history: List[Dict[str, str]],
+        functions: Optional[List[Dict[str, Any]]],
+        ha_context: str,
+    ) -> Dict[str, Any]:
+        """Build Messages API arguments for a user turn."""
+        messages = self._build_history(conversation_history)
+        messages.append(self._user_turn(user_message, ha_context))
+        return self._request(messages, functions)
+
+    def _request(self, messages: List[Dict[str, Any]], functions: Optional[List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Lay out a request as a stable prefix (tools, system instructions, history) then the new turn."""
+        request = {
+            "model": self.model,
+            "max_tokens": 4096,
+            "system": self._build_system_prompt(),
+            "messages": messages,
+        }
+        tools = self._build_tools(functions)
+        if tools:
+            request["tools"] = tools
+        return request
+
+    @staticmethod
+    def _parse_response(response) -> Dict[str, Any]:
+        """Extract text, tool calls and usage from a Messages API response."""
+        result = {
+            "content": "",
+            "tool_calls": [],
+            "tokens_input": response.usage.input_tokens,
+            "tokens_output": response.usage.output_tokens,
+            "tokens_cache_read": response.usage.cache_read_input_tokens or 0,
+            "tokens_cache_write": response.usage.cache_creation_input_tokens or 0,
+            "stop_reason": response.stop_reason,
+        }
 
-            self.update_daily_stats(response.usage.input_tokens, response.usage.output_tokens)
+        for block in response.content:
+            if hasattr(block, "text"):
+                result["content"] += block.text
+            elif block.type == "tool_use":
+                result["tool_calls"].append(
+                    {
+                        "name": block.name,
+                        "id": block.id,
+                        "input": block.input,
+                    }
+                )
 
-            return result
+        return result
 
-        except Exception as e:
-            logger.error(f"Error processing tool results: {e}")
-            return {
-                "error": str(e),
-                "recoverable": True,
-                "tokens_input": 0,
-                "tokens_output": 0,
-            }
+    async def summarize(
+        self, previous_summary: str, messages: List[Dict[str, str]], max_tokens: int = 1024
+    ) -> Dict[str, Any]:
+        """Fold aged-out conversation turns into the running summary (result dict or error dict)."""
+        transcript = "\n\n".join(f"{msg['role'].capitalize()}: {msg['content']}" for msg in messages)
+        prompt = (
+            f"Current summary:\n{previous_summary or '(none)'}\n\n"
+            f"New messages:\n{transcript}\n\n"
+            "Write the updated summary."
+        )
+        request = {
+            "model": self.model,
+            "max_tokens": max_tokens,
+            "system": self.SUMMARY_PROMPT,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        # Runs inside a chat turn, so fail fast and fall back to the trimmed history
+        return await self._create(request, max_retries=1, timeout=30.0)
 
     def get_available_functions(self) -> List[Dict[str, Any]]:
         """Get list of available Claude functions."""
@@ -1,35 +1,56 @@
 """Conversation management service."""
+import asyncio
 import logging
 from typing import Optional, List, Dict, Any
 from datetime import date
 
-from app.db.database import Database
+from app.db.async_database import AsyncDatabase
+from app.services.claude_service import ClaudeService
 from app.config import config
 
 logger = logging.getLogger(__name__)
 
+SUMMARY_PREFIX = "[Summary of earlier conversation]\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def _split_turns(messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group messages into turns, each starting at a user message."""
+    turns: List[List[Dict[str, Any]]] = []
+    for msg in messages:
+        if msg["role"] == "user" or not turns:
+            turns.append([])
+        turns[-1].append(msg)
+    return turns
+
 
 class ConversationService:
     """Manages conversations and message history."""
 
-    def __init__(self, database: Database):
-        """Initialize conversation service."""
+    def __init__(self, database: AsyncDatabase, claude_service: Optional[ClaudeService] = None):
+        """Initialize conversation service (history summaries need claude_service)."""
         self.db = database
+        self.claude = claude_service
 
-    def create_conversation(self, title: Optional[str] = None) -> str:
+    async def create_conversation(self, title: Optional[str] = None) -> str:
         """Create a new conversation."""
-        conversation_id = self.db.create_conversation(title or "Untitled")
+        conversation_id = await self.db.create_conversation(title or "Untitled")
         logger.info(f"Created conversation: {conversation_id}")
         return conversation_id
 
-    def add_user_message(
+    async def add_user_message(
         self, conversation_id: str, message: str
     ) -> Dict[str, Any]:
         """Add a user message to conversation."""
-        message_id = self.db.add_message(
+        message_id = await self.db.add_message(
             conversation_id=conversation_id,
             role="user",
             content=message,
+            wait=not config.DB_WRITE_BEHIND,
         )
 
         return {
@@ -38,7 +59,7 @@ class ConversationService:
             "content": message,
         }
 
-    def add_assistant_message(
+    async def add_assistant_message(
         self,
         conversation_id: str,
         content: str,
@@ -46,9 +67,13 @@ class ConversationService:
         tokens_output: int = 0,
         cost: float = 0.0,
         tool_calls: Optional[List[Dict[str, Any]]] = None,
+        model: Optional[str] = None,
+        tokens_cache_read: int = 0,
+        tokens_cache_write: int = 0,
+        calls: int = 1,
     ) -> Dict[str, Any]:
-        """Add an assistant message to conversation."""
-        message_id = self.db.add_message(
+        """Add an assistant message to conversation (calls: API calls it took, e.g. agent rounds)."""
+        message_id = await self.db.add_message(
             conversation_id=conversation_id,
             role="assistant",
             content=content,
@@ -56,6 +81,11 @@ class ConversationService:
             tokens_output=tokens_output,
             cost=cost,
             tool_calls=tool_calls,
+            model=model,
+            tokens_cache_read=tokens_cache_read,
+            tokens_cache_write=tokens_cache_write,
+            calls=calls,
+            wait=not config.DB_WRITE_BEHIND,
         )
 
         return {
@@ -63,32 +93,117 @@ class ConversationService:
             "role": "assistant",
             "content": content,
             "cost": cost,
-            "tokens": {"input": tokens_input, "output": tokens_output},
+            "tokens": {
+                "input": tokens_input,
+                "output": tokens_output,
+                "cache_read": tokens_cache_read,
+                "cache_write": tokens_cache_write,
+            },
             "tool_calls": tool_calls,
         }
 
-    def get_conversation_history(self, conversation_id: str) -> List[Dict[str, Any]]:
-        """Get conversation history for Claude context."""
-        messages = self.db.get_conversation_messages(conversation_id)
+    async def get_conversation_history(self, conversation_id: str) -> List[Dict[str, Any]]:
+        """Get conversation history for Claude context, fitted to HISTORY_TOKEN_BUDGET.
+
+        The last HISTORY_KEEP_TURNS turns are sent verbatim; older turns are replaced by a
+        stored rolling summary, regenerated once HISTORY_SUMMARY_BATCH more turns have aged
+        out (or the unsummarized history no longer fits the budget).
+        """
+        summary = await self.db.get_conversation_summary(conversation_id)
+        summary_text = summary["summary"] if summary else ""
+        through_rowid = summary["through_rowid"] if summary else 0
+
+        turns = _split_turns(await self.db.get_messages_after(conversation_id, through_rowid))
+        keep = max(config.HISTORY_KEEP_TURNS, 1)
+        aged = turns[:-keep]
+
+        if aged:
+            backlog = estimate_tokens(summary_text) + sum(
+                estimate_tokens(msg["content"]) for turn in turns for msg in turn
+            )
+            if len(aged) >= config.HISTORY_SUMMARY_BATCH or backlog > config.HISTORY_TOKEN_BUDGET:
+                updated = await self._update_summary(conversation_id, summary_text, aged)
+                if updated is not None:
+                    summary_text, turns = updated, turns[-keep:]
+
+        # Drop the oldest verbatim turns until the window fits next to the summary
+        budget = config.HISTORY_TOKEN_BUDGET - estimate_tokens(summary_text)
+        sizes = [sum(estimate_tokens(msg["content"]) for msg in turn) for turn in turns]
+        while len(turns) > 1 and sum(sizes) > budget:
+            turns.pop(0)
+            sizes.pop(0)
 
         # Format for Claude API
         history = []
-        for msg in messages:
-            history.append({
-                "role": msg["role"],
-                "content": msg["content"],
-            })
+        if summary_text:
+            history.append({"role": "user", "content": SUMMARY_PREFIX + summary_text})
+            history.append({"role": "assistant", "content": "Understood."})
+        for turn in turns:
+            # A window must open on a user message
+            if turn[0]["role"] != "user":
+                continue
+            for msg in turn:
+                history.append({
+                    "role": msg["role"],
+                    "content": msg["content"],
+                })
 
         return history
 
-    def get_conversation_details(self, conversation_id: str) -> Optional[Dict[str, Any]]:
-        """Get conversation metadata and messages."""
-        conv = self.db.get_conversation(conversation_id)
+    async def _update_summary(
+        self, conversation_id: str, summary_text: str, aged: List[List[Dict[str, Any]]]
+    ) -> Optional[str]:
+        """Fold aged-out turns into the stored summary; None if it could not be regenerated."""
+        if not self.claude:
+            return None
 
-        if not conv:
+        messages = [msg for turn in aged for msg in turn]
+        result = await self.claude.summarize(summary_text, messages, config.HISTORY_SUMMARY_MAX_TOKENS)
+        if "error" in result or not result["content"].strip():
+            logger.warning(
+                f"Could not summarize history for {conversation_id}: {result.get('error', 'empty summary')}"
+            )
             return None
 
-        messages = self.db.get_conversation_messages(conversation_id)
+        summary_text = result["content"].strip()
+        await self.db.save_conversation_summary(
+            conversation_id, summary_text, messages[-1]["rowid"], estimate_tokens(summary_text)
+        )
+        await self.db.record_usage(
+            conversation_id,
+            self.claude.model,
+            result["tokens_input"],
+            result["tokens_output"],
+            self.calculate_message_cost(
+                result["tokens_input"],
+                result["tokens_output"],
+                result["tokens_cache_read"],
+                result["tokens_cache_write"],
+            ),
+            result["tokens_cache_read"],
+            result["tokens_cache_write"],
+        )
+        logger.info(f"Summarized {len(aged)} turns of conversation {conversation_id}")
+        return summary_text
+
+    async def get_conversation_details(
+        self,
+        conversation_id: str,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        include_tool_calls: bool = True,
+        resolve_payloads: bool = False,
+    ) -> Optional[Dict[str, Any]]:
+        """Get conversation metadata and its newest page of messages (next_cursor pages older)."""
+        conv, page = await asyncio.gather(
+            self.db.get_conversation(conversation_id),
+            self.db.get_conversation_messages_page(
+                conversation_id, limit, cursor, include_tool_calls, resolve_payloads
+            ),
+        )
+
+        if not conv:
+            return None
 
         return {
             "id": conv["id"],
@@ -96,31 +211,63 @@ class ConversationService:
             "created_at": conv["created_at"],
             "updated_at": conv["updated_at"],
             "message_count": conv["message_count"],
+            "total_cost": conv["total_cost"],
             "daily_cost": conv["daily_cost"],
-            "messages": messages,
+            "messages": page["messages"],
+            "next_cursor": page["next_cursor"],
         }
 
-    def list_all_conversations(self) -> List[Dict[str, Any]]:
+    async def get_tool_payload(self, payload_hash: str) -> Optional[Any]:
+        """Get a large tool call input or result stored out of line."""
+        return await self.db.get_tool_payload(payload_hash)
+
+    async def list_all_conversations(self) -> List[Dict[str, Any]]:
         """List all conversations."""
-        return self.db.get_all_conversations()
+        return await self.db.get_all_conversations()
 
-    def delete_conversation(self, conversation_id: str) -> bool:
+    async def list_conversations(self, limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """List one page of conversations, most recently updated first."""
+        return await self.db.get_conversations_page(limit, cursor)
+
+    async def search_messages(
+        self,
+        query: str,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        conversation_id: Optional[str] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+    ) -> Dict[str, Any]:
+        """Search past messages, best match first."""
+        return await self.db.search_messages(query, limit, cursor, conversation_id, start_date, end_date)
+
+    async def delete_conversation(self, conversation_id: str) -> bool:
         """Delete a conversation."""
-        return self.db.delete_conversation(conversation_id)
+        return await self.db.delete_conversation(conversation_id)
 
-    def update_conversation_title(self, conversation_id: str, title: str) -> bool:
+    async def update_conversation_title(self, conversation_id: str, title: str) -> bool:
         """Update conversation title."""
-        return self.db.update_conversation_title(conversation_id, title)
+        return await self.db.update_conversation_title(conversation_id, title)
 
-    def get_daily_cost(self, target_date: Optional[date] = None) -> float:
+    async def get_daily_cost(self, target_date: Optional[date] = None) -> float:
         """Get API cost for a date."""
-        return self.db.get_daily_cost(target_date)
+        return await self.db.get_daily_cost(target_date)
 
-    def get_daily_call_count(self, target_date: Optional[date] = None) -> int:
+    async def get_daily_call_count(self, target_date: Optional[date] = None) -> int:
         """Get number of API calls for a date."""
-        return self.db.get_daily_call_count(target_date)
+        return await self.db.get_daily_call_count(target_date)
+
+    async def get_daily_token_count(self, target_date: Optional[date] = None) -> int:
+        """Get number of tokens used on a date."""
+        return await self.db.get_daily_token_count(target_date)
+
+    async def get_usage(
+        self, start_date: date, end_date: date, group_by: str = "day", model: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Get usage totals over a date range."""
+        return await self.db.get_usage(start_date, end_date, group_by, model)
 
-    def build_ha_context(
+    async def build_ha_context(
         self,
         system_info: Dict[str, Any],
         entity_status: Dict[str, Any],
@@ -146,8 +293,7 @@ class ConversationService:
                 context += f"  {i}. {error}\n"
 
         # Add API cost today
-        daily_cost = self.get_daily_cost()
-        daily_calls = self.get_daily_call_count()
+        daily_cost, daily_calls = await asyncio.gather(self.get_daily_cost(), self.get_daily_call_count())
         context += f"- API Cost Today: ${daily_cost:.2f} ({daily_calls} calls)\n"
 
         return context
@@ -178,7 +324,7 @@ class ConversationService:
         return messages, ha_context
 
     def calculate_message_cost(
-        self, tokens_input: int, tokens_output: int
+        self, tokens_input: int, tokens_output: int, tokens_cache_read: int = 0, tokens_cache_write: int = 0
     ) -> float:
         """Calculate cost for tokens using Claude pricing."""
-        return config.get_claude_cost(tokens_input, tokens_output)
+        return config.get_claude_cost(tokens_input, tokens_output, tokens_cache_read, tokens_cache_write)
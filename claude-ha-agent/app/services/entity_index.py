@@ -0,0 +1,98 @@
+"""Secondary indexes over the Home Assistant entity state cache."""
+from typing import Any, Dict, Set
+
+INDEXED_FIELDS = ("domain", "state", "area", "integration", "device")
+
+_EMPTY: frozenset = frozenset()
+
+
+class EntityIndex:
+    """Maps each indexed field value to the set of entity ids currently holding it.
+
+    Updated in O(1) per state change, so filtered lookups and counts cost only as much
+    as the sets involved rather than a scan of the whole cache. Missing values are
+    indexed under None, which makes "no area" or "no integration" lookups cheap too.
+    """
+
+    def __init__(self):
+        """Initialize empty indexes."""
+        self._index: Dict[str, Dict[Any, Set[str]]] = {field: {} for field in INDEXED_FIELDS}
+        self._fields: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        """Number of indexed entities."""
+        return len(self._fields)
+
+    def __contains__(self, entity_id: str) -> bool:
+        """Whether an entity is indexed."""
+        return entity_id in self._fields
+
+    def update(self, entity_id: str, fields: Dict[str, Any]):
+        """Index an entity under its current field values, moving it out of stale buckets."""
+        old_fields = self._fields.get(entity_id)
+
+        for field in INDEXED_FIELDS:
+            value = fields.get(field)
+            if old_fields is not None:
+                old_value = old_fields.get(field)
+                if old_value == value:
+                    continue
+                self._discard(field, old_value, entity_id)
+            self._index[field].setdefault(value, set()).add(entity_id)
+
+        self._fields[entity_id] = fields
+
+    def remove(self, entity_id: str):
+        """Drop an entity from every index."""
+        old_fields = self._fields.pop(entity_id, None)
+        if old_fields is None:
+            return
+
+        for field in INDEXED_FIELDS:
+            self._discard(field, old_fields.get(field), entity_id)
+
+    def clear(self):
+        """Drop all entities."""
+        for buckets in self._index.values():
+            buckets.clear()
+        self._fields.clear()
+
+    def _discard(self, field: str, value: Any, entity_id: str):
+        """Remove an entity from one bucket, deleting the bucket once empty."""
+        bucket = self._index[field].get(value)
+        if bucket is None:
+            return
+
+        bucket.discard(entity_id)
+        if not bucket:
+            del self._index[field][value]
+
+    def get(self, field: str, value: Any) -> Set[str]:
+        """Entity ids whose field equals value. The returned set must not be modified."""
+        return self._index[field].get(value, _EMPTY)
+
+    def groups(self, field: str) -> Dict[Any, Set[str]]:
+        """All values of a field mapped to their entity ids. Treat as read-only."""
+        return self._index[field]
+
+    def fields(self, entity_id: str) -> Dict[str, Any]:
+        """Indexed field values of one entity."""
+        return self._fields.get(entity_id, {})
+
+    def all_ids(self) -> Set[str]:
+        """Every indexed entity id."""
+        return set(self._fields)
+
+    def select(self, **filters: Any) -> Set[str]:
+        """Entity ids matching every given field=value filter, intersecting smallest first."""
+        if not filters:
+            return self.all_ids()
+
+        buckets = sorted((self.get(field, value) for field, value in filters.items()), key=len)
+        result = set(buckets[0])
+        for bucket in buckets[1:]:
+            if not result:
+                break
+            result &= bucket
+
+        return result
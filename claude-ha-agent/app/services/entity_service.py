@@ -1,4 +1,5 @@
 """Entity management service."""
+import heapq
 import logging
 import re
 from typing import Optional, List, Dict, Any
@@ -23,46 +24,41 @@ class EntityService:
     ) -> Dict[str, Any]:
         """List entities with optional filtering."""
         try:
-            # Get all states from cache
-            all_states = self.ha_client.state_cache
+            index = self.ha_client.entity_index
+
+            # Resolve filters against the secondary indexes instead of scanning the cache
+            filters = {}
+            if domain:
+                filters["domain"] = domain
+            if area:
+                # Accept an area id or its display name; an unknown area matches nothing
+                filters["area"] = self.ha_client.registry.resolve_area(area) or area
+            if status and status != "available":
+                filters["state"] = status
+
+            entity_ids = index.select(**filters)
+            if status == "available":
+                entity_ids = entity_ids - index.get("state", "unavailable") - index.get("state", "unknown")
 
-            filtered = []
-
-            for entity_id, state_data in all_states.items():
-                state = state_data.get("state", "")
-                attributes = state_data.get("attributes", {})
-
-                # Apply filters
-                if status and state != status:
-                    if status not in ["available", "unavailable", "unknown"]:
-                        continue
-
-                # Extract domain from entity_id
-                entity_domain = entity_id.split(".")[0] if "." in entity_id else "unknown"
-
-                if domain and entity_domain != domain:
-                    continue
-
-                entity_area = attributes.get("area_id") or attributes.get("area")
-                if area and entity_area != area:
-                    continue
-
-                filtered.append(
+            # Apply pagination
+            total = len(entity_ids)
+            entities = []
+            for entity_id in sorted(entity_ids)[offset : offset + limit]:
+                # Hot projection only: listing never decodes the attribute payload
+                state_data = self.ha_client.state_cache[entity_id]
+                fields = index.fields(entity_id)
+                entities.append(
                     {
                         "entity_id": entity_id,
-                        "state": state,
-                        "domain": entity_domain,
-                        "friendly_name": attributes.get("friendly_name", entity_id),
-                        "area": entity_area,
-                        "integration": attributes.get("integration"),
-                        "last_updated": state_data.get("last_updated"),
+                        "state": fields.get("state"),
+                        "domain": fields.get("domain"),
+                        "friendly_name": state_data.hot_attribute("friendly_name", entity_id),
+                        "area": fields.get("area"),
+                        "integration": fields.get("integration"),
+                        "last_updated": state_data.last_updated,
                     }
                 )
 
-            # Apply pagination
-            total = len(filtered)
-            entities = filtered[offset : offset + limit]
-
             return {
                 "entities": entities,
                 "total": total,
@@ -92,17 +88,22 @@ class EntityService:
 
             attributes = state_data.get("attributes", {})
             entity_domain = entity_id.split(".")[0] if "." in entity_id else "unknown"
+            registry = self.ha_client.registry
+            area_id = registry.entity_area(entity_id)
 
             return {
                 "entity_id": entity_id,
                 "state": state_data.get("state"),
                 "domain": entity_domain,
                 "friendly_name": attributes.get("friendly_name", entity_id),
-                "area": attributes.get("area_id") or attributes.get("area"),
-                "integration": attributes.get("integration"),
-                "device_id": attributes.get("device_id"),
+                "area": area_id,
+                "area_name": registry.area_name(area_id),
+                "floor": registry.area_floor(area_id),
+                "integration": registry.entity_integration(entity_id),
+                "device_id": registry.entity_device(entity_id),
                 "attributes": attributes,
                 "last_updated": state_data.get("last_updated"),
+                "stale": entity_id in self.ha_client.stale_entities,
             }
 
         except Exception as e:
@@ -170,15 +171,14 @@ class EntityService:
         try:
             proposed_changes = []
 
-            for entity_id in self.ha_client.state_cache.keys():
-                entity_domain = entity_id.split(".")[0]
+            # Filter by domain if specified
+            index = self.ha_client.entity_index
+            candidates = index.get("domain", domain) if domain else index.all_ids()
 
-                # Filter by domain if specified
-                if domain and entity_domain != domain:
-                    continue
+            for entity_id in sorted(candidates):
+                entity_domain, entity_name = entity_id.split(".", 1)
 
                 # Apply pattern matching
-                entity_name = entity_id.split(".")[1]
 
                 if "*" in pattern_from:
                     # Wildcard matching
@@ -204,11 +204,21 @@ class EntityService:
                 )
 
             if execute:
-                # TODO: Execute the renames
                 logger.info(f"Executing {len(proposed_changes)} entity renames")
+
+                # One pipelined registry update per entity over the WebSocket
+                results = await self.ha_client.update_entity_registry_bulk(
+                    [{"entity_id": c["old_id"], "new_entity_id": c["new_id"]} for c in proposed_changes]
+                )
+                for change, result in zip(proposed_changes, results):
+                    change["success"] = result["success"]
+                    if not result["success"]:
+                        change["error"] = result["error"]
+
+                renamed = sum(1 for r in results if r["success"])
                 return {
-                    "renamed": len(proposed_changes),
-                    "failed": 0,
+                    "renamed": renamed,
+                    "failed": len(results) - renamed,
                     "details": proposed_changes,
                 }
             else:
@@ -260,22 +270,18 @@ class EntityService:
         """Analyze entity naming patterns for consistency."""
         try:
             issues = []
-            patterns = {}
+
+            # Track patterns by domain straight from the domain index
+            patterns = {
+                domain: {"count": len(entity_ids), "examples": heapq.nsmallest(5, entity_ids)}
+                for domain, entity_ids in self.ha_client.entity_index.groups("domain").items()
+            }
 
             for entity_id in self.ha_client.state_cache.keys():
                 if "." not in entity_id:
                     continue
 
                 domain, name = entity_id.split(".", 1)
-                name_parts = name.split("_")
-
-                # Track patterns by domain
-                if domain not in patterns:
-                    patterns[domain] = {"count": 0, "examples": []}
-
-                patterns[domain]["count"] += 1
-                if len(patterns[domain]["examples"]) < 5:
-                    patterns[domain]["examples"].append(entity_id)
 
                 # Check for issues
                 # Mixed case
@@ -2,173 +2,749 @@
 import asyncio
 import json
 import logging
-from typing import Optional, Callable, Dict, Any
-from datetime import datetime
+import random
+import sys
+import time
+from typing import Optional, Callable, Dict, Any, Iterable, List
 import aiohttp
 
+from app.models.entity_state import (
+    AttributePool,
+    EntityState,
+    encode_attributes,
+    estimate_cache_memory,
+    extract_hot_attributes,
+    parse_timestamp,
+)
+from app.services.entity_index import EntityIndex
+from app.services.ha_registry import RegistryMirror
+
 logger = logging.getLogger(__name__)
 
+# Sentinel for attributes an entity does not have
+_MISSING = object()
+
+
+class HACommandError(Exception):
+    """Raised when Home Assistant answers a WebSocket command with success=false."""
+
+    def __init__(self, code: str, message: str):
+        """Initialize command error."""
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+
 
 class HAClient:
     """Manages connection to Home Assistant WebSocket API."""
 
-    def __init__(self, ha_url: str, ha_token: str, ws_url: str):
+    def __init__(
+        self,
+        ha_url: str,
+        ha_token: str,
+        ws_url: str,
+        pool_limit: int = 20,
+        pool_limit_per_host: int = 10,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 60.0,
+        request_timeout: float = 10.0,
+        command_timeout: float = 10.0,
+        heartbeat_interval: float = 30.0,
+        heartbeat_timeout: float = 10.0,
+        max_reconnect_delay: float = 60.0,
+        dispatch_window: float = 0.05,
+        dispatch_max_pending: int = 5000,
+        dispatch_queue_size: int = 100,
+        dispatch_workers: int = 2,
+    ):
         """Initialize HA client."""
         self.ha_url = ha_url
         self.ha_token = ha_token
         self.ws_url = ws_url
+        self.pool_limit = pool_limit
+        self.pool_limit_per_host = pool_limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = aiohttp.ClientTimeout(total=request_timeout)
+        self.command_timeout = command_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_reconnect_delay = max_reconnect_delay
+        self.dispatch_window = dispatch_window
+        self.dispatch_max_pending = dispatch_max_pending
+        self.dispatch_workers = dispatch_workers
+        self.session: Optional[aiohttp.ClientSession] = None
         self.ws: Optional[aiohttp.ClientWebSocketResponse] = None
         self.connected = False
         self.message_id = 0
-        self.state_cache: Dict[str, Any] = {}
+        self.state_cache: Dict[str, EntityState] = {}
+        self.attribute_pool = AttributePool()
+        self.entity_index = EntityIndex()
+        self.stale_entities: set[str] = set()
+        self.registry = RegistryMirror(self)
         self.state_update_callbacks: list[Callable] = []
+        self.state_batch_callbacks: list[Callable] = []
         self._connection_task: Optional[asyncio.Task] = None
+        self._pending_commands: Dict[int, asyncio.Future] = {}
+        self._subscriptions: Dict[int, Callable] = {}
+        self._supervisor_task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._disconnected_at: Optional[float] = None
+        self.metrics: Dict[str, Any] = {
+            "reconnects": 0,
+            "heartbeat_failures": 0,
+            "last_reconnect_to_consistent_ms": None,
+            "last_resync": {"added": 0, "changed": 0, "removed": 0},
+        }
+
+        # Coalescing buffer between the socket reader and the callback workers
+        self._pending_changes: Dict[str, Optional[EntityState]] = {}
+        self._dispatch_wakeup = asyncio.Event()
+        # One queue per worker; an entity always hashes to the same one, so its changes stay in order
+        self._dispatch_queues: list[asyncio.Queue] = [
+            asyncio.Queue(maxsize=dispatch_queue_size) for _ in range(max(dispatch_workers, 1))
+        ]
+        self._dispatch_tasks: list[asyncio.Task] = []
+        self.dispatch_stats: Dict[str, int] = {
+            "queued": 0,
+            "coalesced": 0,
+            "dropped": 0,
+            "dispatched": 0,
+            "batches": 0,
+            "backpressure_waits": 0,
+        }
 
     def add_state_update_callback(self, callback: Callable):
-        """Register callback for state changes."""
+        """Register callback for state changes.
+
+        Called as callback(entity_id, new_state) with the cached EntityState, or None when the
+        entity was removed. Callbacks run on dispatch workers, never inside the socket reader.
+        """
         self.state_update_callbacks.append(callback)
 
+    def add_state_batch_callback(self, callback: Callable):
+        """Register callback for coalesced batches of state changes.
+
+        Called as callback(changes) with a dict of entity_id to its latest state (or None
+        when removed) collected during one dispatch window. With several dispatch workers a
+        window is split by entity, so each call covers that worker's share of the entities.
+        """
+        self.state_batch_callbacks.append(callback)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared HTTP session, creating its connection pool on first use."""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                headers={"Authorization": f"Bearer {self.ha_token}"},
+            )
+        return self.session
+
+    async def _rest_get(self, path: str) -> Optional[Any]:
+        """GET a REST API path over the shared session, returning decoded JSON or None."""
+        session = self._get_session()
+        async with session.get(f"{self.ha_url}{path}", timeout=self.request_timeout) as resp:
+            if resp.status == 200:
+                return await resp.json()
+
+            logger.warning(f"HA REST {path} returned status {resp.status}")
+            return None
+
     async def connect(self, max_retries: int = 5, retry_delay: int = 5) -> bool:
-        """Connect to HA WebSocket."""
+        """Connect to HA WebSocket and start the connection supervisor.
+
+        The supervisor keeps reconnecting in the background even if these initial
+        attempts fail, so a False return only means HA is not reachable yet.
+        """
+        self._closing = False
+        connected = False
+        self._start_dispatcher()
+
         for attempt in range(max_retries):
-            try:
-                logger.info(f"Connecting to HA WebSocket (attempt {attempt + 1}/{max_retries})")
+            logger.info(f"Connecting to HA WebSocket (attempt {attempt + 1}/{max_retries})")
+            if await self._open_connection():
+                connected = True
+                break
+
+            if attempt < max_retries - 1:
+                await asyncio.sleep(self._backoff_delay(attempt, retry_delay))
 
-                session = aiohttp.ClientSession()
-                self.ws = await session.ws_connect(self.ws_url, autoping=True, autoclose=True)
+        if not connected:
+            logger.error("Failed to connect to HA after maximum retries, retrying in background")
+            self._disconnected_at = time.monotonic()
+
+        self._supervisor_task = asyncio.create_task(self._supervise(retry_delay))
+        return connected
+
+    async def _open_connection(self) -> bool:
+        """Open, authenticate and bootstrap one WebSocket connection."""
+        try:
+            session = self._get_session()
+            self.ws = await session.ws_connect(self.ws_url, autoping=True, autoclose=True)
 
-                # Authenticate
-                auth_msg = {"type": "auth", "access_token": self.ha_token}
-                await self.ws.send_json(auth_msg)
+            # Authenticate
+            auth_msg = {"type": "auth", "access_token": self.ha_token}
+            await self.ws.send_json(auth_msg)
 
-                # Wait for auth response
+            # Wait for auth response (HA greets every connection with auth_required first)
+            msg = await self.ws.receive_json(timeout=10)
+            if msg.get("type") == "auth_required":
                 msg = await self.ws.receive_json(timeout=10)
-                if msg.get("type") == "auth_ok":
-                    self.connected = True
-                    logger.info("Successfully connected and authenticated to HA")
+            if msg.get("type") != "auth_ok":
+                logger.error(f"Authentication failed: {msg}")
+                await self._close_socket()
+                return False
 
-                    # Subscribe to state_changed events
-                    await self._subscribe_to_events()
+            self.connected = True
+            logger.info("Successfully connected and authenticated to HA")
 
-                    # Start listening for messages
-                    self._connection_task = asyncio.create_task(self._listen_for_messages())
+            # Start listening first so command results can be resolved
+            self._connection_task = asyncio.create_task(self._listen_for_messages())
 
-                    return True
-                else:
-                    logger.error(f"Authentication failed: {msg}")
-                    await self.ws.close()
+            # Load the state snapshot and subscribe to entity deltas
+            await self._subscribe_to_events()
+            return True
+
+        except asyncio.TimeoutError:
+            logger.warning("Connection timeout")
+        except Exception as e:
+            logger.warning(f"Connection error: {e}")
 
-            except asyncio.TimeoutError:
-                logger.warning(f"Connection timeout (attempt {attempt + 1})")
+        await self._close_socket()
+        return False
+
+    def _backoff_delay(self, attempt: int, retry_delay: float) -> float:
+        """Exponential backoff with jitter, capped at max_reconnect_delay."""
+        delay = min(self.max_reconnect_delay, retry_delay * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+    async def _supervise(self, retry_delay: float):
+        """Watch the connection, heartbeat it, and reconnect with backoff when it drops."""
+        attempt = 0
+
+        while not self._closing:
+            try:
+                if self._connection_task is None or self._connection_task.done():
+                    if await self._open_connection():
+                        attempt = 0
+                        self.metrics["reconnects"] += 1
+                        if self._disconnected_at is not None:
+                            elapsed_ms = (time.monotonic() - self._disconnected_at) * 1000
+                            self.metrics["last_reconnect_to_consistent_ms"] = round(elapsed_ms, 1)
+                            self._disconnected_at = None
+                        logger.info(f"Reconnected to HA, resync: {self.metrics['last_resync']}")
+                    else:
+                        delay = self._backoff_delay(attempt, retry_delay)
+                        attempt += 1
+                        logger.info(f"Reconnecting to HA in {delay:.1f}s")
+                        await asyncio.sleep(delay)
+                    continue
+
+                done, _ = await asyncio.wait({self._connection_task}, timeout=self.heartbeat_interval)
+                if done:
+                    logger.warning("HA WebSocket connection lost")
+                    self._disconnected_at = time.monotonic()
+                elif not await self._heartbeat():
+                    logger.warning("HA heartbeat lost, forcing reconnect")
+                    self.metrics["heartbeat_failures"] += 1
+                    self._disconnected_at = time.monotonic()
+                    await self._close_socket()
+
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.warning(f"Connection error: {e} (attempt {attempt + 1})")
+                logger.error(f"HA connection supervisor error: {e}")
+                await asyncio.sleep(retry_delay)
 
-            if attempt < max_retries - 1:
-                await asyncio.sleep(retry_delay * (2 ** attempt))  # Exponential backoff
+    async def _heartbeat(self) -> bool:
+        """Ping HA and report whether it answered in time."""
+        try:
+            await self.send_command({"type": "ping"}, timeout=self.heartbeat_timeout)
+            return True
+        except Exception:
+            return False
 
-        logger.error("Failed to connect to HA after maximum retries")
-        return False
+    async def _close_socket(self):
+        """Close the WebSocket and wait for the listener to exit."""
+        self.connected = False
 
-    async def _subscribe_to_events(self):
-        """Subscribe to HA events."""
-        self.message_id += 1
-        subscribe_msg = {
-            "id": self.message_id,
-            "type": "subscribe_events",
-            "event_type": "state_changed",
+        if self.ws and not self.ws.closed:
+            await self.ws.close()
+
+        if self._connection_task and not self._connection_task.done():
+            self._connection_task.cancel()
+            try:
+                await self._connection_task
+            except asyncio.CancelledError:
+                pass
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get entity count and estimated memory use of the state cache."""
+        return estimate_cache_memory(self.state_cache, self.attribute_pool)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get connection health metrics."""
+        return {
+            **self.metrics,
+            "connected": self.connected,
+            "pending_commands": len(self._pending_commands),
+            "cached_entities": len(self.state_cache),
+            "stale_entities": len(self.stale_entities),
+            "dispatch": {
+                **self.dispatch_stats,
+                "pending": len(self._pending_changes),
+                "queue_depth": sum(queue.qsize() for queue in self._dispatch_queues),
+            },
         }
-        await self.ws.send_json(subscribe_msg)
+
+    def _next_message_id(self) -> int:
+        """Allocate the next WebSocket message id."""
+        self.message_id += 1
+        return self.message_id
+
+    async def _send_frames(
+        self, messages: List[Dict[str, Any]], event_handler: Optional[Callable] = None
+    ) -> List[tuple[int, asyncio.Future]]:
+        """Send command frames back-to-back, registering a result future for each id.
+
+        When event_handler is given it is registered for the ids before sending, so events
+        following a subscription result can never arrive ahead of their handler.
+        """
+        if not self.ws or self.ws.closed:
+            raise ConnectionError("WebSocket not connected")
+
+        loop = asyncio.get_running_loop()
+        sent = []
+        try:
+            for message in messages:
+                msg_id = self._next_message_id()
+                future = loop.create_future()
+                self._pending_commands[msg_id] = future
+                if event_handler:
+                    self._subscriptions[msg_id] = event_handler
+                sent.append((msg_id, future))
+                await self.ws.send_json({**message, "id": msg_id})
+        except Exception:
+            for msg_id, _ in sent:
+                self._pending_commands.pop(msg_id, None)
+                self._subscriptions.pop(msg_id, None)
+            raise
+
+        return sent
+
+    async def _wait_for_result(self, msg_id: int, future: asyncio.Future, timeout: Optional[float]) -> Any:
+        """Wait for a command result, dropping its pending entry however it ends."""
+        try:
+            return await asyncio.wait_for(future, timeout or self.command_timeout)
+        finally:
+            self._pending_commands.pop(msg_id, None)
+
+    async def send_command(self, message: Dict[str, Any], timeout: Optional[float] = None) -> Any:
+        """Send a WebSocket command and return its result payload.
+
+        Raises HACommandError when HA rejects the command and asyncio.TimeoutError when
+        no result arrives within the timeout.
+        """
+        (msg_id, future), = await self._send_frames([message])
+        return await self._wait_for_result(msg_id, future, timeout)
+
+    async def send_commands(
+        self, messages: List[Dict[str, Any]], timeout: Optional[float] = None
+    ) -> List[Any]:
+        """Pipeline many commands on the socket and return their results in order.
+
+        All frames are written before any result is awaited. A failed command yields its
+        exception (HACommandError or asyncio.TimeoutError) in place of a result.
+        """
+        sent = await self._send_frames(messages)
+        return await asyncio.gather(
+            *(self._wait_for_result(msg_id, future, timeout) for msg_id, future in sent),
+            return_exceptions=True,
+        )
+
+    async def subscribe(self, message: Dict[str, Any], handler: Callable) -> int:
+        """Send a subscription command and route its event frames to handler(event).
+
+        Returns the subscription id.
+        """
+        (msg_id, future), = await self._send_frames([message], event_handler=handler)
+        try:
+            await self._wait_for_result(msg_id, future, None)
+        except Exception:
+            self._subscriptions.pop(msg_id, None)
+            raise
+        return msg_id
+
+    def _resolve_command(self, msg: Dict[str, Any]):
+        """Resolve the future waiting on a result or pong frame."""
+        future = self._pending_commands.get(msg.get("id"))
+        if future is None or future.done():
+            return
+
+        if msg.get("type") == "pong" or msg.get("success"):
+            future.set_result(msg.get("result"))
+        else:
+            error = msg.get("error") or {}
+            future.set_exception(HACommandError(error.get("code", "unknown_error"), error.get("message", "")))
+
+    def _fail_pending_commands(self, error: Exception):
+        """Fail every in-flight command, e.g. when the socket goes away."""
+        for future in self._pending_commands.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending_commands.clear()
+
+    async def _subscribe_to_events(self):
+        """Bootstrap the cache from a snapshot, then follow compressed entity deltas."""
+        self._subscriptions.clear()
+
+        # Registries first so the snapshot is indexed with the right areas and integrations
+        await self.registry.load()
 
         # Get entities list
         await self._get_entities()
 
-    async def _get_entities(self):
-        """Get initial entity state snapshot."""
-        self.message_id += 1
-        call_msg = {
-            "id": self.message_id,
-            "type": "call_service",
-            "domain": "homeassistant",
-            "service": "get_states",
-        }
+        await self.subscribe({"type": "subscribe_entities"}, self._handle_entities_event)
 
-        try:
-            await self.ws.send_json(call_msg)
-            # Response will be handled in listen_for_messages
-        except Exception as e:
-            logger.error(f"Error getting entities: {e}")
+    async def _get_entities(self):
+        """Get an entity state snapshot via get_states and reconcile the cache against it.
+
+        Only entities that were added, changed or removed since the cache was last
+        consistent are applied, so a resync after reconnect touches just the diff.
+        """
+        states = await self.send_command({"type": "get_states"}, timeout=30)
+
+        resync = {"added": 0, "changed": 0, "removed": 0}
+        seen = set()
+
+        for state in states or []:
+            entity_id = state.get("entity_id")
+            if not entity_id:
+                continue
+
+            seen.add(entity_id)
+            new_state = state.get("state")
+            attributes = state.get("attributes") or {}
+            raw_attributes = encode_attributes(attributes)
+            last_updated_ts = parse_timestamp(state.get("last_updated"))
+
+            current = self.state_cache.get(entity_id)
+            if current is None:
+                resync["added"] += 1
+            elif current.matches(new_state, raw_attributes, last_updated_ts):
+                continue
+            else:
+                resync["changed"] += 1
+            self._apply_state(
+                entity_id, self._make_state(new_state, attributes, last_updated_ts, raw_attributes=raw_attributes)
+            )
+
+        for entity_id in [e for e in self.state_cache if e not in seen]:
+            self._remove_state(entity_id)
+            resync["removed"] += 1
+
+        # Everything left in the cache has now been confirmed by HA
+        self.stale_entities.clear()
+
+        self.metrics["last_resync"] = resync
+        logger.info(f"Loaded {len(self.state_cache)} entity states from snapshot ({resync})")
 
     async def _listen_for_messages(self):
-        """Listen for messages from HA WebSocket."""
+        """Listen for messages from HA WebSocket until the socket closes."""
         try:
-            while self.ws and not self.ws.closed:
-                msg = await self.ws.receive_json(timeout=60)
+            async for ws_msg in self.ws:
+                if ws_msg.type == aiohttp.WSMsgType.ERROR:
+                    logger.error(f"WebSocket error frame: {self.ws.exception()}")
+                    break
+                if ws_msg.type != aiohttp.WSMsgType.TEXT:
+                    continue
+
+                msg = json.loads(ws_msg.data)
 
                 if msg.get("type") == "event":
-                    event = msg.get("event", {})
-                    if event.get("event_type") == "state_changed":
-                        await self._handle_state_changed(event.get("data", {}))
+                    handler = self._subscriptions.get(msg.get("id"))
+                    if handler:
+                        handler(msg.get("event", {}))
 
-                elif msg.get("type") == "result":
-                    # Handle call_service results
-                    pass
+                elif msg.get("type") in ("result", "pong"):
+                    self._resolve_command(msg)
 
                 elif msg.get("type") == "auth_required":
                     logger.warning("Re-authentication required")
                     auth_msg = {"type": "auth", "access_token": self.ha_token}
                     await self.ws.send_json(auth_msg)
 
-        except asyncio.TimeoutError:
-            logger.warning("WebSocket timeout - connection idle")
         except asyncio.CancelledError:
             logger.info("WebSocket listener cancelled")
         except Exception as e:
             logger.error(f"WebSocket error: {e}")
+        finally:
             self.connected = False
+            self._fail_pending_commands(ConnectionError("WebSocket listener stopped"))
+
+    @staticmethod
+    def _compressed_timestamp(compressed: Dict[str, Any]) -> Optional[float]:
+        """Epoch last_updated of a compressed state (HA omits lu when it equals lc)."""
+        return compressed.get("lu", compressed.get("lc"))
+
+    def _handle_entities_event(self, event: Dict[str, Any]):
+        """Apply a subscribe_entities message of added (a), changed (c) and removed (r) entities."""
+        for entity_id, compressed in event.get("a", {}).items():
+            new_state = compressed.get("s")
+            attributes = compressed.get("a", {})
+            raw_attributes = encode_attributes(attributes)
+            current = self.state_cache.get(entity_id)
+            if current and current.state == new_state and current.raw_attributes == raw_attributes:
+                # Initial replay of an entity the snapshot already loaded
+                continue
+            self._apply_state(
+                entity_id,
+                self._make_state(
+                    new_state, attributes, self._compressed_timestamp(compressed), raw_attributes=raw_attributes
+                ),
+            )
+
+        for entity_id, diff in event.get("c", {}).items():
+            current = self.state_cache.get(entity_id)
+            if current is None:
+                continue
+
+            additions = diff.get("+", {})
+            removed_attributes = diff.get("-", {}).get("a", [])
+
+            # Changes to state or timestamps only reuse the raw attribute payload untouched;
+            # re-encoding the whole attribute set is paid only when an attribute really changes
+            attributes = None
+            changed_attributes = additions.get("a") or {}
+            if changed_attributes or removed_attributes:
+                attributes = current.attributes
+                if any(attributes.get(key, _MISSING) != value for key, value in changed_attributes.items()) or any(
+                    key in attributes for key in removed_attributes
+                ):
+                    attributes.update(changed_attributes)
+                    for key in removed_attributes:
+                        attributes.pop(key, None)
+                else:
+                    attributes = None
+
+            timestamp = self._compressed_timestamp(additions)
+            self._apply_state(
+                entity_id,
+                self._make_state(
+                    additions.get("s", current.state),
+                    attributes,
+                    timestamp if timestamp is not None else current.last_updated_ts,
+                    current,
+                ),
+            )
+
+        for entity_id in event.get("r", []):
+            if entity_id in self.state_cache:
+                self._remove_state(entity_id)
+
+    def _make_state(
+        self,
+        state: Optional[str],
+        attributes: Optional[Dict[str, Any]],
+        last_updated_ts: Optional[float],
+        current: Optional[EntityState] = None,
+        raw_attributes: Optional[bytes] = None,
+    ) -> EntityState:
+        """Build a compact cache record whose raw attribute payload comes from the shared pool.
+
+        Passing attributes=None keeps the payload and hot projection of current.
+        """
+        if attributes is None:
+            return EntityState(
+                state, self.attribute_pool.acquire(current.raw_attributes), current.hot, last_updated_ts
+            )
+
+        if raw_attributes is None:
+            raw_attributes = encode_attributes(attributes)
+        return EntityState(
+            state,
+            self.attribute_pool.acquire(raw_attributes),
+            extract_hot_attributes(attributes),
+            last_updated_ts,
+        )
+
+    def _index_fields(self, entity_id: str, entry: EntityState) -> Dict[str, Any]:
+        """Field values an entity is indexed under."""
+        return {
+            "domain": sys.intern(entity_id.split(".", 1)[0]),
+            "state": entry.state,
+            "area": self.registry.entity_area(entity_id),
+            "integration": self.registry.entity_integration(entity_id),
+            "device": self.registry.entity_device(entity_id),
+        }
 
-    async def _handle_state_changed(self, data: Dict[str, Any]):
-        """Handle state_changed event."""
-        entity_id = data.get("entity_id")
-        new_state = data.get("new_state", {})
-
-        if entity_id and new_state:
-            self.state_cache[entity_id] = {
-                "state": new_state.get("state"),
-                "attributes": new_state.get("attributes", {}),
-                "last_updated": new_state.get("last_updated"),
-            }
-
-            # Call registered callbacks
-            for callback in self.state_update_callbacks:
-                try:
-                    if asyncio.iscoroutinefunction(callback):
-                        await callback(entity_id, new_state)
-                    else:
-                        callback(entity_id, new_state)
-                except Exception as e:
-                    logger.error(f"Error in state update callback: {e}")
+    def reindex_entities(self, entity_ids: Iterable[str]):
+        """Refresh the index entries of cached entities after a registry change."""
+        for entity_id in list(entity_ids):
+            entry = self.state_cache.get(entity_id)
+            if entry is not None:
+                self.entity_index.update(entity_id, self._index_fields(entity_id, entry))
+
+    def _store_state(self, entity_id: str, entry: EntityState):
+        """Store an entity's state in the cache and its indexes."""
+        old_entry = self.state_cache.get(entity_id)
+        self.state_cache[entity_id] = entry
+        if old_entry is not None:
+            self.attribute_pool.release(old_entry.raw_attributes)
+        self.entity_index.update(entity_id, self._index_fields(entity_id, entry))
+
+    def _apply_state(self, entity_id: str, entry: EntityState):
+        """Store an entity's new state and queue it for callbacks."""
+        self._store_state(entity_id, entry)
+        self.stale_entities.discard(entity_id)
+        self._queue_state_change(entity_id, entry)
+
+    def _remove_state(self, entity_id: str):
+        """Drop an entity from the cache and its indexes and queue the removal for callbacks."""
+        old_entry = self.state_cache.pop(entity_id, None)
+        if old_entry is not None:
+            self.attribute_pool.release(old_entry.raw_attributes)
+        self.entity_index.remove(entity_id)
+        self.stale_entities.discard(entity_id)
+        self._queue_state_change(entity_id, None)
+
+    def restore_states(self, entities: List[Dict[str, Any]]) -> int:
+        """Warm the cache from persisted states before HA is reachable.
+
+        Restored entries are marked stale until the first snapshot reconciles them, and
+        they are not passed to state callbacks.
+        """
+        restored = 0
+        for entity in entities:
+            entity_id = entity.get("entity_id")
+            if not entity_id or entity_id in self.state_cache:
+                continue
+
+            raw_attributes = (entity.get("attributes") or "{}").encode("utf-8")
+            self._store_state(
+                entity_id,
+                self._make_state(
+                    entity.get("state"),
+                    json.loads(raw_attributes),
+                    parse_timestamp(entity.get("last_updated")),
+                    raw_attributes=raw_attributes,
+                ),
+            )
+            self.stale_entities.add(entity_id)
+            restored += 1
+
+        logger.info(f"Restored {restored} entity states from the persisted cache")
+        return restored
+
+    def _queue_state_change(self, entity_id: str, new_state: Optional[EntityState]):
+        """Coalesce a change into the pending buffer without ever blocking the reader.
+
+        The last write per entity wins within a dispatch window. When the buffer is full
+        because consumers are behind, changes for new entities are dropped and counted.
+        """
+        if not self.state_update_callbacks and not self.state_batch_callbacks:
+            return
+
+        if entity_id in self._pending_changes:
+            self.dispatch_stats["coalesced"] += 1
+        elif len(self._pending_changes) >= self.dispatch_max_pending:
+            self.dispatch_stats["dropped"] += 1
+            return
+        else:
+            self.dispatch_stats["queued"] += 1
+
+        self._pending_changes[entity_id] = new_state
+        self._dispatch_wakeup.set()
+
+    def _start_dispatcher(self):
+        """Start the batch flusher and callback workers if not already running."""
+        if self._dispatch_tasks:
+            return
+
+        self._dispatch_tasks.append(asyncio.create_task(self._flush_pending_changes()))
+        for queue in self._dispatch_queues:
+            self._dispatch_tasks.append(asyncio.create_task(self._dispatch_worker(queue)))
+
+    async def _stop_dispatcher(self):
+        """Cancel the dispatcher tasks."""
+        for task in self._dispatch_tasks:
+            task.cancel()
+        await asyncio.gather(*self._dispatch_tasks, return_exceptions=True)
+        self._dispatch_tasks = []
+
+    async def _flush_pending_changes(self):
+        """Hand the coalesced buffer to the workers once per dispatch window."""
+        while True:
+            await self._dispatch_wakeup.wait()
+            await asyncio.sleep(self.dispatch_window)
+            self._dispatch_wakeup.clear()
+
+            batch, self._pending_changes = self._pending_changes, {}
+            if not batch:
+                continue
+
+            # Shard by entity so a newer change never overtakes an older one on another worker
+            shards: list[Dict[str, Optional[EntityState]]] = [{} for _ in self._dispatch_queues]
+            for entity_id, new_state in batch.items():
+                shards[hash(entity_id) % len(shards)][entity_id] = new_state
+
+            for queue, shard in zip(self._dispatch_queues, shards):
+                if not shard:
+                    continue
+                if queue.full():
+                    # Backpressure: wait here while the reader keeps coalescing into the buffer
+                    self.dispatch_stats["backpressure_waits"] += 1
+                await queue.put(shard)
+
+    async def _dispatch_worker(self, queue: asyncio.Queue):
+        """Run registered callbacks for each batch on this worker's queue, in order."""
+        while True:
+            batch = await queue.get()
+            try:
+                for callback in self.state_batch_callbacks:
+                    await self._run_callback(callback, batch)
+
+                for entity_id, new_state in batch.items():
+                    for callback in self.state_update_callbacks:
+                        await self._run_callback(callback, entity_id, new_state)
+
+                self.dispatch_stats["dispatched"] += len(batch)
+                self.dispatch_stats["batches"] += 1
+            finally:
+                queue.task_done()
+
+    @staticmethod
+    async def _run_callback(callback: Callable, *args):
+        """Call a sync or async callback, logging rather than propagating its errors."""
+        try:
+            if asyncio.iscoroutinefunction(callback):
+                await callback(*args)
+            else:
+                callback(*args)
+        except Exception as e:
+            logger.error(f"Error in state update callback: {e}")
 
     async def get_state(self, entity_id: str) -> Optional[Dict[str, Any]]:
         """Get current state of an entity."""
         if entity_id in self.state_cache:
-            return self.state_cache[entity_id]
+            return self.state_cache[entity_id].to_dict()
 
         # If not in cache, try to fetch from HA API
         try:
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.ha_url}/api/states/{entity_id}"
-                headers = {"Authorization": f"Bearer {self.ha_token}"}
-
-                async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        state = {
-                            "state": data.get("state"),
-                            "attributes": data.get("attributes", {}),
-                            "last_updated": data.get("last_updated"),
-                        }
-                        self.state_cache[entity_id] = state
-                        return state
+            data = await self._rest_get(f"/api/states/{entity_id}")
+            if data:
+                entry = self._make_state(
+                    data.get("state"), data.get("attributes") or {}, parse_timestamp(data.get("last_updated"))
+                )
+                self._store_state(entity_id, entry)
+                return entry.to_dict()
 
         except Exception as e:
             logger.warning(f"Error fetching state for {entity_id}: {e}")
@@ -178,25 +754,22 @@ class HAClient:
     async def get_all_states(self) -> Dict[str, Any]:
         """Get all entity states from HA."""
         try:
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.ha_url}/api/states"
-                headers = {"Authorization": f"Bearer {self.ha_token}"}
-
-                async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                    if resp.status == 200:
-                        entities = await resp.json()
-
-                        # Update cache
-                        for entity in entities:
-                            entity_id = entity.get("entity_id")
-                            if entity_id:
-                                self.state_cache[entity_id] = {
-                                    "state": entity.get("state"),
-                                    "attributes": entity.get("attributes", {}),
-                                    "last_updated": entity.get("last_updated"),
-                                }
-
-                        return self.state_cache
+            entities = await self._rest_get("/api/states")
+            if entities is not None:
+                # Update cache
+                for entity in entities:
+                    entity_id = entity.get("entity_id")
+                    if entity_id:
+                        self._store_state(
+                            entity_id,
+                            self._make_state(
+                                entity.get("state"),
+                                entity.get("attributes") or {},
+                                parse_timestamp(entity.get("last_updated")),
+                            ),
+                        )
+
+                return self.state_cache
 
         except Exception as e:
             logger.error(f"Error getting all states: {e}")
@@ -210,32 +783,47 @@ class HAClient:
             return False
 
         try:
-            self.message_id += 1
-            msg = {
-                "id": self.message_id,
-                "type": "call_service",
-                "domain": domain,
-                "service": service,
-                "service_data": data or {},
-            }
-
-            await self.ws.send_json(msg)
+            await self.send_command(
+                {
+                    "type": "call_service",
+                    "domain": domain,
+                    "service": service,
+                    "service_data": data or {},
+                }
+            )
             return True
 
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out calling service {domain}.{service}")
+            return False
+
         except Exception as e:
             logger.error(f"Error calling service {domain}.{service}: {e}")
             return False
 
+    async def update_entity_registry_bulk(self, updates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Apply many entity registry updates as pipelined WebSocket commands.
+
+        Each update is a dict with "entity_id" plus the registry fields to change
+        (e.g. "new_entity_id", "name", "area_id").
+        """
+        messages = [{"type": "config/entity_registry/update", **update} for update in updates]
+        results = await self.send_commands(messages)
+
+        outcome = []
+        for update, result in zip(updates, results):
+            if isinstance(result, Exception):
+                error = "timeout" if isinstance(result, asyncio.TimeoutError) else str(result)
+                outcome.append({"entity_id": update["entity_id"], "success": False, "error": error})
+            else:
+                outcome.append({"entity_id": update["entity_id"], "success": True})
+
+        return outcome
+
     async def get_config(self) -> Optional[Dict[str, Any]]:
         """Get Home Assistant configuration."""
         try:
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.ha_url}/api/config"
-                headers = {"Authorization": f"Bearer {self.ha_token}"}
-
-                async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                    if resp.status == 200:
-                        return await resp.json()
+            return await self._rest_get("/api/config")
 
         except Exception as e:
             logger.error(f"Error getting config: {e}")
@@ -244,16 +832,21 @@ class HAClient:
 
     async def disconnect(self):
         """Disconnect from HA WebSocket."""
-        self.connected = False
+        self._closing = True
 
-        if self._connection_task:
-            self._connection_task.cancel()
+        if self._supervisor_task:
+            self._supervisor_task.cancel()
             try:
-                await self._connection_task
+                await self._supervisor_task
             except asyncio.CancelledError:
                 pass
 
-        if self.ws and not self.ws.closed:
-            await self.ws.close()
+        await self._close_socket()
+        await self.registry.close()
+        await self._stop_dispatcher()
+
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
 
         logger.info("Disconnected from HA")
@@ -0,0 +1,205 @@
+"""In-memory mirror of the Home Assistant entity, device, area and floor registries."""
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, Optional, Set
+
+from app.models.entity_state import intern_value
+
+logger = logging.getLogger(__name__)
+
+# Registry fields kept per table; everything else HA returns is dropped to save memory
+ENTITY_FIELDS = ("platform", "device_id", "area_id", "config_entry_id", "name", "original_name", "disabled_by")
+DEVICE_FIELDS = ("area_id", "name", "name_by_user", "manufacturer", "model", "disabled_by")
+AREA_FIELDS = ("name", "floor_id")
+FLOOR_FIELDS = ("name", "level")
+
+LIST_COMMANDS = {
+    "entities": "config/entity_registry/list",
+    "devices": "config/device_registry/list",
+    "areas": "config/area_registry/list",
+    "floors": "config/floor_registry/list",
+}
+
+UPDATE_EVENTS = {
+    "entity_registry_updated": "entities",
+    "device_registry_updated": "devices",
+    "area_registry_updated": "areas",
+    "floor_registry_updated": "floors",
+}
+
+
+def _slim(entry: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+    """Keep only the listed fields of a registry entry, interning short strings."""
+    return {field: intern_value(entry.get(field)) for field in fields}
+
+
+class RegistryMirror:
+    """Indexed copy of the HA registries, loaded over the WebSocket and kept current from events.
+
+    Entity-to-area and entity-to-integration joins are O(1) dict lookups; whenever a
+    registry change affects entities, their ids are handed to the client for reindexing.
+    """
+
+    def __init__(self, ha_client):
+        """Initialize empty registry tables."""
+        self.ha_client = ha_client
+        self.entities: Dict[str, Dict[str, Any]] = {}
+        self.devices: Dict[str, Dict[str, Any]] = {}
+        self.areas: Dict[str, Dict[str, Any]] = {}
+        self.floors: Dict[str, Dict[str, Any]] = {}
+        self._device_entities: Dict[str, Set[str]] = {}
+        self._area_ids_by_name: Dict[str, str] = {}
+        self._pending_reloads: Dict[str, asyncio.Task] = {}
+        # Strong references, so in-flight refreshes are not garbage collected
+        self._refresh_tasks: Set[asyncio.Task] = set()
+
+    async def load(self):
+        """Load all four registries with pipelined commands and subscribe to their update events."""
+        tables = list(LIST_COMMANDS)
+        results = await self.ha_client.send_commands([{"type": LIST_COMMANDS[table]} for table in tables])
+
+        for table, result in zip(tables, results):
+            if isinstance(result, Exception):
+                # Floors only exist on newer HA versions; the rest of the mirror still works
+                logger.warning(f"Could not load {table} registry: {result}")
+                result = []
+            self._replace_table(table, result)
+
+        for event_type in UPDATE_EVENTS:
+            await self.ha_client.subscribe(
+                {"type": "subscribe_events", "event_type": event_type}, self._handle_registry_event
+            )
+
+        logger.info(
+            f"Registry mirror loaded: {len(self.entities)} entities, {len(self.devices)} devices, "
+            f"{len(self.areas)} areas, {len(self.floors)} floors"
+        )
+
+    def _replace_table(self, table: str, entries: Iterable[Dict[str, Any]]):
+        """Swap in a freshly listed registry table and rebuild its lookups."""
+        if table == "entities":
+            self.entities = {e["entity_id"]: _slim(e, ENTITY_FIELDS) for e in entries if e.get("entity_id")}
+            self._device_entities = {}
+            for entity_id, entry in self.entities.items():
+                if entry["device_id"]:
+                    self._device_entities.setdefault(entry["device_id"], set()).add(entity_id)
+            self.ha_client.reindex_entities(self.ha_client.state_cache.keys())
+
+        elif table == "devices":
+            self.devices = {d["id"]: _slim(d, DEVICE_FIELDS) for d in entries if d.get("id")}
+            self.ha_client.reindex_entities(self.ha_client.state_cache.keys())
+
+        elif table == "areas":
+            self.areas = {a["area_id"]: _slim(a, AREA_FIELDS) for a in entries if a.get("area_id")}
+            self._area_ids_by_name = {
+                (area["name"] or "").lower(): area_id for area_id, area in self.areas.items()
+            }
+
+        elif table == "floors":
+            self.floors = {f["floor_id"]: _slim(f, FLOOR_FIELDS) for f in entries if f.get("floor_id")}
+
+    def _handle_registry_event(self, event: Dict[str, Any]):
+        """Apply a *_registry_updated event without blocking the socket reader."""
+        table = UPDATE_EVENTS.get(event.get("event_type"))
+        data = event.get("data", {})
+
+        if table == "entities":
+            entity_id = data.get("entity_id")
+            if data.get("old_entity_id"):
+                self._remove_entity(data["old_entity_id"])
+            if data.get("action") == "remove":
+                self._remove_entity(entity_id)
+            elif entity_id:
+                task = asyncio.create_task(self._refresh_entity(entity_id))
+                self._refresh_tasks.add(task)
+                task.add_done_callback(self._refresh_done)
+
+        elif table:
+            # Devices, areas and floors have no single-entry get command; relist the table once
+            if table not in self._pending_reloads:
+                self._pending_reloads[table] = asyncio.create_task(self._reload_table(table))
+
+    def _refresh_done(self, task: asyncio.Task):
+        """Forget a finished refresh and report it if it failed."""
+        self._refresh_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error refreshing entity registry entry: {task.exception()}")
+
+    async def close(self):
+        """Cancel in-flight entity refreshes and table reloads."""
+        tasks = [*self._refresh_tasks, *self._pending_reloads.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._refresh_tasks.clear()
+        self._pending_reloads.clear()
+
+    async def _refresh_entity(self, entity_id: str):
+        """Fetch one entity registry entry and apply it."""
+        try:
+            entry = await self.ha_client.send_command({"type": "config/entity_registry/get", "entity_id": entity_id})
+        except Exception as e:
+            logger.warning(f"Could not refresh registry entry for {entity_id}: {e}")
+            return
+
+        self._remove_entity(entity_id, reindex=False)
+        slim = _slim(entry, ENTITY_FIELDS)
+        self.entities[entity_id] = slim
+        if slim["device_id"]:
+            self._device_entities.setdefault(slim["device_id"], set()).add(entity_id)
+        self.ha_client.reindex_entities([entity_id])
+
+    def _remove_entity(self, entity_id: Optional[str], reindex: bool = True):
+        """Drop an entity registry entry."""
+        entry = self.entities.pop(entity_id, None)
+        if entry and entry["device_id"]:
+            self._device_entities.get(entry["device_id"], set()).discard(entity_id)
+        if entry and reindex:
+            self.ha_client.reindex_entities([entity_id])
+
+    async def _reload_table(self, table: str):
+        """Relist one registry table after an update event."""
+        try:
+            entries = await self.ha_client.send_command({"type": LIST_COMMANDS[table]})
+            self._replace_table(table, entries or [])
+        except Exception as e:
+            logger.warning(f"Could not reload {table} registry: {e}")
+        finally:
+            self._pending_reloads.pop(table, None)
+
+    def entity_device(self, entity_id: str) -> Optional[str]:
+        """Device id an entity belongs to."""
+        entry = self.entities.get(entity_id)
+        return entry["device_id"] if entry else None
+
+    def entity_area(self, entity_id: str) -> Optional[str]:
+        """Effective area id of an entity: its own area, else its device's area."""
+        entry = self.entities.get(entity_id)
+        if not entry:
+            return None
+        if entry["area_id"]:
+            return entry["area_id"]
+
+        device = self.devices.get(entry["device_id"])
+        return device["area_id"] if device else None
+
+    def entity_integration(self, entity_id: str) -> Optional[str]:
+        """Integration (platform) that provides an entity."""
+        entry = self.entities.get(entity_id)
+        return entry["platform"] if entry else None
+
+    def area_name(self, area_id: Optional[str]) -> Optional[str]:
+        """Display name of an area."""
+        area = self.areas.get(area_id)
+        return area["name"] if area else None
+
+    def area_floor(self, area_id: Optional[str]) -> Optional[str]:
+        """Floor id of an area."""
+        area = self.areas.get(area_id)
+        return area["floor_id"] if area else None
+
+    def resolve_area(self, area: str) -> Optional[str]:
+        """Resolve an area id or (case-insensitive) area name to its area id."""
+        if area in self.areas:
+            return area
+        return self._area_ids_by_name.get(area.lower())
@@ -0,0 +1,156 @@
+"""Retention policy for conversation history."""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from app.db.async_database import AsyncDatabase
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionService:
+    """Archives old messages by age, per-conversation count and database size, then vacuums.
+
+    Work is done in small batches and vacuum slices, each its own short transaction with a
+    pause in between, so live requests never wait behind a long prune.
+    """
+
+    def __init__(
+        self,
+        database: AsyncDatabase,
+        max_age_days: float = 0,
+        keep_last: int = 0,
+        max_db_bytes: int = 0,
+        interval: float = 6 * 3600,
+        batch_size: int = 500,
+        vacuum_pages: int = 256,
+        pause: float = 0.05,
+        full_vacuum: bool = False,
+    ):
+        """Initialize retention service. A zero limit disables that policy."""
+        self.database = database
+        self.max_age_days = max_age_days
+        self.keep_last = keep_last
+        self.max_db_bytes = max_db_bytes
+        self.interval = interval
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.pause = pause
+        self.full_vacuum = full_vacuum
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any retention policy is configured."""
+        return bool(self.max_age_days or self.keep_last or self.max_db_bytes or self.full_vacuum)
+
+    def start(self):
+        """Run the retention policy periodically in the background."""
+        if self.enabled:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Stop the background loop."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        """Apply the policy once per interval."""
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Error applying retention policy: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def _drain(self, archive_batch) -> int:
+        """Call an archive step until it runs dry, pausing between batches."""
+        total = 0
+        while True:
+            archived = await archive_batch()
+            total += archived
+            if archived < self.batch_size:
+                return total
+            await asyncio.sleep(self.pause)
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Apply every configured policy, then vacuum the freed pages in slices."""
+        async with self._lock:
+            started = time.monotonic()
+            report = {
+                "archived_by_age": 0,
+                "archived_by_count": 0,
+                "archived_by_size": 0,
+                "reclaimed_bytes": 0,
+            }
+
+            if self.max_age_days:
+                report["archived_by_age"] = await self._drain(
+                    lambda: self.database.archive_messages_older_than(self.max_age_days, self.batch_size)
+                )
+
+            if self.keep_last:
+                report["archived_by_count"] = await self._drain(
+                    lambda: self.database.archive_messages_beyond_last(self.keep_last, self.batch_size)
+                )
+
+            if report["archived_by_age"] or report["archived_by_count"]:
+                await self._merge_index()
+
+            if self.full_vacuum:
+                # Opt-in one-off switch for files too large to VACUUM at startup
+                self.full_vacuum = not await self.database.enable_incremental_vacuum()
+
+            report["reclaimed_bytes"] += await self._vacuum()
+
+            if self.max_db_bytes:
+                # Freed pages are reused before the file grows, so compare used bytes. The archive
+                # lives in the same file but is what archiving produces, so it is not counted.
+                previous = None
+                while True:
+                    stats = await self.database.get_storage_stats()
+                    used = stats["used_bytes"] - stats["archive_bytes"]
+                    if used <= self.max_db_bytes or (previous is not None and used >= previous):
+                        break
+                    archived = await self.database.archive_oldest_messages(self.batch_size)
+                    if not archived:
+                        break
+                    report["archived_by_size"] += archived
+                    await self._merge_index()
+                    previous = used
+                    await asyncio.sleep(self.pause)
+                report["reclaimed_bytes"] += await self._vacuum()
+
+            report["storage"] = await self.database.get_storage_stats()
+            report["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+            report["finished_at"] = time.time()
+            self.last_report = report
+
+            logger.info(
+                f"Retention: archived {report['archived_by_age']} by age, {report['archived_by_count']} by count, "
+                f"{report['archived_by_size']} by size; reclaimed {report['reclaimed_bytes']} bytes"
+            )
+            return report
+
+    async def _merge_index(self):
+        """Merge the search index in slices until the archived messages' entries are gone."""
+        while await self.database.merge_search_index(self.vacuum_pages):
+            await asyncio.sleep(self.pause)
+
+    async def _vacuum(self) -> int:
+        """Run incremental_vacuum in slices until the freelist is empty."""
+        reclaimed = 0
+        while True:
+            freed = await self.database.incremental_vacuum(self.vacuum_pages)
+            reclaimed += freed
+            if not freed:
+                return reclaimed
+            await asyncio.sleep(self.pause)
@@ -0,0 +1,119 @@
+"""Warm-start persistence of the HA entity state cache."""
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StatePersistenceService:
+    """Checkpoints the live state cache into ha_state_cache and restores it at startup.
+
+    Changed entity ids are collected from the client's batch callbacks and written in one
+    transaction per checkpoint, so the database sees a handful of writes per interval no
+    matter how chatty HA is.
+    """
+
+    def __init__(self, database, ha_client, checkpoint_interval: float = 30.0):
+        """Initialize state persistence."""
+        self.database = database
+        self.ha_client = ha_client
+        self.checkpoint_interval = checkpoint_interval
+        self._dirty: set[str] = set()
+        self._full_checkpoint = False
+        self._dropped_seen = 0
+        self._checkpoint_task: Optional[asyncio.Task] = None
+        self._checkpoint_lock = asyncio.Lock()
+        self.stats: Dict[str, Any] = {
+            "restored": 0,
+            "checkpoints": 0,
+            "written": 0,
+            "deleted": 0,
+            "last_checkpoint_ms": None,
+        }
+
+    async def restore(self) -> int:
+        """Load persisted states into the client cache, marked stale until HA confirms them."""
+        try:
+            entities = await self.database.get_all_cached_entities(raw_attributes=True)
+            self.stats["restored"] = self.ha_client.restore_states(entities)
+        except Exception as e:
+            logger.error(f"Error restoring persisted state cache: {e}")
+
+        return self.stats["restored"]
+
+    def start(self):
+        """Start tracking changes and checkpointing periodically."""
+        self.ha_client.add_state_batch_callback(self._on_state_batch)
+        self._checkpoint_task = asyncio.create_task(self._checkpoint_loop())
+
+    async def stop(self):
+        """Stop the checkpoint loop and write a final checkpoint."""
+        if self._checkpoint_task:
+            self._checkpoint_task.cancel()
+            try:
+                await self._checkpoint_task
+            except asyncio.CancelledError:
+                pass
+            self._checkpoint_task = None
+
+        await self.checkpoint()
+
+    def _on_state_batch(self, changes: Dict[str, Any]):
+        """Mark the entities of a dispatched batch as dirty."""
+        self._dirty.update(changes)
+
+    async def _checkpoint_loop(self):
+        """Checkpoint once per interval."""
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            await self.checkpoint()
+
+    async def checkpoint(self) -> Dict[str, int]:
+        """Write dirty entities to the database in one batched upsert and one batched delete."""
+        async with self._checkpoint_lock:
+            # Changes the dispatcher dropped under load never reached us; rewrite everything
+            dropped = self.ha_client.dispatch_stats["dropped"]
+            if dropped != self._dropped_seen:
+                self._dropped_seen = dropped
+                self._full_checkpoint = True
+
+            cache = self.ha_client.state_cache
+            if self._full_checkpoint:
+                dirty, self._dirty = set(cache), set()
+                removed = None
+            else:
+                dirty, self._dirty = self._dirty, set()
+                removed = [entity_id for entity_id in dirty if entity_id not in cache]
+
+            if not dirty and not removed:
+                return {"written": 0, "deleted": 0}
+
+            started = asyncio.get_running_loop().time()
+            rows = []
+            for entity_id in dirty:
+                entry = cache.get(entity_id)
+                if entry is not None:
+                    rows.append(
+                        (entity_id, entry.state, entry.raw_attributes.decode("utf-8"), entry.last_updated)
+                    )
+
+            try:
+                if removed is None:
+                    persisted = await self.database.get_all_cached_entities(raw_attributes=True)
+                    removed = list({entity["entity_id"] for entity in persisted} - dirty)
+                await self.database.cache_entity_states_bulk(rows)
+                deleted = await self.database.delete_cached_entities(removed)
+            except Exception as e:
+                # Keep the ids dirty so the next checkpoint retries them
+                logger.error(f"Error checkpointing state cache: {e}")
+                self._dirty |= dirty
+                return {"written": 0, "deleted": 0}
+
+            self._full_checkpoint = False
+            self.stats["checkpoints"] += 1
+            self.stats["written"] += len(rows)
+            self.stats["deleted"] += deleted
+            self.stats["last_checkpoint_ms"] = round((asyncio.get_running_loop().time() - started) * 1000, 1)
+            logger.debug(f"State cache checkpoint: {len(rows)} written, {deleted} deleted")
+            return {"written": len(rows), "deleted": deleted}
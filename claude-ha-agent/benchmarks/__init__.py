@@ -0,0 +1 @@
+"""Benchmarks for the Claude HA Agent backend."""
@@ -0,0 +1,332 @@
+"""Micro-benchmarks for the Database class.
+
+Seeds a temporary database with a configurable number of conversations and messages,
+times each Database method and prints ops/sec and latency percentiles as JSON.
+
+Run from the claude-ha-agent directory:
+
+    python -m benchmarks.db_bench --conversations 1000 --messages 100000 --output bench.json
+"""
+import argparse
+import json
+import logging
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from uuid import uuid4
+
+from app.db.database import Database
+
+logger = logging.getLogger(__name__)
+
+ROLES = ("user", "assistant")
+MODELS = ("claude-sonnet-4-5", "claude-haiku-4-5")
+WORDS = (
+    "garage door sensor light kitchen automation motion battery thermostat living room "
+    "bedroom unavailable zigbee integration rename entity state humidity temperature"
+).split()
+
+
+def percentile(sorted_samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of pre-sorted samples."""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def summarize(samples: List[float], elapsed: float) -> Dict[str, Any]:
+    """Summarize per-call latencies (seconds) into ops/sec and millisecond percentiles."""
+    ordered = sorted(samples)
+    return {
+        "ops": len(samples),
+        "seconds": round(elapsed, 4),
+        "ops_per_sec": round(len(samples) / elapsed, 1) if elapsed else None,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 4),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 4),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 4),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+    }
+
+
+def measure(operation: Callable[[int], Any], ops: int, warmup: int = 10) -> Dict[str, Any]:
+    """Time ops calls of operation(i) one after another."""
+    for i in range(min(warmup, ops)):
+        operation(i)
+
+    samples = []
+    started = time.perf_counter()
+    for i in range(ops):
+        call_started = time.perf_counter()
+        operation(i)
+        samples.append(time.perf_counter() - call_started)
+    return summarize(samples, time.perf_counter() - started)
+
+
+def random_text(rng: random.Random, words: int) -> str:
+    """Build filler message text."""
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def seed(db: Database, conversations: int, messages: int, entities: int, days: int, rng: random.Random) -> List[str]:
+    """Bulk-load conversations, messages, counters, rollups and cached states; returns conversation ids.
+
+    Rows are written straight to the tables in one transaction (triggers still fire) and the
+    counters and rollups are then rebuilt from them, which is far faster than add_message
+    for large seeds while producing the same schema state.
+    """
+    now = datetime.now(timezone.utc)
+    conversation_ids = [str(uuid4()) for _ in range(conversations)]
+
+    with db.connections.writer() as conn:
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO conversations (id, title, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            [
+                (cid, random_text(rng, 3), (now - timedelta(days=days)).isoformat(" "), now.isoformat(" "))
+                for cid in conversation_ids
+            ],
+        )
+
+        batch = []
+        for i in range(messages):
+            role = ROLES[i % 2]
+            timestamp = now - timedelta(seconds=rng.randrange(days * 86400))
+            tool_calls = None
+            if role == "assistant" and rng.random() < 0.2:
+                tool_calls = json.dumps([{"name": "get_entity_state", "id": str(i), "input": {"entity_id": "light.x"}}])
+            batch.append(
+                (
+                    str(uuid4()),
+                    conversation_ids[i % conversations],
+                    role,
+                    random_text(rng, rng.randint(5, 60)),
+                    rng.randint(100, 4000) if role == "assistant" else 0,
+                    rng.randint(20, 800) if role == "assistant" else 0,
+                    round(rng.random() * 0.02, 6) if role == "assistant" else 0.0,
+                    timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                    tool_calls,
+                    MODELS[i % len(MODELS)] if role == "assistant" else None,
+                )
+            )
+            if len(batch) >= 10000:
+                _insert_messages(conn, batch)
+                batch = []
+        _insert_messages(conn, batch)
+
+        conn.execute(
+            """
+            UPDATE conversations SET
+                message_count = (SELECT COUNT(*) FROM messages m WHERE m.conversation_id = conversations.id),
+                total_cost = (SELECT COALESCE(SUM(cost), 0) FROM messages m WHERE m.conversation_id = conversations.id)
+            """
+        )
+        conn.execute(
+            """
+            INSERT INTO conversation_daily_cost (conversation_id, day, cost)
+            SELECT conversation_id, DATE(timestamp), SUM(cost) FROM messages
+            WHERE cost > 0 GROUP BY conversation_id, DATE(timestamp)
+            """
+        )
+        conn.execute(
+            """
+            INSERT INTO usage_rollup (day, hour, model, messages, calls, tokens_input, tokens_output, cost)
+            SELECT DATE(timestamp), CAST(strftime('%H', timestamp) AS INTEGER), COALESCE(model, ''),
+                   COUNT(*), SUM(role = 'assistant'), SUM(tokens_input), SUM(tokens_output), SUM(cost)
+            FROM messages
+            GROUP BY 1, 2, 3
+            """
+        )
+
+    db.cache_entity_states_bulk([entity_row(i, rng) for i in range(entities)])
+    return conversation_ids
+
+
+def _insert_messages(conn: sqlite3.Connection, rows: List[tuple]):
+    """Insert a batch of seed messages."""
+    conn.executemany(
+        """
+        INSERT INTO messages (
+            id, conversation_id, role, content, tokens_input, tokens_output, cost, timestamp, tool_calls, model
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        rows,
+    )
+
+
+def entity_row(i: int, rng: random.Random) -> tuple:
+    """Build a (entity_id, state, attributes_json, last_updated) cache row."""
+    attributes = {"friendly_name": f"Sensor {i}", "unit_of_measurement": "°C", "device_class": "temperature"}
+    return (f"sensor.bench_{i}", str(round(rng.uniform(15, 25), 1)), json.dumps(attributes), datetime.now().isoformat())
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Seed a temporary database and run the selected benchmarks."""
+    rng = random.Random(args.seed)
+    workdir = tempfile.TemporaryDirectory(prefix="db_bench_")
+    db_path = Path(args.db or Path(workdir.name) / "bench.db")
+
+    db = Database(
+        db_path,
+        read_pool_size=args.read_pool_size,
+        synchronous=args.synchronous,
+        group_commit_window_ms=args.group_commit_window_ms,
+    )
+    try:
+        seed_started = time.perf_counter()
+        conversation_ids = seed(db, args.conversations, args.messages, args.entities, args.days, rng)
+        seed_seconds = time.perf_counter() - seed_started
+        logger.info(f"Seeded {args.messages} messages in {seed_seconds:.1f}s")
+
+        def pick_conversation(_: int) -> str:
+            return conversation_ids[rng.randrange(len(conversation_ids))]
+
+        benchmarks: Dict[str, Callable[[], Dict[str, Any]]] = {
+            "add_message": lambda: measure(
+                lambda i: db.add_message(
+                    pick_conversation(i), "assistant", random_text(rng, 30), 1200, 300, 0.0081, None, MODELS[0]
+                ),
+                args.ops,
+            ),
+            "submit_message": lambda: measure_submitted(db, pick_conversation, rng, args.ops),
+            "get_conversation_messages": lambda: measure(
+                lambda i: db.get_conversation_messages(pick_conversation(i)), args.ops
+            ),
+            "get_conversation_messages_page": lambda: measure(
+                lambda i: db.get_conversation_messages_page(pick_conversation(i), limit=50), args.ops
+            ),
+            "get_all_conversations": lambda: measure(lambda i: db.get_all_conversations(), args.slow_ops),
+            "get_conversations_page": lambda: measure(lambda i: db.get_conversations_page(limit=50), args.ops),
+            "get_daily_cost": lambda: measure(lambda i: db.get_daily_cost(), args.ops),
+            "get_usage": lambda: measure(
+                lambda i: db.get_usage(
+                    datetime.now(timezone.utc).date() - timedelta(days=args.days),
+                    datetime.now(timezone.utc).date(),
+                    "model",
+                ),
+                args.ops,
+            ),
+            "search_messages": lambda: measure(
+                lambda i: db.search_messages(f"{rng.choice(WORDS)} {rng.choice(WORDS)}"), args.ops
+            ),
+            "cache_entity_state": lambda: measure(
+                lambda i: db.cache_entity_state(
+                    f"sensor.bench_{rng.randrange(args.entities)}", "21.5", {"friendly_name": "x"}, datetime.now()
+                ),
+                args.ops,
+            ),
+            "cache_entity_states_bulk": lambda: measure(
+                lambda i: db.cache_entity_states_bulk(
+                    [entity_row(rng.randrange(args.entities), rng) for _ in range(args.bulk_size)]
+                ),
+                args.slow_ops,
+            ),
+            "get_cached_entity_state": lambda: measure(
+                lambda i: db.get_cached_entity_state(f"sensor.bench_{rng.randrange(args.entities)}"), args.ops
+            ),
+            "get_all_cached_entities": lambda: measure(lambda i: db.get_all_cached_entities(), args.slow_ops),
+        }
+
+        selected = args.only or list(benchmarks)
+        unknown = [name for name in selected if name not in benchmarks]
+        if unknown:
+            raise SystemExit(f"Unknown benchmarks: {', '.join(unknown)}")
+
+        results = {}
+        for name in selected:
+            logger.info(f"Running {name}")
+            results[name] = benchmarks[name]()
+
+        return {
+            "meta": {
+                "conversations": args.conversations,
+                "messages": args.messages,
+                "entities": args.entities,
+                "ops": args.ops,
+                "slow_ops": args.slow_ops,
+                "seed": args.seed,
+                "synchronous": args.synchronous,
+                "read_pool_size": args.read_pool_size,
+                "group_commit_window_ms": args.group_commit_window_ms,
+                "seed_seconds": round(seed_seconds, 2),
+                "db_bytes": db.get_storage_stats()["file_bytes"],
+                "sqlite_version": sqlite3.sqlite_version,
+                "python_version": platform.python_version(),
+                "platform": platform.platform(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+            },
+            "results": results,
+        }
+    finally:
+        db.close()
+        workdir.cleanup()
+
+
+def measure_submitted(db: Database, pick_conversation: Callable[[int], str], rng: random.Random, ops: int):
+    """Time queueing inserts back to back (write-behind) until all of them have committed."""
+    samples = []
+    futures = []
+    started = time.perf_counter()
+    for i in range(ops):
+        call_started = time.perf_counter()
+        _, committed = db.submit_message(
+            pick_conversation(i), "assistant", random_text(rng, 30), 1200, 300, 0.0081, None, MODELS[0]
+        )
+        futures.append(committed)
+        samples.append(time.perf_counter() - call_started)
+    for committed in futures:
+        committed.result()
+    result = summarize(samples, time.perf_counter() - started)
+    result["batches"] = db.write_queue.stats["batches"]
+    result["largest_batch"] = db.write_queue.stats["largest_batch"]
+    return result
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Benchmark the conversation and state-cache database.")
+    parser.add_argument("--conversations", type=int, default=1000, help="Conversations to seed")
+    parser.add_argument("--messages", type=int, default=10000, help="Messages to seed (1k to 1M)")
+    parser.add_argument("--entities", type=int, default=2000, help="Cached entity states to seed")
+    parser.add_argument("--days", type=int, default=30, help="Spread seeded messages over this many days")
+    parser.add_argument("--ops", type=int, default=1000, help="Calls per benchmark")
+    parser.add_argument("--slow-ops", type=int, default=50, help="Calls for full-table benchmarks")
+    parser.add_argument("--bulk-size", type=int, default=500, help="Rows per cache_entity_states_bulk call")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for reproducible data")
+    parser.add_argument("--synchronous", default="NORMAL", help="SQLite synchronous mode")
+    parser.add_argument("--read-pool-size", type=int, default=4, help="Reader connections")
+    parser.add_argument("--group-commit-window-ms", type=float, default=2.0, help="Group-commit window")
+    parser.add_argument("--db", help="Database file to use instead of a temporary one (must not exist)")
+    parser.add_argument("--only", nargs="+", help="Run only these benchmarks")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Run the benchmarks and emit the JSON report."""
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    logger.setLevel(logging.INFO)
+    args = parse_args(argv)
+    if args.db and Path(args.db).exists():
+        raise SystemExit(f"{args.db} already exists; the benchmark needs an empty database")
+    if args.conversations < 1:
+        raise SystemExit("--conversations must be at least 1")
+
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        Path(args.output).write_text(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -72,7 +72,7 @@ class ClaudeHAAgentCard extends HTMLElement {
 
   async loadConversations() {
     try {
-      const response = await fetch("http://localhost:5000/api/conversations");
+      const response = await fetch("http://localhost:5000/api/conversations?limit=1");
       const conversations = await response.json();
 
       if (conversations.length === 0) {
@@ -96,7 +96,9 @@ class ClaudeHAAgentCard extends HTMLElement {
 
   async loadConversationHistory() {
     try {
-      const response = await fetch(`http://localhost:5000/api/conversations/${this.currentConversationId}`);
+      const response = await fetch(
+        `http://localhost:5000/api/conversations/${this.currentConversationId}?include_tool_calls=false`
+      );
       const conversation = await response.json();
 
       const messagesContainer = document.getElementById("messages-container");
@@ -130,8 +132,8 @@ class ClaudeHAAgentCard extends HTMLElement {
     document.getElementById("messages-container").appendChild(loadingMsg);
 
     try {
-      // Send to backend
-      const response = await fetch("http://localhost:5000/api/chat", {
+      // Stream the response so text shows up as soon as Claude produces it
+      const response = await fetch("http://localhost:5000/api/chat/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
@@ -141,23 +143,62 @@ class ClaudeHAAgentCard extends HTMLElement {
         }),
       });
 
-      const result = await response.json();
-
-      // Remove loading message
-      loadingMsg.remove();
-
-      // Display Claude response
-      this.displayMessage("assistant", result.content);
-
-      // Update cost indicator
-      if (result.cost) {
-        const costElem = document.getElementById("cost-indicator");
-        costElem.textContent = `$${result.cost.toFixed(4)}`;
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
       }
 
-      // Handle tool calls display
-      if (result.tool_calls && result.tool_calls.length > 0) {
-        this.displayToolCalls(result.tool_calls);
+      let text = "";
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Server-sent events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+          const raw = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+
+          let event = "message";
+          let data = "";
+          for (const line of raw.split("\n")) {
+            if (line.startsWith("event: ")) event = line.slice(7);
+            else if (line.startsWith("data: ")) data += line.slice(6);
+          }
+          const payload = data ? JSON.parse(data) : {};
+
+          if (event === "text") {
+            text += payload.text;
+            loadingMsg.classList.remove("loading");
+            loadingMsg.innerHTML = this.renderMarkdown(text);
+          } else if (event === "tool_start") {
+            loadingMsg.classList.add("loading");
+            loadingMsg.textContent = `${text ? text + "\n" : ""}Running ${payload.name}...`;
+          } else if (event === "tool_call") {
+            // Text before a tool call is superseded by the answer to the tool results
+            text = "";
+          } else if (event === "done") {
+            loadingMsg.remove();
+            this.displayMessage("assistant", payload.content);
+
+            // Update cost indicator
+            if (payload.cost) {
+              const costElem = document.getElementById("cost-indicator");
+              costElem.textContent = `$${payload.cost.toFixed(4)}`;
+            }
+
+            // Handle tool calls display
+            if (payload.tool_calls && payload.tool_calls.length > 0) {
+              this.displayToolCalls(payload.tool_calls);
+            }
+          } else if (event === "error") {
+            throw new Error(payload.error);
+          }
+        }
       }
     } catch (error) {
       loadingMsg.remove();
@@ -178,15 +219,17 @@ class ClaudeHAAgentCard extends HTMLElement {
     const contentDiv = document.createElement("div");
     contentDiv.className = "message-content";
 
+    contentDiv.innerHTML = this.renderMarkdown(content);
+    messageDiv.appendChild(contentDiv);
+    messagesContainer.appendChild(messageDiv);
+  }
+
+  renderMarkdown(content) {
     // Simple markdown to HTML conversion
-    let html = content
+    return content
       .replace(/\n/g, "<br>")
       .replace(/\*\*(.*?)\*\*/g, "<strong>$1</strong>")
       .replace(/\*(.*?)\*/g, "<em>$1</em>");
-
-    contentDiv.innerHTML = html;
-    messageDiv.appendChild(contentDiv);
-    messagesContainer.appendChild(messageDiv);
   }
 
   displayToolCalls(toolCalls) {
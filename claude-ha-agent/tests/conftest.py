@@ -0,0 +1,39 @@
+"""Shared fixtures for the backend tests."""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.db.database import Database  # noqa: E402
+
+
+@pytest.fixture
+def database(tmp_path):
+    """A fresh database in a temporary directory."""
+    db = Database(tmp_path / "database.db")
+    yield db
+    db.close()
+
+
+def add_turns(db: Database, conversation_id: str, turns: int) -> None:
+    """Add turns of one user and one assistant message each."""
+    for i in range(turns):
+        db.add_message(conversation_id, "user", f"u{i}")
+        db.add_message(conversation_id, "assistant", f"a{i}", 10, 10, 0.01, model="m")
+
+
+def age_messages(db: Database, days: int) -> None:
+    """Backdate every live message by days."""
+    with db.connections.writer() as conn:
+        conn.execute("UPDATE messages SET timestamp = datetime(timestamp, ?)", (f"-{days} days",))
+
+
+def summarize_all(db: Database, conversation_id: str) -> None:
+    """Mark every current message as covered by the conversation's history summary."""
+    with db.connections.reader() as conn:
+        through = conn.execute(
+            "SELECT MAX(rowid) FROM messages WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()[0]
+    db.save_conversation_summary(conversation_id, "summary", through, 1)
@@ -0,0 +1,47 @@
+"""Tests for the message archive used by the retention policy."""
+from tests.conftest import add_turns, age_messages, summarize_all
+
+
+def test_archive_reads_back_in_insert_order(database):
+    cid = database.create_conversation("order")
+    add_turns(database, cid, 5)
+    database.add_message(cid, "assistant", "tools", tool_calls=[{"name": "t", "id": "1", "input": {}, "result": 1}])
+    summarize_all(database, cid)
+
+    assert database.archive_oldest_messages(100) == 11
+
+    archived = database.get_archived_messages(cid)
+    assert [m["content"] for m in archived] == ["u0", "a0", "u1", "a1", "u2", "a2", "u3", "a3", "u4", "a4", "tools"]
+    assert archived[-1]["tool_calls"] == [{"name": "t", "id": "1", "input": {}, "result": 1}]
+
+
+def test_archiving_by_age_keeps_the_conversation(database):
+    cid = database.create_conversation("kept")
+    add_turns(database, cid, 2)
+    summarize_all(database, cid)
+    age_messages(database, 40)
+    with database.connections.writer() as conn:
+        conn.execute("UPDATE conversations SET updated_at = datetime('now', '-40 days')")
+
+    assert database.archive_messages_older_than(30) == 4
+
+    conversation = database.get_conversation(cid)
+    assert conversation["title"] == "kept"
+    assert conversation["message_count"] == 0
+    assert len(database.get_archived_messages(cid)) == 4
+
+
+def test_deleting_a_conversation_deletes_its_archive(database):
+    cid = database.create_conversation("gone")
+    other = database.create_conversation("other")
+    add_turns(database, cid, 2)
+    add_turns(database, other, 1)
+    summarize_all(database, cid)
+    summarize_all(database, other)
+    database.archive_oldest_messages(100)
+
+    assert database.delete_conversation(cid)
+
+    assert database.get_archived_messages(cid) == []
+    assert len(database.get_archived_messages(other)) == 2
+    assert database.get_storage_stats()["archived_messages"] == 2
@@ -0,0 +1,59 @@
+"""Tests that retention never archives history the rolling summary has not covered yet."""
+from tests.conftest import add_turns, age_messages
+
+
+def _through(database, cid, messages):
+    """Rowid of the messages-th message of a conversation."""
+    return database.get_messages_after(cid)[messages - 1]["rowid"]
+
+
+def test_age_policy_keeps_unsummarized_messages(database):
+    cid = database.create_conversation("old")
+    add_turns(database, cid, 10)
+    through = _through(database, cid, 8)
+    database.save_conversation_summary(cid, "first four turns", through, 4)
+    age_messages(database, 40)
+
+    assert database.archive_messages_older_than(30) == 8
+
+    remaining = database.get_messages_after(cid, through)
+    assert [m["content"] for m in remaining] == [f"{role}{i}" for i in range(4, 10) for role in ("u", "a")]
+
+
+def test_age_policy_skips_conversations_without_summary(database):
+    cid = database.create_conversation("short")
+    add_turns(database, cid, 3)
+    age_messages(database, 40)
+
+    assert database.archive_messages_older_than(30) == 0
+    assert len(database.get_messages_after(cid)) == 6
+
+
+def test_keep_last_below_the_verbatim_window_keeps_the_window(database):
+    cid = database.create_conversation("long")
+    add_turns(database, cid, 10)
+    through = _through(database, cid, 4)
+    database.save_conversation_summary(cid, "first two turns", through, 2)
+
+    # keep_last=2 would leave one turn; only the summarized first two turns may go
+    assert database.archive_messages_beyond_last(2) == 4
+    assert database.archive_messages_beyond_last(2) == 0
+    assert len(database.get_messages_after(cid, through)) == 16
+
+
+def test_keep_last_archives_summarized_messages_outside_the_limit(database):
+    cid = database.create_conversation("covered")
+    add_turns(database, cid, 10)
+    database.save_conversation_summary(cid, "everything", _through(database, cid, 20), 10)
+
+    assert database.archive_messages_beyond_last(6) == 14
+    assert [m["content"] for m in database.get_messages_after(cid)] == ["u7", "a7", "u8", "a8", "u9", "a9"]
+
+
+def test_size_policy_only_archives_summarized_messages(database):
+    cid = database.create_conversation("big")
+    add_turns(database, cid, 5)
+    database.save_conversation_summary(cid, "first turn", _through(database, cid, 2), 1)
+
+    assert database.archive_oldest_messages(100) == 2
+    assert database.archive_oldest_messages(100) == 0